@@ -16,6 +16,7 @@ import {IStreamService} from "./stream-service.registry";
 export abstract class BaseStreamService implements IStreamService {
 
     private _eventNames: string[] = [];
+    private _streamParams: Map<string, string> = new Map();
 
 
     constructor() {}
@@ -24,6 +25,10 @@ export abstract class BaseStreamService implements IStreamService {
         return this._eventNames;
     }
 
+    getStreamParams(): Map<string, string> {
+        return this._streamParams;
+    }
+
     notifyConnected() {
         this.onConnected();
     }
@@ -40,6 +45,10 @@ export abstract class BaseStreamService implements IStreamService {
         this._eventNames.push(eventName);
     }
 
+    protected registerStreamParam(name: string, value: string) {
+        this._streamParams.set(name, value);
+    }
+
     /**
      * Callback for a new event
      * @param {string} eventName
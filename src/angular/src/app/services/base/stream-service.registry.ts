@@ -23,6 +23,12 @@ export interface IStreamService {
      */
     getEventNames(): string[];
 
+    /**
+     * Returns the stream request parameters needed by this stream service
+     * @returns {Map<string, string>}
+     */
+    getStreamParams(): Map<string, string>;
+
     /**
      * Notifies the stream service that it is now connected
      */
@@ -80,9 +86,19 @@ export class StreamDispatchService {
         return service;
     }
 
+    private streamUrl(): string {
+        const params: string[] = [];
+        for (let service of this._services) {
+            service.getStreamParams().forEach((value, name) => {
+                params.push(encodeURIComponent(name) + "=" + encodeURIComponent(value));
+            });
+        }
+        return params.length > 0 ? this.STREAM_URL + "?" + params.join("&") : this.STREAM_URL;
+    }
+
     private createSseObserver() {
         const observable = Observable.create(observer => {
-            const eventSource = EventSourceFactory.createEventSource(this.STREAM_URL);
+            const eventSource = EventSourceFactory.createEventSource(this.streamUrl());
             for (let eventName of Array.from(this._eventNameToServiceMap.keys())) {
                 eventSource.addEventListener(eventName, event => observer.next(
                     {
@@ -26,6 +26,13 @@ export class ModelFileService extends BaseStreamService {
     private readonly EVENT_ADDED = "model-added";
     private readonly EVENT_UPDATED = "model-updated";
     private readonly EVENT_REMOVED = "model-removed";
+    private readonly EVENT_PATCH = "model-patch";
+
+    // Ask the server to send updates as patches
+    private readonly STREAM_PARAM_PATCH = "model_patch";
+    // Ask the server to send summaries of the files without their children
+    // Only sent once enableSummaries() is called
+    private readonly STREAM_PARAM_SUMMARY = "model_summary";
 
     private _files: BehaviorSubject<Immutable.Map<string, ModelFile>> =
         new BehaviorSubject(Immutable.Map<string, ModelFile>());
@@ -37,12 +44,40 @@ export class ModelFileService extends BaseStreamService {
         this.registerEventName(this.EVENT_ADDED);
         this.registerEventName(this.EVENT_UPDATED);
         this.registerEventName(this.EVENT_REMOVED);
+        this.registerEventName(this.EVENT_PATCH);
+        this.registerStreamParam(this.STREAM_PARAM_PATCH, "1");
     }
 
     get files(): Observable<Immutable.Map<string, ModelFile>> {
         return this._files.asObservable();
     }
 
+    /**
+     * Ask the server for summaries of the files, without their children
+     * By default the files are sent with their full subtrees. Summaries are
+     * smaller, but then clients that need children must fetch them with
+     * fetchFile(). Takes effect the next time the stream connects.
+     */
+    public enableSummaries() {
+        this.registerStreamParam(this.STREAM_PARAM_SUMMARY, "1");
+    }
+
+    /**
+     * Fetch a file and a page of summaries of its children
+     * The reaction data is the JSON of the file, see ModelFile.fromJson()
+     * @param {string} fullPath
+     * @param {number} offset index of the first child
+     * @param {number} limit max number of children
+     * @returns {Observable<WebReaction>}
+     */
+    public fetchFile(fullPath: string, offset: number, limit: number): Observable<WebReaction> {
+        this._logger.debug("Fetch model file: " + fullPath);
+        // Double-encode the value
+        const fullPathEncoded = encodeURIComponent(encodeURIComponent(fullPath));
+        const url: string = "/server/model/file/" + fullPathEncoded + "?offset=" + offset + "&limit=" + limit;
+        return this._restService.sendRequest(url);
+    }
+
     /**
      * Queue a file for download
      * @param {ModelFile} file
@@ -186,6 +221,17 @@ export class ModelFileService extends BaseStreamService {
             } else {
                 this._logger.error("Failed to find ModelFile named " + file.name);
             }
+        } else if (name === this.EVENT_PATCH) {
+            // Patch event receives the changed fields and children of a file
+            const parsed: {name: string, ops: any[]} = JSON.parse(data);
+            const file = this._files.getValue().get(parsed.name);
+            if (file != null) {
+                const patchedFile = ModelFile.applyPatch(file, parsed.ops);
+                this._files.next(this._files.getValue().set(patchedFile.name, patchedFile));
+                this._logger.debug("Patched file: %O", patchedFile.toJS());
+            } else {
+                this._logger.error("Failed to find ModelFile named " + parsed.name);
+            }
         } else {
             this._logger.error("Unrecognized event:", name);
         }
@@ -19,6 +19,7 @@ interface IModelFile {
     remote_created_timestamp: Date;
     remote_modified_timestamp: Date;
     children: Set<ModelFile>;
+    children_count: number;
 }
 
 // Boiler plate code to set up an immutable class
@@ -36,7 +37,8 @@ const DefaultModelFile: IModelFile = {
     local_modified_timestamp: null,
     remote_created_timestamp: null,
     remote_modified_timestamp: null,
-    children: null
+    children: null,
+    children_count: null
 };
 const ModelFileRecord = Record(DefaultModelFile);
 
@@ -61,6 +63,8 @@ export class ModelFile extends ModelFileRecord implements IModelFile {
     remote_created_timestamp: Date;
     remote_modified_timestamp: Date;
     children: Set<ModelFile>;
+    // Set for summaries of files, whose children are not included
+    children_count: number;
 
     constructor(props) {
         super(props);
@@ -71,14 +75,26 @@ export class ModelFile extends ModelFileRecord implements IModelFile {
 export module ModelFile {
     export function fromJson(json): ModelFile {
         // Create immutable objects for children as well
+        // Summaries don't have children
         const children: ModelFile[] = [];
-        for (const child of json.children) {
+        for (const child of json.children || []) {
             children.push(ModelFile.fromJson(child));
         }
         json.children = Set<ModelFile>(children);
 
+        return new ModelFile(fieldsFromJson(json));
+    }
+
+    /**
+     * Converts the given JSON fields of a model file
+     * Fields that are missing from the JSON are left out
+     * @param json
+     */
+    function fieldsFromJson(json): any {
         // State mapping
-        json.state = ModelFile.State[json.state.toUpperCase()];
+        if (json.state != null) {
+            json.state = ModelFile.State[json.state.toUpperCase()];
+        }
 
         // Timestamps
         if (json.local_created_timestamp != null) {
@@ -94,7 +110,43 @@ export module ModelFile {
             json.remote_modified_timestamp = new Date(1000 * +json.remote_modified_timestamp);
         }
 
-        return new ModelFile(json);
+        return json;
+    }
+
+    /**
+     * Applies a patch received from the backend
+     * Each operation has a path of file names below the given file
+     * @param {ModelFile} file
+     * @param ops list of patch operations
+     * @returns {ModelFile} the patched file
+     */
+    export function applyPatch(file: ModelFile, ops: any[]): ModelFile {
+        for (const op of ops) {
+            file = applyPatchOp(file, op.path, op);
+        }
+        return file;
+    }
+
+    function applyPatchOp(file: ModelFile, path: string[], op): ModelFile {
+        if (path.length === 0) {
+            // Only replace applies to the file itself
+            return new ModelFile(file.merge(fieldsFromJson(op.fields)));
+        }
+        const child = file.children.find(value => value.name === path[0]);
+        let children = file.children;
+        if (child != null) {
+            children = children.remove(child);
+        }
+        if (path.length === 1 && op.op === "add") {
+            children = children.add(ModelFile.fromJson(op.file));
+        } else if (path.length === 1 && op.op === "remove") {
+            // Already removed above
+        } else if (child != null) {
+            children = children.add(applyPatchOp(child, path.slice(1), op));
+        } else {
+            throw new Error("Failed to find child named " + path[0] + " in " + file.full_path);
+        }
+        return new ModelFile(file.set("children", children));
     }
 
     export enum State {
@@ -1,5 +1,15 @@
 import {Record} from "immutable";
 
+/**
+ * Metrics of the queue of a web stream on the server
+ */
+export interface StreamQueueMetrics {
+    name: string;
+    depth: number;
+    drops: number;
+    maxLatencyMs: number;
+}
+
 /**
  * ServerStatus immutable
  */
@@ -14,6 +24,12 @@ interface IServerStatus {
         latestRemoteScanTime: Date;
         latestRemoteScanFailed: boolean;
         latestRemoteScanError: string;
+        localScanIntervalMs: number;
+        remoteScanIntervalMs: number;
+    };
+
+    web: {
+        streamQueues: StreamQueueMetrics[];
     };
 }
 const DefaultServerStatus: IServerStatus = {
@@ -25,7 +41,12 @@ const DefaultServerStatus: IServerStatus = {
         latestLocalScanTime: null,
         latestRemoteScanTime: null,
         latestRemoteScanFailed: null,
-        latestRemoteScanError: null
+        latestRemoteScanError: null,
+        localScanIntervalMs: null,
+        remoteScanIntervalMs: null
+    },
+    web: {
+        streamQueues: []
     }
 };
 const ServerStatusRecord = Record(DefaultServerStatus);
@@ -40,6 +61,12 @@ export class ServerStatus extends ServerStatusRecord implements IServerStatus {
         latestRemoteScanTime: Date;
         latestRemoteScanFailed: boolean;
         latestRemoteScanError: string;
+        localScanIntervalMs: number;
+        remoteScanIntervalMs: number;
+    };
+
+    web: {
+        streamQueues: StreamQueueMetrics[];
     };
 
     constructor(props) {
@@ -71,7 +98,17 @@ export module ServerStatus {
                 latestLocalScanTime: latestLocalScanTime,
                 latestRemoteScanTime: latestRemoteScanTime,
                 latestRemoteScanFailed: json.controller.latest_remote_scan_failed,
-                latestRemoteScanError: json.controller.latest_remote_scan_error
+                latestRemoteScanError: json.controller.latest_remote_scan_error,
+                localScanIntervalMs: json.controller.local_scan_interval_ms,
+                remoteScanIntervalMs: json.controller.remote_scan_interval_ms
+            },
+            web: {
+                streamQueues: json.web.stream_queues.map(queue => ({
+                    name: queue.name,
+                    depth: queue.depth,
+                    drops: queue.drops,
+                    maxLatencyMs: queue.max_latency_ms
+                }))
             }
         });
     }
@@ -92,5 +129,16 @@ export interface ServerStatusJson {
         latest_remote_scan_time: string;
         latest_remote_scan_failed: boolean;
         latest_remote_scan_error: string;
+        local_scan_interval_ms: number;
+        remote_scan_interval_ms: number;
+    };
+
+    web: {
+        stream_queues: {
+            name: string;
+            depth: number;
+            drops: number;
+            max_latency_ms: number;
+        }[];
     };
 }
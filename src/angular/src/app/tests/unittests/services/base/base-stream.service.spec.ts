@@ -16,6 +16,10 @@ class TestBaseStreamService extends BaseStreamService {
         super.registerEventName(eventName);
     }
 
+    public registerStreamParam(name: string, value: string) {
+        super.registerStreamParam(name, value);
+    }
+
     protected onEvent(eventName: string, data: string) {
         console.log(eventName, data);
         this.eventList.push([eventName, data]);
@@ -62,6 +66,15 @@ describe("Testing base stream service", () => {
         expect(baseStreamService.getEventNames()).toEqual(["event1", "event2", "event3"]);
     });
 
+    it("should return all registered stream params", () => {
+        expect(baseStreamService.getStreamParams().size).toBe(0);
+        baseStreamService.registerStreamParam("param1", "value1");
+        baseStreamService.registerStreamParam("param2", "value2");
+        expect(Array.from(baseStreamService.getStreamParams().entries())).toEqual(
+            [["param1", "value1"], ["param2", "value2"]]
+        );
+    });
+
     it("should forward the event notifications", () => {
         baseStreamService.notifyEvent("event1", "data1");
         expect(baseStreamService.eventList).toEqual([
@@ -17,6 +17,10 @@ class MockStreamService implements IStreamService {
         throw new Error("Method not implemented.");
     }
 
+    getStreamParams(): Map<string, string> {
+        return new Map();
+    }
+
     notifyConnected() {
         this.connectedSeq.push(true);
     }
@@ -73,6 +77,15 @@ describe("Testing stream dispatch service", () => {
         expect(mockEventSource.url).toBe("/server/stream");
     }));
 
+    it("should add stream params to the url", fakeAsync(() => {
+        spyOn(mockService1, "getStreamParams").and.returnValue(new Map([["param1", "a"]]));
+        spyOn(mockService2, "getStreamParams").and.returnValue(new Map([["param2", "b c"]]));
+        // Reconnect after an error to create a new event source
+        mockEventSource.onerror(new Event("error"));
+        tick(4000);
+        expect(mockEventSource.url).toBe("/server/stream?param1=a&param2=b%20c");
+    }));
+
     it("should register all events with the event source", fakeAsync(() => {
         expect(mockEventSource.addEventListener).toHaveBeenCalledTimes(4);
         expect(mockEventSource.eventListeners.size).toBe(4);
@@ -40,10 +40,69 @@ describe("Testing model file service", () => {
 
     it("should register all events with the event source", () => {
         expect(modelFileService.getEventNames()).toEqual(
-            ["model-init", "model-added", "model-updated", "model-removed"]
+            ["model-init", "model-added", "model-updated", "model-removed", "model-patch"]
         );
     });
 
+    it("should request patches from the stream", () => {
+        expect(modelFileService.getStreamParams().get("model_patch")).toBe("1");
+    });
+
+    it("should not request summaries from the stream by default", () => {
+        expect(modelFileService.getStreamParams().has("model_summary")).toBe(false);
+    });
+
+    it("should request summaries from the stream once enabled", () => {
+        modelFileService.enableSummaries();
+        expect(modelFileService.getStreamParams().get("model_summary")).toBe("1");
+    });
+
+    it("should send correct model on a summary init event", fakeAsync(() => {
+        let latestModel: Immutable.Map<string, ModelFile> = null;
+        modelFileService.files.subscribe({
+            next: modelFiles => {
+                latestModel = modelFiles;
+            }
+        });
+
+        let summaryModelFiles = [
+            {
+                name: "File.One",
+                is_dir: true,
+                local_size: 1234,
+                remote_size: 4567,
+                state: "default",
+                downloading_speed: 99,
+                eta: 54,
+                full_path: "/full/path/to/file.one",
+                children_count: 12
+            }
+        ];
+        modelFileService.notifyEvent("model-init", JSON.stringify(summaryModelFiles));
+        tick();
+        expect(latestModel.size).toBe(1);
+        const file = latestModel.get("File.One");
+        expect(file.children_count).toBe(12);
+        expect(file.children.size).toBe(0);
+        expect(file.local_size).toBe(1234);
+    }));
+
+    it("should send a GET on fetch file", fakeAsync(() => {
+        let count = 0;
+        modelFileService.fetchFile("File.One/Sub Dir", 100, 50).subscribe({
+            next: reaction => {
+                expect(reaction.success).toBe(true);
+                expect(reaction.data).toBe("{}");
+                count++;
+            }
+        });
+        httpMock.expectOne("/server/model/file/File.One%252FSub%2520Dir?offset=100&limit=50").flush("{}");
+
+        tick();
+        expect(count).toBe(1);
+        httpMock.verify();
+    }));
+
     it("should send correct model on an init event", fakeAsync(() => {
         let count = 0;
         let latestModel: Immutable.Map<string, ModelFile> = null;
@@ -287,6 +346,103 @@ describe("Testing model file service", () => {
         expect(Immutable.is(latestModel.get("File.One"), expectedModelFiles[0])).toBe(true);
     }));
 
+    it("should send correct model on a patch event", fakeAsync(() => {
+        let initialModelFiles = [
+            {
+                name: "File.One",
+                is_dir: true,
+                local_size: 1234,
+                remote_size: 4567,
+                state: "default",
+                downloading_speed: 99,
+                eta: 54,
+                full_path: "/full/path/to/file.one",
+                children: [
+                    {
+                        name: "Child.One",
+                        is_dir: false,
+                        local_size: 1000,
+                        remote_size: 4000,
+                        state: "default",
+                        downloading_speed: 99,
+                        eta: 54,
+                        full_path: "/full/path/to/file.one/child.one",
+                        children: []
+                    }
+                ]
+            }
+        ];
+        modelFileService.notifyEvent("model-init", JSON.stringify(initialModelFiles));
+
+        let count = 0;
+        let latestModel: Immutable.Map<string, ModelFile> = null;
+        modelFileService.files.subscribe({
+            next: modelFiles => {
+                count++;
+                latestModel = modelFiles;
+            }
+        });
+        tick();
+        expect(count).toBe(1);
+        expect(latestModel.size).toBe(1);
+
+        let patch = {
+            name: "File.One",
+            ops: [
+                {op: "replace", path: [], fields: {state: "downloading", downloading_speed: 55, eta: 1}},
+                {op: "replace", path: ["Child.One"], fields: {local_size: 2000}}
+            ]
+        };
+
+        let expectedModelFile = new ModelFile({
+            name: "File.One",
+            is_dir: true,
+            local_size: 1234,
+            remote_size: 4567,
+            state: ModelFile.State.DOWNLOADING,
+            downloading_speed: 55,
+            eta: 1,
+            full_path: "/full/path/to/file.one",
+            children: Immutable.Set<ModelFile>([
+                new ModelFile({
+                    name: "Child.One",
+                    is_dir: false,
+                    local_size: 2000,
+                    remote_size: 4000,
+                    state: ModelFile.State.DEFAULT,
+                    downloading_speed: 99,
+                    eta: 54,
+                    full_path: "/full/path/to/file.one/child.one",
+                    children: Immutable.Set<ModelFile>()
+                })
+            ])
+        });
+        modelFileService.notifyEvent("model-patch", JSON.stringify(patch));
+        tick();
+        expect(count).toBe(2);
+        expect(latestModel.size).toBe(1);
+        expect(Immutable.is(latestModel.get("File.One"), expectedModelFile)).toBe(true);
+    }));
+
+    it("should ignore a patch event for an unknown file", fakeAsync(() => {
+        let count = 0;
+        modelFileService.files.subscribe({
+            next: modelFiles => {
+                count++;
+            }
+        });
+        tick();
+        expect(count).toBe(1);
+
+        let patch = {
+            name: "File.One",
+            ops: [{op: "replace", path: [], fields: {eta: 1}}]
+        };
+        modelFileService.notifyEvent("model-patch", JSON.stringify(patch));
+        tick();
+        expect(count).toBe(1);
+    }));
+
     it("should send empty model on disconnect", fakeAsync(() => {
         let count = 0;
         let latestModel: Immutable.Map<string, ModelFile> = null;
@@ -170,3 +170,134 @@ describe("Testing model file initialization", () => {
         expect(b.children.size).toBe(0);
     });
 });
+
+
+describe("Testing model file patches", () => {
+    let baseModelFile: ModelFile;
+
+    beforeEach(() => {
+        baseModelFile = ModelFile.fromJson({
+            name: "root",
+            is_dir: true,
+            local_size: 3,
+            remote_size: 33,
+            state: "default",
+            downloading_speed: null,
+            eta: null,
+            full_path: "root",
+            is_extractable: false,
+            local_created_timestamp: null,
+            local_modified_timestamp: null,
+            remote_created_timestamp: null,
+            remote_modified_timestamp: null,
+            children: [
+                {
+                    name: "a",
+                    is_dir: true,
+                    local_size: 1,
+                    remote_size: 11,
+                    state: "default",
+                    downloading_speed: null,
+                    eta: null,
+                    full_path: "root/a",
+                    is_extractable: false,
+                    local_created_timestamp: null,
+                    local_modified_timestamp: null,
+                    remote_created_timestamp: null,
+                    remote_modified_timestamp: null,
+                    children: [
+                        {
+                            name: "aa",
+                            is_dir: false,
+                            local_size: 1,
+                            remote_size: 11,
+                            state: "default",
+                            downloading_speed: null,
+                            eta: null,
+                            full_path: "root/a/aa",
+                            is_extractable: false,
+                            local_created_timestamp: null,
+                            local_modified_timestamp: null,
+                            remote_created_timestamp: null,
+                            remote_modified_timestamp: null,
+                            children: []
+                        }
+                    ]
+                },
+                {
+                    name: "b",
+                    is_dir: false,
+                    local_size: 2,
+                    remote_size: 22,
+                    state: "default",
+                    downloading_speed: null,
+                    eta: null,
+                    full_path: "root/b",
+                    is_extractable: false,
+                    local_created_timestamp: null,
+                    local_modified_timestamp: null,
+                    remote_created_timestamp: null,
+                    remote_modified_timestamp: null,
+                    children: []
+                }
+            ]
+        });
+    });
+
+    it("should replace fields of the root", () => {
+        const patched = ModelFile.applyPatch(baseModelFile, [
+            {op: "replace", path: [], fields: {
+                state: "downloading",
+                downloading_speed: 100,
+                local_modified_timestamp: "1541828418.9439101"
+            }}
+        ]);
+        expect(patched instanceof ModelFile).toBe(true);
+        expect(patched.state).toBe(ModelFile.State.DOWNLOADING);
+        expect(patched.downloading_speed).toBe(100);
+        expect(patched.local_modified_timestamp).toEqual(new Date(1541828418943));
+        expect(patched.local_size).toBe(3);
+        expect(Immutable.is(patched.children, baseModelFile.children)).toBe(true);
+    });
+
+    it("should replace fields of a nested child", () => {
+        const patched = ModelFile.applyPatch(baseModelFile, [
+            {op: "replace", path: ["a", "aa"], fields: {local_size: 5}}
+        ]);
+        const a = patched.children.find(value => value.name === "a");
+        const aa = a.children.find(value => value.name === "aa");
+        expect(aa.local_size).toBe(5);
+        expect(aa.remote_size).toBe(11);
+        expect(a.local_size).toBe(1);
+        expect(patched.children.size).toBe(2);
+    });
+
+    it("should add and remove children", () => {
+        const patched = ModelFile.applyPatch(baseModelFile, [
+            {op: "add", path: ["a", "ab"], file: {
+                name: "ab",
+                is_dir: false,
+                local_size: 7,
+                remote_size: 77,
+                state: "default",
+                downloading_speed: null,
+                eta: null,
+                full_path: "root/a/ab",
+                is_extractable: false,
+                local_created_timestamp: null,
+                local_modified_timestamp: null,
+                remote_created_timestamp: null,
+                remote_modified_timestamp: null,
+                children: []
+            }},
+            {op: "remove", path: ["b"]}
+        ]);
+        expect(patched.children.size).toBe(1);
+        const a = patched.children.find(value => value.name === "a");
+        expect(a.children.size).toBe(2);
+        const ab = a.children.find(value => value.name === "ab");
+        expect(ab instanceof ModelFile).toBe(true);
+        expect(ab.local_size).toBe(7);
+        expect(ab.children.size).toBe(0);
+    });
+});
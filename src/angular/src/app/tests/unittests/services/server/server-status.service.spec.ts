@@ -54,7 +54,12 @@ describe("Testing server status service", () => {
                 latest_local_scan_time: null,
                 latest_remote_scan_time: null,
                 latest_remote_scan_failed: null,
-                latest_remote_scan_error: null
+                latest_remote_scan_error: null,
+                local_scan_interval_ms: null,
+                remote_scan_interval_ms: null
+            },
+            web: {
+                stream_queues: []
             }
         };
         serverStatusService.notifyEvent("status", JSON.stringify(statusJson));
@@ -83,7 +88,12 @@ describe("Testing server status service", () => {
                 latest_local_scan_time: null,
                 latest_remote_scan_time: null,
                 latest_remote_scan_failed: null,
-                latest_remote_scan_error: null
+                latest_remote_scan_error: null,
+                local_scan_interval_ms: null,
+                remote_scan_interval_ms: null
+            },
+            web: {
+                stream_queues: []
             }
         };
         serverStatusService.notifyEvent("status", JSON.stringify(statusJson));
@@ -17,7 +17,15 @@ describe("Testing log record initialization", () => {
                 latest_local_scan_time: "1514776875.9439101",
                 latest_remote_scan_time: "1524743857.3456243",
                 latest_remote_scan_failed: true,
-                latest_remote_scan_error: "message failure reason"
+                latest_remote_scan_error: "message failure reason",
+                local_scan_interval_ms: 20000,
+                remote_scan_interval_ms: 120000
+            },
+            web: {
+                stream_queues: [
+                    {name: "model", depth: 3, drops: 10, max_latency_ms: 1500},
+                    {name: "log", depth: 0, drops: 0, max_latency_ms: 2}
+                ]
             }
         };
         baseStatus = ServerStatus.fromJson(baseJson);
@@ -58,4 +66,16 @@ describe("Testing log record initialization", () => {
     it("should correctly initialize controller error", () => {
         expect(baseStatus.controller.latestRemoteScanError).toBe("message failure reason");
     });
+
+    it("should correctly initialize controller scan intervals", () => {
+        expect(baseStatus.controller.localScanIntervalMs).toBe(20000);
+        expect(baseStatus.controller.remoteScanIntervalMs).toBe(120000);
+    });
+
+    it("should correctly initialize web stream queues", () => {
+        expect(baseStatus.web.streamQueues).toEqual([
+            {name: "model", depth: 3, drops: 10, maxLatencyMs: 1500},
+            {name: "log", depth: 0, drops: 0, maxLatencyMs: 2}
+        ]);
+    });
 });
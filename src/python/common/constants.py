@@ -14,3 +14,13 @@ class Constants:
     MIN_PERSIST_TO_FILE_INTERVAL_IN_SECS = 30
     JSON_PRETTY_PRINT_INDENT = 4
     LFTP_TEMP_FILE_SUFFIX = ".lftp"
+    LFTP_STATUS_POLL_INTERVAL_IN_SECS = 0.5
+    CONTROLLER_EVENT_DEBOUNCE_IN_SECS = 0.01
+    LOCAL_SCAN_NUM_WORKERS = 8
+    LOCAL_SCAN_USE_INOTIFY = True
+    LOCAL_SCAN_MAX_INTERVAL_IN_MS = 60000
+    REMOTE_SCAN_MAX_INTERVAL_IN_MS = 120000
+    REMOTE_SCAN_COMPRESSION = "zlib"
+    WEB_MODEL_MIN_UPDATE_INTERVAL_IN_MS = 500
+    WEB_MODEL_MAX_PENDING_UPDATES = 1000
+    WEB_LOG_STREAM_MAX_QUEUE_SIZE = 1000
@@ -49,7 +49,7 @@ class Job(threading.Thread, ABC):
                 self.shutdown_flag.set()
                 break
 
-            time.sleep(Job._DEFAULT_SLEEP_INTERVAL_IN_SECS)
+            self.sleep()
 
         # ... Clean shutdown code here ...
         self.logger.debug("Calling cleanup for {}".format(self.name))
@@ -65,6 +65,15 @@ class Job(threading.Thread, ABC):
         """
         self.shutdown_flag.set()
 
+    def sleep(self):
+        """
+        Sleep between executions
+        Jobs can override this to wake up early, but they should not sleep
+        much longer, otherwise the job won't be able to safely terminate
+        :return:
+        """
+        time.sleep(Job._DEFAULT_SLEEP_INTERVAL_IN_SECS)
+
     def propagate_exception(self):
         """
         Raises any exception captured by this job in whatever thread calls this method
@@ -117,6 +117,8 @@ class Status(BaseStatus):
         latest_remote_scan_time = StatusComponent._create_property("latest_remote_scan_time")
         latest_remote_scan_failed = StatusComponent._create_property("latest_remote_scan_failed")
         latest_remote_scan_error = StatusComponent._create_property("latest_remote_scan_error")
+        local_scan_interval_ms = StatusComponent._create_property("local_scan_interval_ms")
+        remote_scan_interval_ms = StatusComponent._create_property("remote_scan_interval_ms")
 
         def __init__(self):
             super().__init__()
@@ -124,12 +126,23 @@ class Status(BaseStatus):
             self.latest_remote_scan_time = None
             self.latest_remote_scan_failed = None
             self.latest_remote_scan_error = None
+            self.local_scan_interval_ms = None  # current interval between local scans
+            self.remote_scan_interval_ms = None  # current interval between remote scans
+
+    class WebStatus(StatusComponent):
+        stream_queues = StatusComponent._create_property("stream_queues")
+
+        def __init__(self):
+            super().__init__()
+            # (stream name, metrics) pairs of the queues of the open web streams
+            self.stream_queues = ()
 
     # ----- End of component definition -----
 
     # Component registration
     server = BaseStatus._create_property("server")
     controller = BaseStatus._create_property("controller")
+    web = BaseStatus._create_property("web")
 
     def __init__(self):
         self._listeners = []
@@ -139,6 +152,7 @@ class Status(BaseStatus):
         # Component initialization
         self.server = self.__create_component(Status.ServerStatus)
         self.controller = self.__create_component(Status.ControllerStatus)
+        self.web = self.__create_component(Status.WebStatus)
 
     def copy(self) -> "Status":
         copy = Status()
@@ -1,11 +1,12 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import multiprocessing
+import time
 from abc import ABC, abstractmethod
-from typing import List, Callable
+from typing import List, Callable, Optional
 from threading import Lock
 from queue import Queue
 from enum import Enum
-import copy
 
 # my libs
 from .scan import ScannerProcess, ActiveScanner, LocalScanner, RemoteScanner
@@ -84,6 +85,10 @@ class Controller:
         # The command queue
         self.__command_queue = Queue()
 
+        # Set by commands, child processes and threads when there is something new to process
+        # A multiprocessing event works for both threads and processes
+        self.__wake_event = multiprocessing.Event()
+
         # The model
         self.__model = Model()
         self.__model.set_base_logger(self.logger)
@@ -122,7 +127,9 @@ class Controller:
         self.__active_scanner = ActiveScanner(self.__context.config.lftp.local_path)
         self.__local_scanner = LocalScanner(
             local_path=self.__context.config.lftp.local_path,
-            use_temp_file=self.__context.config.lftp.use_temp_file
+            use_temp_file=self.__context.config.lftp.use_temp_file,
+            num_workers=Constants.LOCAL_SCAN_NUM_WORKERS,
+            use_inotify=Constants.LOCAL_SCAN_USE_INOTIFY
         )
         self.__remote_scanner = RemoteScanner(
             remote_address=self.__context.config.lftp.remote_address,
@@ -131,21 +138,31 @@ class Controller:
             remote_port=self.__context.config.lftp.remote_port,
             remote_path_to_scan=self.__context.config.lftp.remote_path,
             local_path_to_scan_script=self.__context.args.local_path_to_scanfs,
-            remote_path_to_scan_script=self.__context.config.lftp.remote_path_to_scan_script
+            remote_path_to_scan_script=self.__context.config.lftp.remote_path_to_scan_script,
+            compression=Constants.REMOTE_SCAN_COMPRESSION
         )
 
         self.__active_scan_process = ScannerProcess(
             scanner=self.__active_scanner,
             interval_in_ms=self.__context.config.controller.interval_ms_downloading_scan,
-            verbose=False
+            verbose=False,
+            wake_event=self.__wake_event
         )
+        # Local and remote scans back off while nothing changes
+        # Local scans using inotify are event-driven, and never back off
         self.__local_scan_process = ScannerProcess(
             scanner=self.__local_scanner,
             interval_in_ms=self.__context.config.controller.interval_ms_local_scan,
+            max_interval_in_ms=max(Constants.LOCAL_SCAN_MAX_INTERVAL_IN_MS,
+                                   self.__context.config.controller.interval_ms_local_scan),
+            wake_event=self.__wake_event
         )
         self.__remote_scan_process = ScannerProcess(
             scanner=self.__remote_scanner,
             interval_in_ms=self.__context.config.controller.interval_ms_remote_scan,
+            max_interval_in_ms=max(Constants.REMOTE_SCAN_MAX_INTERVAL_IN_MS,
+                                   self.__context.config.controller.interval_ms_remote_scan),
+            wake_event=self.__wake_event
         )
 
         # Setup extract process
@@ -155,7 +172,8 @@ class Controller:
             out_dir_path = self.__context.config.controller.extract_path
         self.__extract_process = ExtractProcess(
             out_dir_path=out_dir_path,
-            local_path=self.__context.config.lftp.local_path
+            local_path=self.__context.config.lftp.local_path,
+            wake_event=self.__wake_event
         )
 
         # Setup multiprocess logging
@@ -168,6 +186,7 @@ class Controller:
         # Keep track of active files
         self.__active_downloading_file_names = []
         self.__active_extracting_file_names = []
+        self.__scans_active = False
 
         # Keep track of active command processes
         self.__active_command_processes = []
@@ -186,6 +205,8 @@ class Controller:
         self.__remote_scan_process.start()
         self.__extract_process.start()
         self.__mp_logger.start()
+        self.__lftp.start_status_polling(Constants.LFTP_STATUS_POLL_INTERVAL_IN_SECS,
+                                         status_event=self.__wake_event)
         self.__started = True
 
     def process(self):
@@ -201,6 +222,29 @@ class Controller:
         self.__process_commands()
         self.__update_model()
 
+    def wait_for_events(self, timeout_in_secs: float) -> bool:
+        """
+        Wait until there is something new to process, i.e. a command, a scan result,
+        an extract update or an lftp status, or until the timeout
+        :param timeout_in_secs: maximum time to wait
+        :return: True if woken by an event, False on timeout
+        """
+        if not self.__wake_event.wait(timeout=timeout_in_secs):
+            return False
+        # Events tend to come in bursts, and results can arrive slightly after their
+        # event because queues are flushed by a background thread. Wait a little
+        # so that they are all handled in the same pass.
+        time.sleep(Constants.CONTROLLER_EVENT_DEBOUNCE_IN_SECS)
+        self.__wake_event.clear()
+        return True
+
+    def wake(self):
+        """
+        Wake up a wait_for_events() call
+        :return:
+        """
+        self.__wake_event.set()
+
     def exit(self):
         self.logger.debug("Exiting controller")
         if self.__started:
@@ -219,7 +263,8 @@ class Controller:
 
     def get_model_files(self) -> List[ModelFile]:
         """
-        Returns a copy of all the model files
+        Returns all the model files
+        The files are frozen, so they are not copied
         :return:
         """
         # Lock the model
@@ -229,6 +274,23 @@ class Controller:
         self.__model_lock.release()
         return model_files
 
+    def get_model_file(self, name: str) -> Optional[ModelFile]:
+        """
+        Returns the model file of the given name, or None if there is no such file
+        The file is frozen, so it is not copied
+        :param name:
+        :return:
+        """
+        # Lock the model
+        self.__model_lock.acquire()
+        try:
+            return self.__model.get_file(name)
+        except ModelError:
+            return None
+        finally:
+            # Release the model
+            self.__model_lock.release()
+
     def add_model_listener(self, listener: IModelListener):
         """
         Adds a listener to the controller's model
@@ -276,12 +338,12 @@ class Controller:
 
     def queue_command(self, command: Command):
         self.__command_queue.put(command)
+        self.__wake_event.set()
 
     def __get_model_files(self) -> List[ModelFile]:
-        model_files = []
-        for filename in self.__model.get_file_names():
-            model_files.append(copy.deepcopy(self.__model.get_file(filename)))
-        return model_files
+        # Model files are frozen by the model builder and replaced rather than
+        # modified, so readers can share them
+        return self.__model.get_files()
 
     def __update_model(self):
         # Grab the latest scan results
@@ -289,10 +351,10 @@ class Controller:
         latest_local_scan = self.__local_scan_process.pop_latest_result()
         latest_active_scan = self.__active_scan_process.pop_latest_result()
 
-        # Grab the Lftp status
+        # Grab the latest Lftp status, polled in the background
         lftp_statuses = None
         try:
-            lftp_statuses = self.__lftp.status()
+            lftp_statuses = self.__lftp.pop_latest_status()
         except LftpError as e:
             self.logger.warning("Caught lftp error: {}".format(str(e)))
 
@@ -317,6 +379,13 @@ class Controller:
             self.__active_downloading_file_names + self.__active_extracting_file_names
         )
 
+        # Keep the scans fast while files are changing
+        scans_active = bool(self.__active_downloading_file_names or self.__active_extracting_file_names)
+        if scans_active != self.__scans_active:
+            self.__scans_active = scans_active
+            self.__local_scan_process.set_active(scans_active)
+            self.__remote_scan_process.set_active(scans_active)
+
         # Update model builder state
         if latest_remote_scan is not None:
             self.__model_builder.set_remote_files(latest_remote_scan.files)
@@ -341,7 +410,10 @@ class Controller:
             self.__model_lock.acquire()
 
             # Diff the new model with old model
-            model_diff = ModelDiffUtil.diff_models(self.__model, new_model)
+            # Only the rebuilt files can differ, the rest are shared with the old model
+            model_diff = ModelDiffUtil.diff_models(self.__model,
+                                                   new_model,
+                                                   self.__model_builder.get_rebuilt_file_names())
 
             # Apply changes to the new model
             for diff in model_diff:
@@ -397,8 +469,10 @@ class Controller:
             self.__context.status.controller.latest_remote_scan_time = latest_remote_scan.timestamp
             self.__context.status.controller.latest_remote_scan_failed = latest_remote_scan.failed
             self.__context.status.controller.latest_remote_scan_error = latest_remote_scan.error_message
+            self.__context.status.controller.remote_scan_interval_ms = latest_remote_scan.interval_in_ms
         if latest_local_scan is not None:
             self.__context.status.controller.latest_local_scan_time = latest_local_scan.timestamp
+            self.__context.status.controller.local_scan_interval_ms = latest_local_scan.interval_in_ms
 
     def __process_commands(self):
         def _notify_failure(_command: Controller.Command, _msg: str):
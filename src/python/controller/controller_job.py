@@ -29,6 +29,17 @@ class ControllerJob(Job):
         self.__controller.process()
         self.__auto_queue.process()
 
+    @overrides(Job)
+    def sleep(self):
+        # Wake up as soon as the controller has something to process
+        # The sleep interval is kept as the longest time between executions
+        self.__controller.wait_for_events(Job._DEFAULT_SLEEP_INTERVAL_IN_SECS)
+
+    @overrides(Job)
+    def terminate(self):
+        super().terminate()
+        self.__controller.wake()
+
     @overrides(Job)
     def cleanup(self):
         self.__controller.exit()
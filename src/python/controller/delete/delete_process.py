@@ -40,7 +40,8 @@ class DeleteRemoteProcess(AppOneShotProcess):
         self.__ssh = Sshcp(host=remote_address,
                            port=remote_port,
                            user=remote_username,
-                           password=remote_password)
+                           password=remote_password,
+                           use_control_master=True)
 
     def run_once(self):
         self.__ssh.set_base_logger(self.logger)
@@ -1,6 +1,7 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import multiprocessing
+import multiprocessing.synchronize
 import datetime
 import time
 import queue
@@ -29,9 +30,13 @@ class ExtractProcess(AppProcess):
     __DEFAULT_SLEEP_INTERVAL_IN_SECS = 0.5
 
     class __ExtractListener(ExtractListener):
-        def __init__(self, logger: logging.Logger, completed_queue: multiprocessing.Queue):
+        def __init__(self,
+                     logger: logging.Logger,
+                     completed_queue: multiprocessing.Queue,
+                     wake_event: Optional[multiprocessing.synchronize.Event]):
             self.logger = logger
             self.completed_queue = completed_queue
+            self.wake_event = wake_event
 
         def extract_completed(self, name: str, is_dir: bool):
             self.logger.info("Extraction completed for {}".format(name))
@@ -39,18 +44,31 @@ class ExtractProcess(AppProcess):
                                                       name=name,
                                                       is_dir=is_dir)
             self.completed_queue.put(completed_result)
+            if self.wake_event is not None:
+                self.wake_event.set()
 
         def extract_failed(self, name: str, is_dir: bool):
             self.logger.error("Extraction failed for {}".format(name))
 
-    def __init__(self, out_dir_path: str, local_path: str):
+    def __init__(self,
+                 out_dir_path: str,
+                 local_path: str,
+                 wake_event: Optional[multiprocessing.synchronize.Event] = None):
+        """
+        :param out_dir_path:
+        :param local_path:
+        :param wake_event: Optional event that is set whenever an extraction
+                           completes or the statuses change
+        """
         super().__init__(name=self.__class__.__name__)
         self.__out_dir_path = out_dir_path
         self.__local_path = local_path
+        self.__wake_event = wake_event
         self.__command_queue = multiprocessing.Queue()
         self.__status_result_queue = multiprocessing.Queue()
         self.__completed_result_queue = multiprocessing.Queue()
         self.__dispatch = None
+        self.__prev_statuses = None
 
     @overrides(AppProcess)
     def run_init(self):
@@ -61,7 +79,8 @@ class ExtractProcess(AppProcess):
         # Add extract listener
         listener = ExtractProcess.__ExtractListener(
             logger=self.logger,
-            completed_queue=self.__completed_result_queue
+            completed_queue=self.__completed_result_queue,
+            wake_event=self.__wake_event
         )
         self.__dispatch.add_listener(listener)
 
@@ -90,6 +109,9 @@ class ExtractProcess(AppProcess):
         status_result = ExtractStatusResult(timestamp=datetime.datetime.now(),
                                             statuses=statuses)
         self.__status_result_queue.put(status_result)
+        if self.__wake_event is not None and statuses != self.__prev_statuses:
+            self.__wake_event.set()
+        self.__prev_statuses = statuses
 
         time.sleep(ExtractProcess.__DEFAULT_SLEEP_INTERVAL_IN_SECS)
 
@@ -1,21 +1,61 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import errno
 import logging
-from typing import List
+import os
+import time
+from typing import List, Dict, Optional, Set
 
 from .scanner_process import IScanner, ScannerError
 from common import overrides, Localization, Constants
-from system import SystemScanner, SystemFile, SystemScannerError
+from system import SystemScanner, SystemFile, SystemScannerError, Inotify, InotifyError
 
 
 class LocalScanner(IScanner):
     """
     Scanner implementation to scan the local filesystem
+
+    Optionally, inotify is used to avoid full scans. The scanner watches every
+    directory in the local path and keeps the latest scanned tree. Each scan
+    only rescans the root files that had events since the last scan, and
+    returns None if none of them changed, so that a result is only published
+    when something changed.
+    Files written in place (IN_MODIFY) send an event per write, so these events
+    rescan their root file at most once per debounce interval per directory.
+    A full scan is still done periodically as a safety net, and after the
+    event queue overflows. If inotify is unavailable or the watch limit is
+    reached, the scanner falls back to full scans.
     """
-    def __init__(self, local_path: str, use_temp_file: bool):
+    __RECONCILE_INTERVAL_IN_SECS = 300
+    __MODIFY_DEBOUNCE_IN_SECS = 5
+    __LFTP_STATUS_FILE_SUFFIX = ".lftp-pget-status"
+    __WATCH_MASK = Inotify.IN_MODIFY | Inotify.IN_ATTRIB | Inotify.IN_CLOSE_WRITE | Inotify.IN_CREATE | \
+        Inotify.IN_DELETE | Inotify.IN_DELETE_SELF | Inotify.IN_MOVED_FROM | \
+        Inotify.IN_MOVED_TO | Inotify.IN_MOVE_SELF | Inotify.IN_ONLYDIR
+
+    def __init__(self, local_path: str, use_temp_file: bool, num_workers: int = 1, use_inotify: bool = False):
+        """
+        :param local_path: path to scan
+        :param use_temp_file: whether lftp is using temp files
+        :param num_workers: number of threads to scan directories in parallel
+        :param use_inotify: use inotify to only rescan changed files
+        """
+        self.__local_path = local_path
         self.__scanner = SystemScanner(local_path)
+        self.__scanner.set_num_workers(num_workers)
+        self.__temp_file_suffix = None
         if use_temp_file:
+            self.__temp_file_suffix = Constants.LFTP_TEMP_FILE_SUFFIX
             self.__scanner.set_lftp_temp_suffix(Constants.LFTP_TEMP_FILE_SUFFIX)
+        self.__use_inotify = use_inotify
+        # Inotify state is created lazily so it belongs to the scanning process
+        self.__inotify = None
+        self.__root_wd = None
+        self.__watches = {}  # type: Dict[int, str]  # wd -> dir path
+        self.__files = {}  # type: Dict[str, SystemFile]  # root name -> latest file
+        self.__modified_names = {}  # type: Dict[int, Set[str]]  # wd -> root names with pending writes
+        self.__modify_times = {}  # type: Dict[int, float]  # wd -> time writes last triggered a rescan
+        self.__last_full_scan_time = None
         self.logger = logging.getLogger("LocalScanner")
 
     @overrides(IScanner)
@@ -23,10 +63,184 @@ class LocalScanner(IScanner):
         self.logger = base_logger.getChild("LocalScanner")
 
     @overrides(IScanner)
-    def scan(self) -> List[SystemFile]:
+    def is_event_driven(self) -> bool:
+        # False once the scanner falls back to full scans
+        return self.__use_inotify
+
+    @overrides(IScanner)
+    def scan(self) -> Optional[List[SystemFile]]:
+        if not self.__use_inotify:
+            return self.__full_scan()
+
+        if self.__inotify is None:
+            if not self.__start_inotify():
+                return self.__full_scan()
+            return self.__reconcile()
+
+        events = self.__inotify.read_events()
+        if time.time() - self.__last_full_scan_time >= LocalScanner.__RECONCILE_INTERVAL_IN_SECS:
+            return self.__reconcile()
+
+        dirty_names = set()  # type: Set[str]
+        now = time.time()
+        for event in events:
+            if event.mask & Inotify.IN_Q_OVERFLOW:
+                self.logger.warning("Inotify event queue overflowed, doing a full scan")
+                return self.__reconcile()
+            if event.mask & Inotify.IN_IGNORED:
+                self.__watches.pop(event.wd, None)
+                self.__modify_times.pop(event.wd, None)
+                modified_names = self.__modified_names.pop(event.wd, None)
+                if modified_names:
+                    dirty_names.update(modified_names)
+                if event.wd == self.__root_wd:
+                    # Local path itself was removed
+                    return self.__reconcile()
+                continue
+            if event.wd == self.__root_wd:
+                if event.mask & (Inotify.IN_DELETE_SELF | Inotify.IN_MOVE_SELF):
+                    return self.__reconcile()
+                name = self.__root_name_from_entry(event.name)
+            else:
+                dir_path = self.__watches.get(event.wd)
+                if dir_path is None:
+                    continue
+                rel_path = os.path.relpath(dir_path, self.__local_path)
+                name = rel_path.split(os.sep)[0]
+            if event.mask & Inotify.IN_MODIFY:
+                self.__modified_names.setdefault(event.wd, set()).add(name)
+            else:
+                dirty_names.add(name)
+
+        # Writes to the same directory rescan at most once per debounce interval
+        for wd in list(self.__modified_names.keys()):
+            if now - self.__modify_times.get(wd, 0) >= LocalScanner.__MODIFY_DEBOUNCE_IN_SECS:
+                dirty_names.update(self.__modified_names.pop(wd))
+                self.__modify_times[wd] = now
+
+        changed = False
+        try:
+            for name in dirty_names:
+                changed |= self.__rescan_root(name)
+        except InotifyError as e:
+            self.__stop_inotify(e)
+            return self.__full_scan()
+        if not changed:
+            return None
+        return [self.__files[name] for name in sorted(self.__files.keys())]
+
+    def __full_scan(self) -> List[SystemFile]:
         try:
             result = self.__scanner.scan()
         except SystemScannerError:
             self.logger.exception("Caught SystemScannerError")
             raise ScannerError(Localization.Error.LOCAL_SERVER_SCAN, recoverable=False)
         return result
+
+    def __start_inotify(self) -> bool:
+        """
+        Create the inotify instance
+        Returns false if inotify is not available
+        """
+        if not Inotify.is_supported():
+            self.logger.info("Inotify is not supported, falling back to full scans")
+            self.__use_inotify = False
+            return False
+        self.__inotify = Inotify()
+        try:
+            self.__inotify.open()
+        except InotifyError as e:
+            self.__stop_inotify(e)
+            return False
+        return True
+
+    def __stop_inotify(self, error: InotifyError):
+        """Give up on inotify and fall back to full scans"""
+        if error.error_number == errno.ENOSPC:
+            self.logger.warning("Inotify watch limit reached, falling back to full scans. "
+                                "Consider raising fs.inotify.max_user_watches")
+        else:
+            self.logger.warning("Inotify failed, falling back to full scans: {}".format(str(error)))
+        self.__inotify.close()
+        self.__inotify = None
+        self.__watches.clear()
+        self.__files.clear()
+        self.__modified_names.clear()
+        self.__modify_times.clear()
+        self.__use_inotify = False
+
+    def __reconcile(self) -> List[SystemFile]:
+        """
+        Do a full scan and make sure every directory is watched
+        Watches are added before scanning so that no change is missed
+        """
+        try:
+            self.__root_wd = self.__inotify.add_watch(self.__local_path, LocalScanner.__WATCH_MASK)
+            self.__watches = {self.__root_wd: self.__local_path}
+            self.__modified_names = {}
+            self.__modify_times = {}
+            self.__watch_tree(self.__local_path)
+        except InotifyError as e:
+            if e.error_number in (errno.ENOENT, errno.ENOTDIR):
+                # Let the scanner report the bad path
+                return self.__full_scan()
+            self.__stop_inotify(e)
+            return self.__full_scan()
+        self.__last_full_scan_time = time.time()
+        files = self.__full_scan()
+        self.__files = {f.name: f for f in files}
+        return files
+
+    def __watch_tree(self, path: str):
+        """
+        Watch all directories under path, excluding path itself
+        """
+        for dir_path, dir_names, _ in os.walk(path):
+            for dir_name in dir_names:
+                sub_path = os.path.join(dir_path, dir_name)
+                try:
+                    wd = self.__inotify.add_watch(sub_path, LocalScanner.__WATCH_MASK)
+                except InotifyError as e:
+                    # Deleted while walking, the event on its parent covers it
+                    if e.error_number in (errno.ENOENT, errno.ENOTDIR):
+                        continue
+                    raise
+                # A moved directory keeps its descriptor, so this also updates its path
+                self.__watches[wd] = sub_path
+
+    def __root_name_from_entry(self, name: str) -> str:
+        """
+        Returns the raw name of the root file affected by an entry in the local path
+        """
+        if name.endswith(LocalScanner.__LFTP_STATUS_FILE_SUFFIX):
+            name = name[:-len(LocalScanner.__LFTP_STATUS_FILE_SUFFIX)]
+        if self.__temp_file_suffix is not None and \
+                name != self.__temp_file_suffix and \
+                name.endswith(self.__temp_file_suffix):
+            name = name[:-len(self.__temp_file_suffix)]
+        return name
+
+    def __rescan_root(self, raw_name: str) -> bool:
+        """
+        Rescan a single root file and watch any new directories in it
+        Returns true if the root file changed
+        """
+        name = raw_name.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+        try:
+            file = self.__scanner.scan_single(raw_name)
+        except (SystemScannerError, FileNotFoundError):
+            # Deleted
+            return self.__files.pop(name, None) is not None
+        changed = self.__files.get(file.name) != file
+        self.__files[file.name] = file
+        if file.is_dir:
+            path = os.path.join(self.__local_path, raw_name)
+            try:
+                wd = self.__inotify.add_watch(path, LocalScanner.__WATCH_MASK)
+            except InotifyError as e:
+                if e.error_number in (errno.ENOENT, errno.ENOTDIR):
+                    return changed
+                raise
+            self.__watches[wd] = path
+            self.__watch_tree(path)
+        return changed
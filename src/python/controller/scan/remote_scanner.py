@@ -1,22 +1,35 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import logging
-import pickle
 from typing import List
 import os
 from typing import Optional
 import hashlib
+import uuid
 
 from .scanner_process import IScanner, ScannerError
 from common import overrides, Localization
 from ssh import Sshcp, SshcpError
-from system import SystemFile
+from system import SystemFile, SystemScanDelta, ScanCodec, ScanDecoder, ScanCodecError
 
 
 class RemoteScanner(IScanner):
     """
     Scanner implementation to scan the remote filesystem
+    The remote scan script keeps a cache of unchanged directories next to
+    itself. A full rescan that ignores the cache is done on the first scan and
+    periodically thereafter to pick up any changes the cache could have missed.
+
+    The scan script remembers the last scan it sent and only sends the root files
+    that changed since then. Each scan is tagged with a generation id; if the
+    script's record does not match the last generation received here, it falls
+    back to sending a full snapshot.
+
+    The scan output can be compressed by the script to save bandwidth. It is
+    streamed into the decoder as it arrives, and is never held in memory whole.
     """
+    __FULL_RESCAN_INTERVAL = 20  # number of scans between full rescans
+
     def __init__(self,
                  remote_address: str,
                  remote_username: str,
@@ -24,21 +37,35 @@ class RemoteScanner(IScanner):
                  remote_port: int,
                  remote_path_to_scan: str,
                  local_path_to_scan_script: str,
-                 remote_path_to_scan_script: str):
+                 remote_path_to_scan_script: str,
+                 compression: Optional[str] = None):
+        """
+        :param compression: compression used by the scan script, one of
+                            ScanCodec.COMPRESSIONS or None
+        """
+        if compression is not None and compression not in ScanCodec.COMPRESSIONS:
+            raise ValueError("Unknown compression: {}".format(compression))
         self.logger = logging.getLogger("RemoteScanner")
         self.__remote_path_to_scan = remote_path_to_scan
         self.__local_path_to_scan_script = local_path_to_scan_script
         self.__remote_path_to_scan_script = remote_path_to_scan_script
+        self.__compression = compression
         self.__ssh = Sshcp(host=remote_address,
                            port=remote_port,
                            user=remote_username,
-                           password=remote_password)
+                           password=remote_password,
+                           use_control_master=True)
         self.__first_run = True
+        self.__num_scans_since_full_rescan = 0
+        self.__generation = None  # generation of the files below, None if unknown
+        self.__remote_files = []  # latest files, used as the base for deltas
 
         # Append scan script name to remote path if not there already
         script_name = os.path.basename(self.__local_path_to_scan_script)
         if os.path.basename(self.__remote_path_to_scan_script) != script_name:
             self.__remote_path_to_scan_script = os.path.join(self.__remote_path_to_scan_script, script_name)
+        self.__remote_path_to_scan_cache = self.__remote_path_to_scan_script + ".cache"
+        self.__remote_path_to_scan_state = self.__remote_path_to_scan_script + ".state"
 
     @overrides(IScanner)
     def set_base_logger(self, base_logger: logging.Logger):
@@ -50,11 +77,26 @@ class RemoteScanner(IScanner):
         if self.__first_run:
             self._install_scanfs()
 
+        full_rescan = self.__first_run or \
+            self.__num_scans_since_full_rescan >= RemoteScanner.__FULL_RESCAN_INTERVAL
+        generation = uuid.uuid4().hex
+        command = [
+            "'{}'".format(self.__remote_path_to_scan_script),
+            "'{}'".format(self.__remote_path_to_scan),
+            "--cache '{}'".format(self.__remote_path_to_scan_cache),
+            "--delta-state '{}'".format(self.__remote_path_to_scan_state),
+            "--generation {}".format(generation)
+        ]
+        if self.__generation is not None:
+            command.append("--base-generation {}".format(self.__generation))
+        if full_rescan:
+            command.append("--full-rescan")
+        if self.__compression is not None:
+            command.append("--compress {}".format(self.__compression))
+        decoder = ScanDecoder()
         try:
-            out = self.__ssh.shell("'{}' '{}'".format(
-                self.__remote_path_to_scan_script,
-                self.__remote_path_to_scan)
-            )
+            self.__ssh.shell_stream(" ".join(command), decoder.feed)
+            result = decoder.result()
         except SshcpError as e:
             self.logger.warning("Caught an SshcpError: {}".format(str(e)))
             recoverable = True
@@ -70,16 +112,37 @@ class RemoteScanner(IScanner):
                 recoverable=recoverable
             )
 
-        try:
-            remote_files = pickle.loads(out)
-        except pickle.UnpicklingError as err:
-            self.logger.error("Unpickling error: {}\n{}".format(str(err), out))
+        except ScanCodecError as err:
+            self.logger.error("Scan decoding error: {}".format(str(err)))
             raise ScannerError(
-                Localization.Error.REMOTE_SERVER_SCAN.format("Invalid pickled data"),
+                Localization.Error.REMOTE_SERVER_SCAN.format("Invalid scan data"),
                 recoverable=False
             )
 
+        if isinstance(result, SystemScanDelta):
+            if not result.is_full and result.base_generation != self.__generation:
+                # Should never happen, but recover with a full snapshot on the next scan
+                self.logger.warning("Scan delta base generation {} does not match {}".format(
+                    result.base_generation, self.__generation
+                ))
+                self.__generation = None
+                raise ScannerError(
+                    Localization.Error.REMOTE_SERVER_SCAN.format("Scan generation mismatch"),
+                    recoverable=True
+                )
+            self.__remote_files = result.apply(self.__remote_files)
+            self.__generation = result.generation
+        else:
+            # Scan script run without delta state sends a full list
+            self.__remote_files = result
+            self.__generation = None
+        remote_files = self.__remote_files
+
         self.__first_run = False
+        if full_rescan:
+            self.__num_scans_since_full_rescan = 0
+        else:
+            self.__num_scans_since_full_rescan += 1
         return remote_files
 
     def _install_scanfs(self):
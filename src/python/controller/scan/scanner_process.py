@@ -3,6 +3,7 @@
 import logging
 from abc import ABC, abstractmethod
 import multiprocessing
+import multiprocessing.synchronize
 from datetime import datetime
 from typing import List, Optional
 import queue
@@ -29,10 +30,21 @@ class IScanner(ABC):
     This hides the scanning implementation from the scanner process.
     """
     @abstractmethod
-    def scan(self) -> List[SystemFile]:
-        """Scan system"""
+    def scan(self) -> Optional[List[SystemFile]]:
+        """
+        Scan system
+        Event-driven scanners return None if nothing changed since the last scan
+        """
         pass
 
+    def is_event_driven(self) -> bool:
+        """
+        Returns true if scans only collect changes that were reported as they
+        happened, see scan()
+        These scans are cheap, so their interval does not back off
+        """
+        return False
+
     @abstractmethod
     def set_base_logger(self, base_logger: logging.Logger):
         pass
@@ -46,32 +58,58 @@ class ScannerResult:
                  timestamp: datetime,
                  files: List[SystemFile],
                  failed: bool = False,
-                 error_message: str = None):
+                 error_message: str = None,
+                 interval_in_ms: int = None):
         self.timestamp = timestamp
         self.files = files
         self.failed = failed
         self.error_message = error_message
+        self.interval_in_ms = interval_in_ms  # interval until the next scan
 
 
 class ScannerProcess(AppProcess):
     """
     Process to scan a file system and publish the result
+
+    Optionally, the interval between scans adapts to how often the scans change.
+    The interval backs off exponentially while consecutive scans are identical,
+    up to a maximum. It snaps back to the minimum when a scan changes or fails,
+    when a scan is forced, and for as long as the process is marked active.
+    Event-driven scanners always scan at the minimum interval, and a result is
+    only published when they report a change.
     """
+    __BACKOFF_FACTOR = 2
+
     def __init__(self,
                  scanner: IScanner, interval_in_ms: int,
-                 verbose: bool = True):
+                 verbose: bool = True,
+                 max_interval_in_ms: Optional[int] = None,
+                 wake_event: Optional[multiprocessing.synchronize.Event] = None):
         """
         Create a scanner process
         :param scanner: IScanner implementation
         :param interval_in_ms: Minimum interval (in ms) between results
+        :param max_interval_in_ms: Maximum interval (in ms) to back off to when
+                                   scans don't change, None to disable back off
+        :param wake_event: Optional event that is set whenever a new result is available
         """
         super().__init__(name=scanner.__class__.__name__)
+        if max_interval_in_ms is not None and max_interval_in_ms < interval_in_ms:
+            raise ValueError("Maximum interval must not be less than the minimum interval")
         self.__queue = multiprocessing.Queue()
         self.__wake_event = multiprocessing.Event()
+        self.__active_event = multiprocessing.Event()
+        self.__result_wake_event = wake_event
         self.__scanner = scanner
-        self.__interval_in_ms = interval_in_ms
+        self.__min_interval_in_ms = interval_in_ms
+        self.__max_interval_in_ms = max_interval_in_ms
         self.verbose = verbose
 
+        # State of the scan loop, only used in the scanner process
+        self.__interval_in_ms = interval_in_ms
+        self.__prev_files = None
+        self.__forced = False
+
     @overrides(AppProcess)
     def run_init(self):
         # Set the base logger for scanner
@@ -88,8 +126,8 @@ class ScannerProcess(AppProcess):
             self.logger.debug("Running a scan")
         try:
             files = self.__scanner.scan()
-            result = ScannerResult(timestamp=timestamp_start,
-                                   files=files)
+            result = None if files is None else ScannerResult(timestamp=timestamp_start,
+                                                              files=files)
         except ScannerError as e:
             # Non-recoverable errors continue up as a fatal error
             if not e.recoverable:
@@ -98,7 +136,12 @@ class ScannerProcess(AppProcess):
                                    files=[],
                                    failed=True,
                                    error_message=str(e))
-        self.__queue.put(result)
+        self.__update_interval(result)
+        if result is not None:
+            result.interval_in_ms = self.__interval_in_ms
+            self.__queue.put(result)
+            if self.__result_wake_event is not None:
+                self.__result_wake_event.set()
         delta_in_s = (datetime.now() - timestamp_start).total_seconds()
         delta_in_ms = int(delta_in_s * 1000)
         if self.verbose:
@@ -107,9 +150,39 @@ class ScannerProcess(AppProcess):
         # Wait until the next interval, or until a wake event is fired
         if delta_in_ms < self.__interval_in_ms:
             wait_time_in_s = float(self.__interval_in_ms - delta_in_ms) / 1000.0
-            self.__wake_event.wait(timeout=wait_time_in_s)
+            self.__forced = self.__wake_event.wait(timeout=wait_time_in_s)
             self.__wake_event.clear()
 
+    def __update_interval(self, result: Optional[ScannerResult]):
+        """
+        Pick the interval until the next scan
+        :param result: None if an event-driven scanner had no changes
+        :return:
+        """
+        if self.__max_interval_in_ms is None:
+            return
+        if self.__scanner.is_event_driven():
+            # Checking for events is cheap, backing off would only delay changes
+            self.__interval_in_ms = self.__min_interval_in_ms
+            self.__prev_files = None
+            self.__forced = False
+            return
+        # Scans of unchanged files share content hashes, so comparisons are cheap
+        if result is None:
+            unchanged = True
+        else:
+            unchanged = not result.failed and self.__prev_files is not None and result.files == self.__prev_files
+            self.__prev_files = None if result.failed else result.files
+        if not unchanged or self.__forced or self.__active_event.is_set():
+            interval_in_ms = self.__min_interval_in_ms
+        else:
+            interval_in_ms = min(self.__interval_in_ms * ScannerProcess.__BACKOFF_FACTOR,
+                                 self.__max_interval_in_ms)
+        self.__forced = False
+        if self.verbose and interval_in_ms != self.__interval_in_ms:
+            self.logger.debug("Scan interval is now {}ms".format(interval_in_ms))
+        self.__interval_in_ms = interval_in_ms
+
     def pop_latest_result(self) -> Optional[ScannerResult]:
         """
         Process-safe method to retrieve latest scan result
@@ -128,3 +201,18 @@ class ScannerProcess(AppProcess):
     def force_scan(self):
         """Force process to wake and do an immediate scan"""
         self.__wake_event.set()
+
+    def set_active(self, active: bool):
+        """
+        Process-safe method to keep scans at the minimum interval, e.g. while
+        downloads are active
+        Becoming active also wakes the process for an immediate scan
+        :param active:
+        :return:
+        """
+        if active:
+            if not self.__active_event.is_set():
+                self.__active_event.set()
+                self.__wake_event.set()
+        else:
+            self.__active_event.clear()
@@ -2,7 +2,8 @@
 
 import os
 import re
-from typing import List
+from collections import deque
+from typing import List, Deque
 import logging
 
 from common import AppError
@@ -16,6 +17,10 @@ class LftpJobStatusParserError(AppError):
 class LftpJobStatusParser:
     """
     Parses the output of lftp's "jobs -v" command into a LftpJobStatus
+
+    The output is parsed in a single pass over its lines, and each line is only
+    matched against the patterns that can apply to it. All patterns are compiled
+    once, since the status is parsed every few hundred milliseconds.
     """
     # python doesn't support partial inline-modified flags, so we need
     # to capture all case-sensitive cases here
@@ -23,11 +28,113 @@ class LftpJobStatusParser:
                           "k|kb|kib|K|Kb|KB|KiB|Kib|"
                           "m|mb|mib|M|Mb|MB|MiB|Mib|"
                           "g|gb|gib|G|Gb|GB|GiB|Gib")
-    __TIME_UNITS_REGEX = "(?P<eta_d>\d*d)?(?P<eta_h>\d*h)?(?P<eta_m>\d*m)?(?P<eta_s>\d*s)?"
+    __TIME_UNITS_REGEX = r"(?P<eta_d>\d*d)?(?P<eta_h>\d*h)?(?P<eta_m>\d*m)?(?P<eta_s>\d*s)?"
 
     __QUOTED_FILE_NAME_REGEX = "`(?P<name>.*)'"
 
-    __QUEUE_DONE_REGEX = "^\[(?P<id>\d+)\]\sDone\s\(queue\s\(.+\)\)"
+    __QUEUE_DONE_REGEX = r"^\[(?P<id>\d+)\]\sDone\s\(queue\s\(.+\)\)"
+
+    __SIZE_MULTIPLIERS = {'b': 1, 'k': 1024, 'm': 1024*1024, 'g': 1024*1024*1024}
+
+    # Value patterns
+    __SIZE_M = re.compile(r"(?P<number>\d+\.?\d*)\s*(?P<units>{})?".format(__SIZE_UNITS_REGEX))
+    __ETA_M = re.compile(__TIME_UNITS_REGEX)
+
+    # Output patterns
+    __LOG_LINE_M = re.compile(r"^\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}.*\s->\s.*$")
+
+    # Queue patterns
+    __QUEUE_HEADER1_M = re.compile(r"^\[\d+\] queue \(sftp://.*@.*\)(?:\s+--\s+(?:\d+\.\d+|\d+)\s(?:{})\/s)?$"
+                                   .format(__SIZE_UNITS_REGEX))
+    __QUEUE_HEADER2_M = re.compile("^sftp://.*@.*$")
+    __QUEUE_STOPPED_M = re.compile("Queue is stopped.")
+    __QUEUE_NOW_EXECUTING_M = re.compile("Now executing:")
+    __QUEUE_NOW_EXECUTING_MORE_M = re.compile(r"^-\[\d+\]")
+    __QUEUE_COMMANDS_QUEUED_M = re.compile("Commands queued:")
+    __QUEUE_COMMAND_M = re.compile(r"^\d+\.")
+    __QUEUE_CD_M = re.compile(r"^cd\s.*$")
+    __QUEUE_PGET_M = re.compile(r"^(?P<id>\d+)\.\s+"
+                                r"pget\s+"
+                                r"(?P<flags>.*?)\s+"
+                                r"(?P<lq>[\'\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
+                                r"(?:-o\s+)"
+                                r"(?P<rq>[\'\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
+    __QUEUE_MIRROR_M = re.compile(r"^(?P<id>\d+)\.\s+"
+                                  r"mirror\s+"
+                                  r"(?P<flags>.*?)\s+"
+                                  r"(?P<lq>[\'\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
+                                  r"(?P<rq>[\'\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
+    __QUEUE_DONE_M = re.compile(__QUEUE_DONE_REGEX)
+
+    # Job header patterns
+    # pget header
+    __PGET_HEADER_M = re.compile(r"^\[(?P<id>\d+)\]\s+"
+                                 r"pget\s+"
+                                 r"(?P<flags>.*?)\s+"
+                                 r"(?P<lq>['\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
+                                 r"-o\s+"
+                                 r"(?P<rq>['\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
+    # mirror header (downloading)
+    __MIRROR_HEADER_M = re.compile((r"^\[(?P<id>\d+)\]\s+"
+                                    r"mirror\s+"
+                                    r"(?P<flags>.*?)\s+"
+                                    r"(?P<lq>['\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
+                                    r"(?P<rq>['\"]|)(?P<local>.+)(?P=rq)\s+"  # greedy on purpose
+                                    r"--\s+"
+                                    r"(?P<szlocal>\d+\.?\d*\s?({sz})?)"  # size=0 has no units
+                                    r"\/"
+                                    r"(?P<szremote>\d+\.?\d*\s?({sz})?)\s+"  # size=0 has no units
+                                    r"\((?P<pctlocal>\d+)%\)"
+                                    r"(\s+(?P<speed>\d+\.?\d*\s?({sz}))\/s)?$")
+                                   .format(sz=__SIZE_UNITS_REGEX))
+    # mirror header (connecting or receiving file list)
+    __MIRROR_FL_HEADER_M = re.compile(r"^\[(?P<id>\d+)\]\s+"
+                                      r"mirror\s+"
+                                      r"(?P<flags>.*?)\s+"
+                                      r"(?P<lq>['\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
+                                      r"(?P<rq>['\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
+
+    # Job data patterns
+    __FILENAME_M = re.compile(r"\\transfer\s" + __QUOTED_FILE_NAME_REGEX)
+    __CHUNK_AT_M = re.compile(("^" + __QUOTED_FILE_NAME_REGEX + r"\s+"
+                               r"at\s+"
+                               r"\d+\s+"  # this is NOT the local size
+                               r"(?:\(\d+%\)\s+)?"  # this is NOT the local percent
+                               r"((?P<speed>\d+\.?\d*\s?({sz}))\/s\s+)?"
+                               r"(eta:(?P<eta>{eta})\s+)?"
+                               r"\s*\[(?P<desc>.*)\]$")
+                              .format(sz=__SIZE_UNITS_REGEX, eta=__TIME_UNITS_REGEX))
+    __CHUNK_AT2_M = re.compile("^" + __QUOTED_FILE_NAME_REGEX + r"\s+"
+                               r"at\s+"
+                               r"\d+\s+"  # this is NOT the local size
+                               r"(?:\(\d+%\))")  # this is NOT the local percent
+    __CHUNK_GOT_M = re.compile(("^" + __QUOTED_FILE_NAME_REGEX + r",\s+"
+                                r"got\s+"
+                                r"(?P<szlocal>\d+)\s+"
+                                r"of\s+"
+                                r"(?P<szremote>\d+)\s+"
+                                r"\((?P<pctlocal>\d+)%\)"
+                                r"(\s+(?P<speed>\d+\.?\d*\s?({sz}))\/s)?"
+                                r"(\seta:(?P<eta>{eta}))?")
+                               .format(sz=__SIZE_UNITS_REGEX, eta=__TIME_UNITS_REGEX))
+    __CHUNK_HEADER_M = re.compile(r"\\chunk\s"
+                                  r"(?P<start>\d+)"
+                                  r"-"
+                                  r"(?P<end>\d+)")
+    __CHMOD_HEADER_M = re.compile(r"chmod\s"
+                                  r"(?P<name>.*)")
+    __CHMOD_M = re.compile(__QUOTED_FILE_NAME_REGEX + r"\s\[\]")
+    __MIRROR_M = re.compile((r"\\mirror\s"
+                             "" + __QUOTED_FILE_NAME_REGEX + r"\s+"
+                             r"--\s+"
+                             r"(?P<szlocal>\d+\.?\d*\s?({sz})?)"  # size=0 has no units
+                             r"\/"
+                             r"(?P<szremote>\d+\.?\d*\s?({sz})?)\s+"  # size=0 has no units
+                             r"\((?P<pctlocal>\d+)%\)"
+                             r"(\s+(?P<speed>\d+\.?\d*\s?({sz}))\/s)?$")
+                            .format(sz=__SIZE_UNITS_REGEX))
+    __MIRROR_EMPTY_M = re.compile(r"\\mirror\s"
+                                  "" + __QUOTED_FILE_NAME_REGEX + r"\s*$")
 
     def __init__(self):
         self.logger = logging.getLogger("LftpJobStatusParser")
@@ -44,16 +151,15 @@ class LftpJobStatusParser:
         """
         if size == "0":
             return 0
-        m = re.compile("(?P<number>\d+\.?\d*)\s*(?P<units>{})?".format(LftpJobStatusParser.__SIZE_UNITS_REGEX))
-        result = m.search(size)
+        result = LftpJobStatusParser.__SIZE_M.search(size)
         if not result:
             raise ValueError("String '{}' does not match the size pattern".format(size))
         number = float(result.group("number"))
         unit = (result.group("units") or "b")[0].lower()
-        multipliers = {'b': 1, 'k': 1024, 'm': 1024*1024, 'g': 1024*1024*1024}
-        if unit not in multipliers.keys():
+        multiplier = LftpJobStatusParser.__SIZE_MULTIPLIERS.get(unit)
+        if multiplier is None:
             raise ValueError("Unrecognized unit {} in size string '{}'".format(unit, size))
-        return int(number*multipliers[unit])
+        return int(number*multiplier)
 
     @staticmethod
     def _eta_to_seconds(eta: str) -> int:
@@ -62,8 +168,7 @@ class LftpJobStatusParser:
         :param eta:
         :return:
         """
-        m = re.compile(LftpJobStatusParser.__TIME_UNITS_REGEX)
-        result = m.search(eta)
+        result = LftpJobStatusParser.__ETA_M.search(eta)
         if not result:
             raise ValueError("String '{}' does not match the eta pattern".format(eta))
         # the [:-1] below remove the last character
@@ -75,16 +180,24 @@ class LftpJobStatusParser:
 
     def parse(self, output: str) -> List[LftpJobStatus]:
         statuses = list()
-        lines = [s.strip() for s in output.splitlines()]
-        lines = list(filter(None, lines))  # remove blank lines
-        # remove all lines before the first 'jobs -v'
-        start = next((i+1 for i, l in enumerate(lines) if l == "jobs -v"), 0)
-        lines = lines[start:]
-        # remove any remaining 'jobs -v' lines
-        lines = list(filter(lambda s: s != "jobs -v", lines))
-        # remove any remaining log line
-        lines = filter(lambda s: not re.match(r"^\d{4}-\d{2}-\d{2}\s\d{2}:\d{2}:\d{2}.*\s->\s.*$", s), lines)
-        lines = list(lines)
+        lines = deque()
+        found_jobs_command = False
+        log_line_m = LftpJobStatusParser.__LOG_LINE_M
+        for line in output.splitlines():
+            line = line.strip()
+            if not line:
+                # remove blank lines
+                continue
+            if line == "jobs -v":
+                # remove all lines before the first 'jobs -v', and any remaining 'jobs -v' lines
+                if not found_jobs_command:
+                    lines.clear()
+                    found_jobs_command = True
+                continue
+            if line[0].isdigit() and log_line_m.match(line):
+                # remove any log line
+                continue
+            lines.append(line)
         try:
             statuses += self.__parse_queue(lines)
             statuses += self.__parse_jobs(lines)
@@ -95,267 +208,179 @@ class LftpJobStatusParser:
         return statuses
 
     @staticmethod
-    def __parse_jobs(lines: List[str]) -> List[LftpJobStatus]:
-        jobs = []
+    def __parse_data_line(line: str):
+        """
+        Match a transfer data line
+        :param line:
+        :return: tuple of the 'at', short 'at' and 'got' matches, at most one of which is set
+        """
+        result_at = LftpJobStatusParser.__CHUNK_AT_M.match(line)
+        if result_at:
+            return result_at, None, None
+        result_at2 = LftpJobStatusParser.__CHUNK_AT2_M.match(line)
+        if result_at2:
+            return None, result_at2, None
+        return None, None, LftpJobStatusParser.__CHUNK_GOT_M.match(line)
 
-        # Header patterns
-        # pget header
-        pget_header_pattern = ("^\[(?P<id>\d+)\]\s+"
-                               "pget\s+"
-                               "(?P<flags>.*?)\s+"
-                               "(?P<lq>['\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
-                               "-o\s+"
-                               "(?P<rq>['\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
-        pget_header_m = re.compile(pget_header_pattern)
-
-        # mirror header (downloading)
-        mirror_header_pattern = ("^\[(?P<id>\d+)\]\s+"
-                                 "mirror\s+"
-                                 "(?P<flags>.*?)\s+"
-                                 "(?P<lq>['\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
-                                 "(?P<rq>['\"]|)(?P<local>.+)(?P=rq)\s+"  # greedy on purpose
-                                 "--\s+"
-                                 "(?P<szlocal>\d+\.?\d*\s?({sz})?)"  # size=0 has no units
-                                 "\/"
-                                 "(?P<szremote>\d+\.?\d*\s?({sz})?)\s+"  # size=0 has no units
-                                 "\((?P<pctlocal>\d+)%\)"
-                                 "(\s+(?P<speed>\d+\.?\d*\s?({sz}))\/s)?$")\
-            .format(sz=LftpJobStatusParser.__SIZE_UNITS_REGEX)
-        mirror_header_m = re.compile(mirror_header_pattern)
-
-        # mirror header (connecting or receiving file list)
-        mirror_fl_header_pattern = ("^\[(?P<id>\d+)\]\s+"
-                                    "mirror\s+"
-                                    "(?P<flags>.*?)\s+"
-                                    "(?P<lq>['\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
-                                    "(?P<rq>['\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
-        mirror_fl_header_m = re.compile(mirror_fl_header_pattern)
-
-        # Data patterns
-        filename_pattern = "\\\\transfer\s" + LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX
-        filename_m = re.compile(filename_pattern)
-
-        chunk_at_pattern = ("^" + LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX + "\s+"
-                            "at\s+"
-                            "\d+\s+"  # this is NOT the local size
-                            "(?:\(\d+%\)\s+)?"  # this is NOT the local percent
-                            "((?P<speed>\d+\.?\d*\s?({sz}))\/s\s+)?"
-                            "(eta:(?P<eta>{eta})\s+)?"
-                            "\s*\[(?P<desc>.*)\]$")\
-            .format(sz=LftpJobStatusParser.__SIZE_UNITS_REGEX,
-                    eta=LftpJobStatusParser.__TIME_UNITS_REGEX)
-        chunk_at_m = re.compile(chunk_at_pattern)
-
-        chunk_at2_pattern = ("^" + LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX + "\s+"
-                             "at\s+"
-                             "\d+\s+"  # this is NOT the local size
-                             "(?:\(\d+%\))")  # this is NOT the local percent
-        chunk_at2_m = re.compile(chunk_at2_pattern)
-
-        chunk_got_pattern = ("^" + LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX + ",\s+"
-                             "got\s+"
-                             "(?P<szlocal>\d+)\s+"
-                             "of\s+"
-                             "(?P<szremote>\d+)\s+"
-                             "\((?P<pctlocal>\d+)%\)"
-                             "(\s+(?P<speed>\d+\.?\d*\s?({sz}))\/s)?"
-                             "(\seta:(?P<eta>{eta}))?")\
-            .format(sz=LftpJobStatusParser.__SIZE_UNITS_REGEX,
-                    eta=LftpJobStatusParser.__TIME_UNITS_REGEX)
-        chunk_got_m = re.compile(chunk_got_pattern)
-
-        chunk_header_pattern = ("\\\\chunk\s"
-                                "(?P<start>\d+)"
-                                "-"
-                                "(?P<end>\d+)")
-        chunk_header_m = re.compile(chunk_header_pattern)
-
-        chmod_header_pattern = ("chmod\s"
-                                "(?P<name>.*)")
-        chmod_header_m = re.compile(chmod_header_pattern)
-
-        chmod_pattern = (LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX + ""
-                         "\s\[\]")
-        chmod_pattern_m = re.compile(chmod_pattern)
-
-        mirror_pattern = ("\\\\mirror\s"
-                          "" + LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX + "\s+"
-                          "--\s+"
-                          "(?P<szlocal>\d+\.?\d*\s?({sz})?)"  # size=0 has no units
-                          "\/"
-                          "(?P<szremote>\d+\.?\d*\s?({sz})?)\s+"  # size=0 has no units
-                          "\((?P<pctlocal>\d+)%\)"
-                          "(\s+(?P<speed>\d+\.?\d*\s?({sz}))\/s)?$")\
-            .format(sz=LftpJobStatusParser.__SIZE_UNITS_REGEX)
-        mirror_m = re.compile(mirror_pattern)
-
-        mirror_empty_pattern = ("\\\\mirror\s"
-                                "" + LftpJobStatusParser.__QUOTED_FILE_NAME_REGEX + "\s*$")
-        mirror_empty_m = re.compile(mirror_empty_pattern)
-
-        queue_done_m = re.compile(LftpJobStatusParser.__QUEUE_DONE_REGEX)
+    @staticmethod
+    def __parse_jobs(lines: Deque[str]) -> List[LftpJobStatus]:
+        jobs = []
 
         prev_job = None
         while lines:
-            line = lines.pop(0)
-
-            # First line must be a valid job header
-            if not (
-                prev_job or
-                pget_header_m.match(line) or
-                mirror_header_m.match(line) or
-                mirror_fl_header_m.match(line)
-            ):
-                raise ValueError("First line is not a matching header '{}'".format(line))
-
-            # Search for pget header
-            result = pget_header_m.search(line)
-            if result:
-                # Next line must be the sftp line
-                if len(lines) < 1 or "sftp" not in lines[0]:
-                    raise ValueError("Missing the 'sftp' line for pget header '{}'".format(line))
-                lines.pop(0)  # pop the 'sftp' line
-
-                # Data line may not exist
-                result_at = None
-                result_at2 = None
-                result_got = None
-                if lines:
-                    line = lines.pop(0)  # data line
-                    result_at = chunk_at_m.search(line)
-                    result_at2 = chunk_at2_m.search(line)
-                    result_got = chunk_got_m.search(line)
-
-                id_ = int(result.group("id"))
-                name = os.path.basename(os.path.normpath(result.group("remote")))
-                flags = result.group("flags")
-                type_ = LftpJobStatus.Type.PGET
-                status = LftpJobStatus(job_id=id_,
-                                       job_type=type_,
-                                       state=LftpJobStatus.State.RUNNING,
-                                       name=name,
-                                       flags=flags)
-                if result_at:
-                    if result.group("remote") != result_at.group("name"):
-                        raise ValueError("Mismatch between pget names '{}' vs '{}'".format(
-                            result.group("remote"), result_at.group("name")
-                        ))
-                    size_local = None
-                    percent_local = None
-                    speed = None
-                    if result_at.group("speed"):
-                        speed = LftpJobStatusParser._size_to_bytes(result_at.group("speed"))
-                    eta = None
-                    if result_at.group("eta"):
-                        eta = LftpJobStatusParser._eta_to_seconds(result_at.group("eta"))
-                    transfer_state = LftpJobStatus.TransferState(
-                        size_local,
-                        None,  # size remote
-                        percent_local,
-                        speed,
-                        eta
-                    )
-                elif result_at2:
-                    if result.group("remote") != result_at2.group("name"):
-                        raise ValueError("Mismatch between pget names '{}' vs '{}'".format(
-                            result.group("remote"), result_at2.group("name")
-                        ))
-                    transfer_state = LftpJobStatus.TransferState(None, None, None, None, None)
-                elif result_got:
-                    got_group_basename = os.path.basename(os.path.normpath(result_got.group("name")))
-                    if got_group_basename != name:
-                        raise ValueError("Mismatch: filename '{}' but chunk data for '{}'"
-                                         .format(name, got_group_basename))
-                    size_local = int(result_got.group("szlocal"))
-                    size_remote = int(result_got.group("szremote"))
-                    percent_local = int(result_got.group("pctlocal"))
+            line = lines.popleft()
+
+            # Lines are dispatched by their prefix, and only the patterns that
+            # can match a line are tried
+            if line[0] == "[":
+                # Search for pget header
+                result = LftpJobStatusParser.__PGET_HEADER_M.match(line)
+                if result:
+                    # Next line must be the sftp line
+                    if len(lines) < 1 or "sftp" not in lines[0]:
+                        raise ValueError("Missing the 'sftp' line for pget header '{}'".format(line))
+                    lines.popleft()  # pop the 'sftp' line
+
+                    # Data line may not exist
+                    result_at = None
+                    result_at2 = None
+                    result_got = None
+                    if lines:
+                        line = lines.popleft()  # data line
+                        result_at, result_at2, result_got = LftpJobStatusParser.__parse_data_line(line)
+
+                    id_ = int(result.group("id"))
+                    name = os.path.basename(os.path.normpath(result.group("remote")))
+                    flags = result.group("flags")
+                    type_ = LftpJobStatus.Type.PGET
+                    status = LftpJobStatus(job_id=id_,
+                                           job_type=type_,
+                                           state=LftpJobStatus.State.RUNNING,
+                                           name=name,
+                                           flags=flags)
+                    if result_at:
+                        if result.group("remote") != result_at.group("name"):
+                            raise ValueError("Mismatch between pget names '{}' vs '{}'".format(
+                                result.group("remote"), result_at.group("name")
+                            ))
+                        size_local = None
+                        percent_local = None
+                        speed = None
+                        if result_at.group("speed"):
+                            speed = LftpJobStatusParser._size_to_bytes(result_at.group("speed"))
+                        eta = None
+                        if result_at.group("eta"):
+                            eta = LftpJobStatusParser._eta_to_seconds(result_at.group("eta"))
+                        transfer_state = LftpJobStatus.TransferState(
+                            size_local,
+                            None,  # size remote
+                            percent_local,
+                            speed,
+                            eta
+                        )
+                    elif result_at2:
+                        if result.group("remote") != result_at2.group("name"):
+                            raise ValueError("Mismatch between pget names '{}' vs '{}'".format(
+                                result.group("remote"), result_at2.group("name")
+                            ))
+                        transfer_state = LftpJobStatus.TransferState(None, None, None, None, None)
+                    elif result_got:
+                        got_group_basename = os.path.basename(os.path.normpath(result_got.group("name")))
+                        if got_group_basename != name:
+                            raise ValueError("Mismatch: filename '{}' but chunk data for '{}'"
+                                             .format(name, got_group_basename))
+                        size_local = int(result_got.group("szlocal"))
+                        size_remote = int(result_got.group("szremote"))
+                        percent_local = int(result_got.group("pctlocal"))
+                        speed = None
+                        if result_got.group("speed"):
+                            speed = LftpJobStatusParser._size_to_bytes(result_got.group("speed"))
+                        eta = None
+                        if result_got.group("eta"):
+                            eta = LftpJobStatusParser._eta_to_seconds(result_got.group("eta"))
+                        transfer_state = LftpJobStatus.TransferState(
+                            size_local,
+                            size_remote,
+                            percent_local,
+                            speed,
+                            eta
+                        )
+                    else:
+                        # No data line at all
+                        transfer_state = LftpJobStatus.TransferState(None, None, None, None, None)
+
+                    status.total_transfer_state = transfer_state
+                    jobs.append(status)
+                    prev_job = status
+                    continue
+
+                # Search for mirror header
+                result = LftpJobStatusParser.__MIRROR_HEADER_M.match(line)
+                if result:
+                    id_ = int(result.group("id"))
+                    name = os.path.basename(os.path.normpath(result.group("remote")))
+                    flags = result.group("flags")
+                    type_ = LftpJobStatus.Type.MIRROR
+                    status = LftpJobStatus(job_id=id_,
+                                           job_type=type_,
+                                           state=LftpJobStatus.State.RUNNING,
+                                           name=name,
+                                           flags=flags)
+                    size_local = LftpJobStatusParser._size_to_bytes(result.group("szlocal"))
+                    size_remote = LftpJobStatusParser._size_to_bytes(result.group("szremote"))
+                    percent_local = int(result.group("pctlocal"))
                     speed = None
-                    if result_got.group("speed"):
-                        speed = LftpJobStatusParser._size_to_bytes(result_got.group("speed"))
-                    eta = None
-                    if result_got.group("eta"):
-                        eta = LftpJobStatusParser._eta_to_seconds(result_got.group("eta"))
+                    if result.group("speed"):
+                        speed = LftpJobStatusParser._size_to_bytes(result.group("speed"))
                     transfer_state = LftpJobStatus.TransferState(
                         size_local,
                         size_remote,
                         percent_local,
                         speed,
-                        eta
+                        None  # eta
                     )
-                else:
-                    # No data line at all
-                    transfer_state = LftpJobStatus.TransferState(None, None, None, None, None)
+                    status.total_transfer_state = transfer_state
+                    jobs.append(status)
+                    prev_job = status
+                    # Continue the outer loop
+                    continue
+
+                # Search for mirror connecting header
+                # Note: this must be after the more restrictive mirror header above
+                result = LftpJobStatusParser.__MIRROR_FL_HEADER_M.match(line)
+                if result:
+                    # There may be a 'Connecting' or 'cd' line ahead, but not always
+                    if lines and (
+                            lines[0].startswith("Getting file list") or
+                            lines[0].startswith("cd ")
+                    ):
+                        lines.popleft()  # pop the connecting line
+                    id_ = int(result.group("id"))
+                    name = os.path.basename(os.path.normpath(result.group("remote")))
+                    flags = result.group("flags")
+                    type_ = LftpJobStatus.Type.MIRROR
+                    status = LftpJobStatus(job_id=id_,
+                                           job_type=type_,
+                                           state=LftpJobStatus.State.RUNNING,
+                                           name=name,
+                                           flags=flags)
+                    jobs.append(status)
+                    prev_job = status
+                    # Continue the outer loop
+                    continue
 
-                status.total_transfer_state = transfer_state
-                jobs.append(status)
-                prev_job = status
-                continue
-
-            # Search for mirror header
-            result = mirror_header_m.search(line)
-            if result:
-                id_ = int(result.group("id"))
-                name = os.path.basename(os.path.normpath(result.group("remote")))
-                flags = result.group("flags")
-                type_ = LftpJobStatus.Type.MIRROR
-                status = LftpJobStatus(job_id=id_,
-                                       job_type=type_,
-                                       state=LftpJobStatus.State.RUNNING,
-                                       name=name,
-                                       flags=flags)
-                size_local = LftpJobStatusParser._size_to_bytes(result.group("szlocal"))
-                size_remote = LftpJobStatusParser._size_to_bytes(result.group("szremote"))
-                percent_local = int(result.group("pctlocal"))
-                speed = None
-                if result.group("speed"):
-                    speed = LftpJobStatusParser._size_to_bytes(result.group("speed"))
-                transfer_state = LftpJobStatus.TransferState(
-                    size_local,
-                    size_remote,
-                    percent_local,
-                    speed,
-                    None  # eta
-                )
-                status.total_transfer_state = transfer_state
-                jobs.append(status)
-                prev_job = status
-                # Continue the outer loop
-                continue
-
-            # Search for mirror connecting header
-            # Note: this must be after the more restrictive mirror header above
-            result = mirror_fl_header_m.search(line)
-            if result:
-                # There may be a 'Connecting' or 'cd' line ahead, but not always
-                if lines and (
-                        lines[0].startswith("Getting file list") or
-                        lines[0].startswith("cd ")
-                ):
-                    lines.pop(0)  # pop the connecting line
-                id_ = int(result.group("id"))
-                name = os.path.basename(os.path.normpath(result.group("remote")))
-                flags = result.group("flags")
-                type_ = LftpJobStatus.Type.MIRROR
-                status = LftpJobStatus(job_id=id_,
-                                       job_type=type_,
-                                       state=LftpJobStatus.State.RUNNING,
-                                       name=name,
-                                       flags=flags)
-                jobs.append(status)
-                prev_job = status
-                # Continue the outer loop
-                continue
+            # First line must be a valid job header
+            if not prev_job:
+                raise ValueError("First line is not a matching header '{}'".format(line))
 
             # Search for filename
-            result = filename_m.search(line)
+            result = LftpJobStatusParser.__FILENAME_M.search(line) if "\\transfer" in line else None
             if result:
                 name = result.group("name")
                 if not lines:
                     raise ValueError("Missing chunk data for filename '{}'".format(name))
-                line = lines.pop(0)
-                result_at = chunk_at_m.search(line)
-                result_at2 = chunk_at2_m.search(line)
-                result_got = chunk_got_m.search(line)
+                line = lines.popleft()
+                result_at, result_at2, result_got = LftpJobStatusParser.__parse_data_line(line)
                 if result_at:
                     # filename is full path, but chunk name is only normpath
                     if result_at.group("name") != os.path.basename(os.path.normpath(name)):
@@ -410,58 +435,59 @@ class LftpJobStatusParser:
                 # Continue the outer loop
                 continue
 
-            # Search for but ignore "\mirror" line
-            result = mirror_m.search(line)
-            if result:
-                # Continue the outer loop
-                continue
-            result = mirror_empty_m.search(line)
-            if result:
-                name = result.group("name")
-                # One of these lines may follow, ignore it as well
-                #    "Getting files list"
-                #    "cd"
-                #    "<name>: "
-                #    "mkdir"
-                if lines:
-                    if "Getting file list" in lines[0] or \
-                            lines[0].startswith("cd ") or \
-                            lines[0] == "{}:".format(name) or \
-                            lines[0].startswith("mkdir "):
-                        lines.pop(0)
-                # Continue the outer loop
-                continue
+            if "\\mirror" in line:
+                # Search for but ignore "\mirror" line
+                result = LftpJobStatusParser.__MIRROR_M.search(line)
+                if result:
+                    # Continue the outer loop
+                    continue
+                result = LftpJobStatusParser.__MIRROR_EMPTY_M.search(line)
+                if result:
+                    name = result.group("name")
+                    # One of these lines may follow, ignore it as well
+                    #    "Getting files list"
+                    #    "cd"
+                    #    "<name>: "
+                    #    "mkdir"
+                    if lines:
+                        if "Getting file list" in lines[0] or \
+                                lines[0].startswith("cd ") or \
+                                lines[0] == "{}:".format(name) or \
+                                lines[0].startswith("mkdir "):
+                            lines.popleft()
+                    # Continue the outer loop
+                    continue
 
             # Search for but ignore "\chunk" line
-            result = chunk_header_m.search(line)
+            result = LftpJobStatusParser.__CHUNK_HEADER_M.search(line) if "\\chunk" in line else None
             if result:
                 # Also need to ignore the next line
                 if not lines:
                     raise ValueError("Missing data line for chunk '{}'".format(line))
-                lines.pop(0)
+                lines.popleft()
                 # Continue the outer loop
                 continue
 
             # Search for but ignore "chmod" line
-            result = chmod_header_m.search(line)
+            result = LftpJobStatusParser.__CHMOD_HEADER_M.search(line) if "chmod" in line else None
             if result:
                 name = result.group("name")
                 # Also ignore the next one or two lines
                 if not lines or not lines[0].startswith("file:"):
                     raise ValueError("Missing 'file:' line for chmod '{}'".format(name))
-                lines.pop(0)
+                lines.popleft()
                 if lines:
-                    result_chmod = chmod_pattern_m.search(lines[0])
+                    result_chmod = LftpJobStatusParser.__CHMOD_M.search(lines[0])
                     if result_chmod:
                         name_chmod = result_chmod.group("name")
                         if name != name_chmod:
                             raise ValueError("Mismatch in names chmod '{}'".format(name))
-                        lines.pop(0)
+                        lines.popleft()
                 # Continue the outer loop
                 continue
 
             # Search for the Done line, but it better be the last line
-            result = queue_done_m.match(line)
+            result = LftpJobStatusParser.__QUEUE_DONE_M.match(line) if line[0] == "[" else None
             if result:
                 if lines:
                     raise ValueError("There are more lines after the 'Done' line")
@@ -473,69 +499,53 @@ class LftpJobStatusParser:
         return jobs
 
     @staticmethod
-    def __parse_queue(lines: List[str]) -> List[LftpJobStatus]:
+    def __parse_queue(lines: Deque[str]) -> List[LftpJobStatus]:
         queue = []
 
-        queue_done_m = re.compile(LftpJobStatusParser.__QUEUE_DONE_REGEX)
+        queue_done_m = LftpJobStatusParser.__QUEUE_DONE_M
         if len(lines) == 1:
             if not queue_done_m.match(lines[0]):
                 raise ValueError("Unrecognized line '{}'".format(lines[0]))
-            lines.pop(0)
+            lines.popleft()
 
         if lines:
             # Look for the header lines
             if len(lines) < 2:
                 raise ValueError("Missing queue header")
-            header1_pattern = "^\[\d+\] queue \(sftp://.*@.*\)(?:\s+--\s+(?:\d+\.\d+|\d+)\s(?:{})\/s)?$"\
-                              .format(LftpJobStatusParser.__SIZE_UNITS_REGEX)
-            header2_pattern = "^sftp://.*@.*$"
-            line = lines.pop(0)
-            if not re.match(header1_pattern, line):
+            line = lines.popleft()
+            if not LftpJobStatusParser.__QUEUE_HEADER1_M.match(line):
                 raise ValueError("Missing queue header line 1: {}".format(line))
-            line = lines.pop(0)
-            if not re.match(header2_pattern, line):
+            line = lines.popleft()
+            if not LftpJobStatusParser.__QUEUE_HEADER2_M.match(line):
                 raise ValueError("Missing queue header line 2: {}".format(line))
             if not lines:
                 raise ValueError("Missing queue status")
 
             # Look for 'Now executing' lines
-            line = lines.pop(0)
-            if re.match("Queue is stopped.", line):
+            line = lines.popleft()
+            if LftpJobStatusParser.__QUEUE_STOPPED_M.match(line):
                 # Nothing to do
                 pass
-            elif re.match("Now executing:", line):
+            elif LftpJobStatusParser.__QUEUE_NOW_EXECUTING_M.match(line):
                 # Remove any more lines associated with 'now executing'
-                while lines and re.match("^-\[\d+\]", lines[0]):
-                    lines.pop(0)
+                while lines and LftpJobStatusParser.__QUEUE_NOW_EXECUTING_MORE_M.match(lines[0]):
+                    lines.popleft()
 
             # Look for the actual queue
-            if lines and re.match("Commands queued:", lines[0]):
-                lines.pop(0)
+            if lines and LftpJobStatusParser.__QUEUE_COMMANDS_QUEUED_M.match(lines[0]):
+                lines.popleft()
                 if not lines:
                     raise ValueError("Missing queued commands")
 
                 # Parse the queued commands
-                queue_pget_pattern = ("^(?P<id>\d+)\.\s+"
-                                      "pget\s+"
-                                      "(?P<flags>.*?)\s+"
-                                      "(?P<lq>[\'\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
-                                      "(?:-o\s+)"
-                                      "(?P<rq>[\'\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
-                queue_pget_m = re.compile(queue_pget_pattern)
-                queue_mirror_pattern = ("^(?P<id>\d+)\.\s+"
-                                        "mirror\s+"
-                                        "(?P<flags>.*?)\s+"
-                                        "(?P<lq>[\'\"]|)(?P<remote>.+)(?P=lq)\s+"  # greedy on purpose
-                                        "(?P<rq>[\'\"]|)(?P<local>.+)(?P=rq)$")  # greedy on purpose
-                queue_mirror_m = re.compile(queue_mirror_pattern)
                 while lines:
                     line = lines[0]
-                    if re.match("^\d+\.", line):
+                    if LftpJobStatusParser.__QUEUE_COMMAND_M.match(line):
                         # header line
-                        lines.pop(0)
+                        lines.popleft()
 
-                        result_pget = queue_pget_m.match(line)
-                        result_mirror = queue_mirror_m.match(line)
+                        result_pget = LftpJobStatusParser.__QUEUE_PGET_M.match(line)
+                        result_mirror = None if result_pget else LftpJobStatusParser.__QUEUE_MIRROR_M.match(line)
                         if result_pget:
                             type_ = LftpJobStatus.Type.PGET
                             result = result_pget
@@ -553,15 +563,15 @@ class LftpJobStatusParser:
                                                name=name,
                                                flags=flags)
                         queue.append(status)
-                    elif re.match("^cd\s.*$", line):
+                    elif LftpJobStatusParser.__QUEUE_CD_M.match(line):
                         # 'cd' line after pget, ignore
-                        lines.pop(0)
+                        lines.popleft()
                     else:
                         # no match, exit loop
                         break
 
             # Look for the done line
             if lines and queue_done_m.match(lines[0]):
-                lines.pop(0)
+                lines.popleft()
 
         return queue
@@ -2,6 +2,7 @@
 
 import logging
 import re
+import threading
 from functools import wraps
 from typing import Callable, Union, List, Optional
 
@@ -27,6 +28,9 @@ class LftpError(AppError):
 class Lftp:
     """
     Lftp command utility
+
+    Status can optionally be polled by a background thread, see start_status_polling().
+    The lftp session is shared between threads, and commands are serialized on it.
     """
     __SET_NUM_PARALLEL_FILES = "mirror:parallel-transfer-count"
     __SET_NUM_CONNECTIONS_PGET = "pget:default-n"
@@ -61,6 +65,18 @@ class Lftp:
         self.__log_command_output = False
         self.__pending_error = None
 
+        # Serializes use of the lftp session
+        self.__session_lock = threading.RLock()
+        # Status published by the poller thread, guarded by the status lock
+        self.__status_poller = None
+        self.__status_poller_shutdown = threading.Event()
+        self.__status_lock = threading.Lock()
+        self.__latest_status = None
+        self.__latest_status_error = None
+        # Result of the last poll, only used by the poller thread
+        self.__last_polled_status = None
+        self.__last_polled_status_error = None
+
         args = [
             "-p", str(port),
             "-u", "{},{}".format(self.__user, self.__password if self.__password else ""),
@@ -119,8 +135,12 @@ class Lftp:
             self.__pending_error = None
             raise LftpError(error)
 
-    @with_check_process
     def __run_command(self, command: str):
+        with self.__session_lock:
+            return self.__run_command_locked(command)
+
+    @with_check_process
+    def __run_command_locked(self, command: str):
         if self.__log_command_output:
             self.logger.debug("command: {}".format(command.encode('utf8', 'surrogateescape')))
         self.__process.sendline(command)
@@ -317,19 +337,93 @@ class Lftp:
         Return a status list of queued and running jobs
         :return:
         """
-        out = self.__run_command("jobs -v")
-        try:
-            statuses = self.__job_status_parser.parse(out)
-            self.__consecutive_status_errors = 0
-        except LftpJobStatusParserError:
-            self.__consecutive_status_errors += 1
-            if self.__consecutive_status_errors <= MAX_CONSECUTIVE_STATUS_ERRORS:
-                self.logger.warning(f"Ignoring status error (count={self.__consecutive_status_errors})")
-                statuses = []
-            else:
-                raise
+        with self.__session_lock:
+            out = self.__run_command("jobs -v")
+            try:
+                statuses = self.__job_status_parser.parse(out)
+                self.__consecutive_status_errors = 0
+            except LftpJobStatusParserError:
+                self.__consecutive_status_errors += 1
+                if self.__consecutive_status_errors <= MAX_CONSECUTIVE_STATUS_ERRORS:
+                    self.logger.warning(f"Ignoring status error (count={self.__consecutive_status_errors})")
+                    statuses = []
+                else:
+                    raise
         return statuses
 
+    def start_status_polling(self, interval_in_secs: float, status_event=None):
+        """
+        Start polling the status in a background thread
+        The latest status is retrieved with pop_latest_status(), which never
+        waits on lftp
+        :param interval_in_secs: time between polls
+        :param status_event: Optional event (threading or multiprocessing) that is
+                             set whenever a new status is available
+        :return:
+        """
+        if self.__status_poller is not None:
+            raise LftpError("Status polling is already started")
+        self.__status_poller_shutdown.clear()
+        self.__status_poller = threading.Thread(name="LftpStatusPoller",
+                                                target=self.__poll_status,
+                                                args=(interval_in_secs, status_event),
+                                                daemon=True)
+        self.__status_poller.start()
+
+    def stop_status_polling(self):
+        """
+        Stop the status polling thread, if running
+        :return:
+        """
+        if self.__status_poller is not None:
+            self.__status_poller_shutdown.set()
+            self.__status_poller.join()
+            self.__status_poller = None
+
+    def pop_latest_status(self) -> Optional[List[LftpJobStatus]]:
+        """
+        Return the latest status list published by the status polling thread
+        Returns None if no new status was polled since the last time this
+        method was called
+        Any error from the latest poll is raised here instead
+        :return:
+        """
+        with self.__status_lock:
+            statuses, error = self.__latest_status, self.__latest_status_error
+            self.__latest_status = None
+            self.__latest_status_error = None
+        if error is not None:
+            raise error
+        return statuses
+
+    def __poll_status(self, interval_in_secs: float, status_event):
+        while not self.__status_poller_shutdown.is_set():
+            statuses, error = None, None
+            try:
+                statuses = self.status()
+            except (LftpError, LftpJobStatusParserError) as e:
+                error = e
+            # Only changes are published, so that listeners are not woken up by every poll
+            if not self.__is_same_poll(statuses, error):
+                self.__last_polled_status = statuses
+                self.__last_polled_status_error = error
+                with self.__status_lock:
+                    self.__latest_status = statuses
+                    self.__latest_status_error = error
+                if status_event is not None:
+                    status_event.set()
+            self.__status_poller_shutdown.wait(interval_in_secs)
+
+    def __is_same_poll(self, statuses: Optional[List[LftpJobStatus]], error: Optional[Exception]) -> bool:
+        """
+        Returns true if the poll result is the same as the last poll's
+        """
+        prev_statuses, prev_error = self.__last_polled_status, self.__last_polled_status_error
+        if error is not None or prev_error is not None:
+            return error is not None and prev_error is not None and \
+                type(error) == type(prev_error) and str(error) == str(prev_error)
+        return prev_statuses is not None and statuses == prev_statuses
+
     def queue(self, name: str, is_dir: bool):
         """
         Queues a job for download
@@ -363,26 +457,28 @@ class Lftp:
         :param name:
         :return: True if job of given name was found, False otherwise
         """
-        # look for this name in the status list
-        job_to_kill = None
-        for status in self.status():
-            if status.name == name:
-                job_to_kill = status
-                break
-        if job_to_kill is None:
-            self.logger.debug("Kill failed to find job '{}'".format(name))
-            return False
-        # Note: there's a chance that job ids change between when we called status
-        #       and when we execute the kill command
-        #       in this case the wrong job may be killed, there's nothing we can do about it
-        if job_to_kill.state == LftpJobStatus.State.RUNNING:
-            self.logger.debug("Killing running job '{}'...".format(name))
-            self.__run_command("kill {}".format(job_to_kill.id))
-        elif job_to_kill.state == LftpJobStatus.State.QUEUED:
-            self.logger.debug("Killing queued job '{}'...".format(name))
-            self.__run_command("queue --delete {}".format(job_to_kill.id))
-        else:
-            raise NotImplementedError("Unsupported state {}".format(str(job_to_kill.state)))
+        # Hold the session so that no other commands run between the status and the kill
+        with self.__session_lock:
+            # look for this name in the status list
+            job_to_kill = None
+            for status in self.status():
+                if status.name == name:
+                    job_to_kill = status
+                    break
+            if job_to_kill is None:
+                self.logger.debug("Kill failed to find job '{}'".format(name))
+                return False
+            # Note: there's a chance that job ids change between when we called status
+            #       and when we execute the kill command
+            #       in this case the wrong job may be killed, there's nothing we can do about it
+            if job_to_kill.state == LftpJobStatus.State.RUNNING:
+                self.logger.debug("Killing running job '{}'...".format(name))
+                self.__run_command("kill {}".format(job_to_kill.id))
+            elif job_to_kill.state == LftpJobStatus.State.QUEUED:
+                self.logger.debug("Killing queued job '{}'...".format(name))
+                self.__run_command("queue --delete {}".format(job_to_kill.id))
+            else:
+                raise NotImplementedError("Unsupported state {}".format(str(job_to_kill.state)))
         return True
 
     def kill_all(self):
@@ -399,6 +495,7 @@ class Lftp:
         Exit the lftp instance. It cannot be used after being killed
         :return:
         """
+        self.stop_status_polling()
         self.kill_all()
         self.__process.sendline("exit")
         self.__process.close(force=True)
@@ -1,7 +1,7 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Set
 import copy
 
 # my libs
@@ -44,11 +44,16 @@ class ModelDiff:
 
 class ModelDiffUtil:
     @staticmethod
-    def diff_models(model_before: Model, model_after: Model) -> List[ModelDiff]:
+    def diff_models(model_before: Model,
+                    model_after: Model,
+                    changed_file_names: Optional[Set[str]] = None) -> List[ModelDiff]:
         """
         Compare two models and generate their diff
         :param model_before:
         :param model_after:
+        :param changed_file_names: if given, files present in both models are only
+                                   compared if they are in this set; all other files
+                                   are assumed to be unchanged
         :return:
         """
         diffs = []
@@ -79,6 +84,8 @@ class ModelDiffUtil:
 
         # 'before intersect after' gives potentially updated files
         file_names_updated = file_names_before.intersection(file_names_after)
+        if changed_file_names is not None:
+            file_names_updated.intersection_update(changed_file_names)
         for name in file_names_updated:
             file_before = model_before.get_file(name)
             file_after = model_after.get_file(name)
@@ -3,8 +3,9 @@
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List
-import copy
+import hashlib
 import os
+import time
 
 
 class ModelFile:
@@ -15,6 +16,14 @@ class ModelFile:
     updated only certain levels in the hierarchy. Specifically for this example,
     an Lftp status provides local sizes for a downloading directory but not its
     children.
+
+    A file can be frozen once it's fully built. A frozen file and its children
+    cannot be modified, so it can be shared with readers without copying.
+
+    Equality is decided by a content hash that covers the file's properties and
+    the hashes of its children. The hash is cached once the file is frozen, so
+    comparing unchanged frozen trees is cheap. Files that are still being built
+    compute their hash on every use.
     """
     class State(Enum):
         DEFAULT = 0
@@ -25,7 +34,41 @@ class ModelFile:
         EXTRACTING = 5
         EXTRACTED = 6
 
+    # Properties that are part of equality
+    __CONTENT_SLOTS = (
+        "__name",
+        "__is_dir",
+        "__state",
+        "__remote_size",
+        "__local_size",
+        "__transferred_size",
+        "__downloading_speed",
+        "__eta",
+        "__is_extractable",
+        "__local_created_timestamp",
+        "__local_modified_timestamp",
+        "__remote_created_timestamp",
+        "__remote_modified_timestamp"
+    )
+    # Properties that are not part of equality
+    __NON_CONTENT_SLOTS = (
+        "__update_timestamp",
+        "__children",
+        "__parent",
+        "__content_hash",
+        "__frozen"
+    )
+    # Models can have hundreds of thousands of files, so files use slots
+    __slots__ = __CONTENT_SLOTS + __NON_CONTENT_SLOTS
+    # Slot names are mangled, but the names in the lists above are not
+    __CONTENT_KEYS = tuple("_ModelFile" + k for k in __CONTENT_SLOTS)
+    __ALL_KEYS = __CONTENT_KEYS + tuple("_ModelFile" + k for k in __NON_CONTENT_SLOTS)
+
     def __init__(self, name: str, is_dir: bool):
+        self.__content_hash = None  # cached once frozen, see content_hash
+        self.__frozen = False
+        self.__parent = None  # direct predecessor
+        self.__children = None  # name -> child file, in insertion order, created on first child
         self.__name = name  # file or folder name
         self.__is_dir = is_dir  # True if this is a dir, False if file
         self.__state = ModelFile.State.DEFAULT  # status
@@ -40,47 +83,32 @@ class ModelFile:
         self.__remote_created_timestamp = None
         self.__remote_modified_timestamp = None
         # timestamp of the latest update
+        # Stored as seconds since epoch, which is much cheaper to create than a datetime
         # Note: timestamp is not part of equality operator
-        self.__update_timestamp = datetime.now()
-        self.__children = []  # children files
-        self.__parent = None  # direct predecessor
+        self.__update_timestamp = time.time()
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in ModelFile.__ALL_KEYS}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
 
     def __eq__(self, other):
         # disregard in comparisons:
         #   timestamp: we don't care about it
         #   parent: semantics are to check self and children only
-        #   children: check these manually for easier debugging
-        ka = set(self.__dict__).difference({
-            "_ModelFile__update_timestamp",
-            "_ModelFile__parent",
-            "_ModelFile__children"
-        })
-        kb = set(other.__dict__).difference({
-            "_ModelFile__update_timestamp",
-            "_ModelFile__parent",
-            "_ModelFile__children"
-        })
-        # Check self properties
-        if ka != kb:
-            return False
-        if not all(self.__dict__[k] == other.__dict__[k] for k in ka):
-            return False
-
-        # Check children's properties
-        if len(self.__children) != len(other.__children):
-            return False
-        my_children_dict = {f.name: f for f in self.__children}
-        other_children_dict = {f.name: f for f in other.__children}
-        if my_children_dict.keys() != other_children_dict.keys():
-            return False
-        for name in my_children_dict.keys():
-            if my_children_dict[name] != other_children_dict[name]:
-                return False
-
-        return True
+        #   children order: children are matched by name
+        if self is other:
+            return True
+        if not isinstance(other, ModelFile):
+            return NotImplemented
+        return self.content_hash == other.content_hash
 
     def __repr__(self):
-        return str(self.__dict__)
+        state = self.__getstate__()
+        del state["_ModelFile__parent"]
+        return str(state)
 
     @property
     def name(self) -> str: return self.__name
@@ -93,6 +121,7 @@ class ModelFile:
 
     @state.setter
     def state(self, state: State):
+        self.__check_not_frozen()
         if type(state) != ModelFile.State:
             raise TypeError
         self.__state = state
@@ -102,6 +131,7 @@ class ModelFile:
 
     @remote_size.setter
     def remote_size(self, remote_size: Optional[int]):
+        self.__check_not_frozen()
         if type(remote_size) == int:
             if remote_size < 0:
                 raise ValueError
@@ -116,6 +146,7 @@ class ModelFile:
 
     @local_size.setter
     def local_size(self, local_size: Optional[int]):
+        self.__check_not_frozen()
         if type(local_size) == int:
             if local_size < 0:
                 raise ValueError
@@ -130,6 +161,7 @@ class ModelFile:
 
     @transferred_size.setter
     def transferred_size(self, transferred_size: Optional[int]):
+        self.__check_not_frozen()
         if type(transferred_size) == int:
             if transferred_size < 0:
                 raise ValueError
@@ -144,6 +176,7 @@ class ModelFile:
 
     @downloading_speed.setter
     def downloading_speed(self, downloading_speed: Optional[int]):
+        self.__check_not_frozen()
         if type(downloading_speed) == int:
             if downloading_speed < 0:
                 raise ValueError
@@ -154,10 +187,14 @@ class ModelFile:
             raise TypeError
 
     @property
-    def update_timestamp(self) -> datetime: return self.__update_timestamp
+    def update_timestamp(self) -> datetime:
+        if isinstance(self.__update_timestamp, float):
+            return datetime.fromtimestamp(self.__update_timestamp)
+        return self.__update_timestamp
 
     @update_timestamp.setter
     def update_timestamp(self, update_timestamp: datetime):
+        self.__check_not_frozen()
         if type(update_timestamp) != datetime:
             raise TypeError
         self.__update_timestamp = update_timestamp
@@ -167,6 +204,7 @@ class ModelFile:
 
     @eta.setter
     def eta(self, eta: Optional[int]):
+        self.__check_not_frozen()
         if type(eta) == int:
             if eta < 0:
                 raise ValueError
@@ -181,6 +219,7 @@ class ModelFile:
 
     @is_extractable.setter
     def is_extractable(self, is_extractable: bool):
+        self.__check_not_frozen()
         self.__is_extractable = is_extractable
 
     @property
@@ -188,6 +227,7 @@ class ModelFile:
 
     @local_created_timestamp.setter
     def local_created_timestamp(self, local_created_timestamp: datetime):
+        self.__check_not_frozen()
         if type(local_created_timestamp) != datetime:
             raise TypeError
         self.__local_created_timestamp = local_created_timestamp
@@ -197,6 +237,7 @@ class ModelFile:
 
     @local_modified_timestamp.setter
     def local_modified_timestamp(self, local_modified_timestamp: datetime):
+        self.__check_not_frozen()
         if type(local_modified_timestamp) != datetime:
             raise TypeError
         self.__local_modified_timestamp = local_modified_timestamp
@@ -206,6 +247,7 @@ class ModelFile:
 
     @remote_created_timestamp.setter
     def remote_created_timestamp(self, remote_created_timestamp: datetime):
+        self.__check_not_frozen()
         if type(remote_created_timestamp) != datetime:
             raise TypeError
         self.__remote_created_timestamp = remote_created_timestamp
@@ -215,6 +257,7 @@ class ModelFile:
 
     @remote_modified_timestamp.setter
     def remote_modified_timestamp(self, remote_modified_timestamp: datetime):
+        self.__check_not_frozen()
         if type(remote_modified_timestamp) != datetime:
             raise TypeError
         self.__remote_modified_timestamp = remote_modified_timestamp
@@ -226,18 +269,65 @@ class ModelFile:
             return os.path.join(self.__parent.full_path, self.name)
         return self.name
 
+    @property
+    def is_frozen(self) -> bool: return self.__frozen
+
+    def freeze(self):
+        """
+        Make this file and all its descendants immutable
+        :return:
+        """
+        frontier = [self]
+        while frontier:
+            file = frontier.pop()
+            file.__frozen = True
+            if file.__children:
+                frontier += file.__children.values()
+
     def add_child(self, child_file: "ModelFile"):
+        self.__check_not_frozen()
+        # The child's parent is modified too
+        child_file.__check_not_frozen()
         if not self.is_dir:
             raise TypeError("Cannot add child to a non-directory")
         if child_file is self:
             raise ValueError("Cannot add parent as a child")
-        if child_file.name in (f.name for f in self.__children):
+        if self.__children is None:
+            self.__children = dict()
+        elif child_file.name in self.__children:
             raise ValueError("Cannot add child more than once")
-        self.__children.append(child_file)
+        self.__children[child_file.name] = child_file
         child_file.__parent = self
 
+    @property
+    def content_hash(self) -> bytes:
+        """Hash of this file's properties and its entire tree"""
+        if self.__content_hash is not None:
+            return self.__content_hash
+        content = repr((
+            [getattr(self, k) for k in ModelFile.__CONTENT_KEYS],
+            sorted((child.name, child.content_hash) for child in (self.__children or {}).values())
+        ))
+        content_hash = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+        # Only a frozen file can't change after its hash is computed
+        if self.__frozen:
+            self.__content_hash = content_hash
+        return content_hash
+
+    def __check_not_frozen(self):
+        if self.__frozen:
+            raise TypeError("Cannot modify a frozen file")
+
     def get_children(self) -> List["ModelFile"]:
-        return copy.copy(self.__children)
+        return list(self.__children.values()) if self.__children is not None else []
+
+    def get_child(self, name: str) -> Optional["ModelFile"]:
+        """
+        Returns the child with the given name, or None if there is no such child
+        :param name:
+        :return:
+        """
+        return self.__children.get(name) if self.__children is not None else None
 
     @property
     def parent(self) -> Optional["ModelFile"]:
@@ -2,7 +2,7 @@
 
 import logging
 from abc import ABC, abstractmethod
-from typing import Set
+from typing import List, Set
 
 # my libs
 from common import AppError
@@ -135,5 +135,12 @@ class Model:
             raise ModelError("File does not exist in the model")
         return self.__files[name]
 
+    def get_files(self) -> List[ModelFile]:
+        """
+        Returns all the files in the model
+        :return:
+        """
+        return list(self.__files.values())
+
     def get_file_names(self) -> Set[str]:
         return set(self.__files.keys())
@@ -1,11 +1,23 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-import pickle
 import sys
 import argparse
+from typing import Dict, List, Tuple
 
 # my libs
-from system import SystemScanner, SystemFile, SystemScannerError
+from system import SystemScanner, SystemFile, SystemScannerError, SystemScannerCache, SystemScanDelta, ScanCodec
+
+
+def flatten_files(files: List[SystemFile], prefix: str = "") -> Dict[str, Tuple[bool, int]]:
+    """
+    Flatten a file tree into a map of path -> (is_dir, size)
+    """
+    flat = {}
+    for file in files:
+        path = prefix + file.name
+        flat[path] = (file.is_dir, file.size)
+        flat.update(flatten_files(file.children, path + "/"))
+    return flat
 
 
 if __name__ == "__main__":
@@ -18,15 +30,70 @@ if __name__ == "__main__":
                         help="Exclude hidden files")
     parser.add_argument("-H", "--human-readable", action="store_true", default=False,
                         help="Human readable output")
+    parser.add_argument("-c", "--cache", metavar="CACHE_FILE", default=None,
+                        help="Reuse listings of unchanged directories from this cache file, "
+                             "and update it after the scan")
+    parser.add_argument("-F", "--full-rescan", action="store_true", default=False,
+                        help="Ignore the existing cache contents and rescan everything")
+    parser.add_argument("-V", "--validate-cache", action="store_true", default=False,
+                        help="Compare the cached scan against a full rescan and report "
+                             "any differences to stderr")
+    parser.add_argument("--cache-settle-secs", type=int, default=300,
+                        help="Files modified within this many seconds are always rescanned")
+    parser.add_argument("-d", "--delta-state", metavar="STATE_FILE", default=None,
+                        help="Output a delta against the last scan recorded in this state file")
+    parser.add_argument("-g", "--generation", default=None,
+                        help="Id of this scan, required with --delta-state")
+    parser.add_argument("-b", "--base-generation", default=None,
+                        help="Id of the last scan received by the client. A full snapshot "
+                             "is output if it does not match the recorded scan")
+    parser.add_argument("-z", "--compress", choices=ScanCodec.COMPRESSIONS, default=None,
+                        help="Compress the output")
     args = parser.parse_args()
+    if args.delta_state and not args.generation:
+        parser.error("--generation is required with --delta-state")
 
     scanner = SystemScanner(args.path)
     if args.exclude_hidden:
         scanner.add_exclude_prefix(".")
+
+    cache = None
+    if args.cache:
+        # Any change to the scan parameters invalidates the cache
+        signature = (args.path, tuple(scanner.exclude_prefixes), tuple(scanner.exclude_suffixes))
+        if args.full_rescan:
+            cache = SystemScannerCache(signature=signature, settle_time_in_secs=args.cache_settle_secs)
+        else:
+            cache = SystemScannerCache.load(args.cache, signature=signature,
+                                            settle_time_in_secs=args.cache_settle_secs)
     try:
+        scanner.set_cache(cache)
         root_files = scanner.scan()
+        if cache is not None and args.validate_cache:
+            # Rescan with an empty cache, which also repopulates it
+            cache.clear()
+            full_root_files = scanner.scan()
+            cached_flat = flatten_files(root_files)
+            full_flat = flatten_files(full_root_files)
+            mismatches = sorted(
+                path for path in set(cached_flat).union(full_flat)
+                if cached_flat.get(path) != full_flat.get(path)
+            )
+            for path in mismatches:
+                sys.stderr.write("Cache mismatch: {} cached={} actual={}\n".format(
+                    path, cached_flat.get(path), full_flat.get(path)
+                ))
+            sys.stderr.write("Cache validation found {} mismatches\n".format(len(mismatches)))
+            root_files = full_root_files
     except SystemScannerError as e:
         sys.exit("SystemScannerError: {}".format(str(e)))
+    if cache is not None:
+        try:
+            cache.save(args.cache)
+        except OSError:
+            # Not fatal, next scan will simply be a full one
+            # Nothing is printed since stderr is interleaved with the output over ssh
+            pass
     if args.human_readable:
         def print_file(file: SystemFile, level: int):
             sys.stdout.write("  "*level)
@@ -39,6 +106,24 @@ if __name__ == "__main__":
                 print_file(child, level+1)
         for root_file in root_files:
             print_file(root_file, 0)
+    elif args.delta_state:
+        last_generation, last_digests = SystemScanDelta.load_state(args.delta_state)
+        digests = SystemScanDelta.digest(root_files)
+        if args.base_generation is None or args.base_generation != last_generation:
+            # Client is out of sync, send everything
+            last_generation = None
+        delta = SystemScanDelta.create(generation=args.generation,
+                                       base_generation=last_generation,
+                                       files=root_files,
+                                       base_digests=last_digests,
+                                       digests=digests)
+        try:
+            SystemScanDelta.save_state(args.delta_state, args.generation, digests)
+        except OSError:
+            # Not fatal, the generation mismatch on the next scan forces a full snapshot
+            pass
+        bytes_out = ScanCodec.encode(delta, compression=args.compress)
+        sys.stdout.buffer.write(bytes_out)
     else:
-        bytes_out = pickle.dumps(root_files)
+        bytes_out = ScanCodec.encode(root_files, compression=args.compress)
         sys.stdout.buffer.write(bytes_out)
@@ -1,7 +1,15 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import fcntl
+import hashlib
 import logging
+import os
+import selectors
+import shlex
+import subprocess
+import tempfile
 import time
+from typing import Callable, Optional
 
 import pexpect
 
@@ -19,86 +27,142 @@ class SshcpError(AppError):
 class Sshcp:
     """
     Scp command utility
+
+    Optionally, commands can share a persistent master connection (ssh ControlMaster).
+    The master is identified by a control socket derived from the connection
+    parameters, so all Sshcp instances with the same parameters share it, even
+    across processes. The master is started on its own, in the background, before
+    the first command, and it persists for a while after the last command. Only
+    the master pays for the connection setup and authentication. Commands never
+    become the master themselves. If there is no usable master, they connect
+    directly.
+
+    Commands normally run in a pty, which converts line endings and mixes
+    stderr into the output. shell_stream() instead runs ssh over plain pipes,
+    so the output is byte-exact and can be consumed in chunks as it arrives.
     """
     __TIMEOUT_SECS = 180
+    __CONTROL_PERSIST_SECS = 300
+    __CONTROL_CHECK_TIMEOUT_SECS = 10
+    __SERVER_ALIVE_INTERVAL_SECS = 15
+    __SERVER_ALIVE_COUNT_MAX = 3
+    __STREAM_CHUNK_SIZE = 256 * 1024
+    __ASKPASS_ENV = "SEEDSYNC_SSH_PASSWORD"
+    __ASKPASS_SCRIPT = "#!/bin/sh\nprintf '%s\\n' \"${}\"\n".format(__ASKPASS_ENV)
 
     def __init__(self,
                  host: str,
                  port: int,
                  user: str = None,
-                 password: str = None):
+                 password: str = None,
+                 use_control_master: bool = False):
         if host is None:
             raise ValueError("Hostname not specified.")
         self.__host = host
         self.__port = port
         self.__user = user
         self.__password = password
+        self.__control_path = None
+        if use_control_master:
+            # Keep the path short, unix socket paths are limited to ~100 chars
+            # Password is part of the key so that a changed password is not masked
+            # by a master authenticated with the old one
+            key = "{}:{}@{}:{}:{}".format(os.getuid(), user, host, port, password)
+            self.__control_path = os.path.join(
+                tempfile.gettempdir(),
+                "seedsync-ssh-{}".format(hashlib.md5(key.encode()).hexdigest()[:16])
+            )
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def set_base_logger(self, base_logger: logging.Logger):
         self.logger = base_logger.getChild(self.__class__.__name__)
 
-    def __run_command(self,
-                      command: str,
-                      flags: str,
-                      args: str) -> bytes:
-
-        command_args = [
-            command,
-            flags
-        ]
-
-        # Common flags
-        command_args += [
+    def __common_options(self) -> list:
+        options = [
             "-o", "StrictHostKeyChecking=no",  # ignore host key changes
             "-o", "UserKnownHostsFile=/dev/null",  # ignore known hosts file
             "-o", "LogLevel=error",  # suppress warnings
         ]
 
         if self.__password is None:
-            command_args += [
+            options += [
                 "-o", "PasswordAuthentication=no",  # don't ask for password
             ]
         else:
-            command_args += [
+            options += [
                 "-o", "PubkeyAuthentication=no"  # don't use key authentication
             ]
+        return options
+
+    def __build_command(self,
+                        command: str,
+                        flags: str,
+                        args: str,
+                        extra_options: Optional[list] = None) -> str:
+        command_args = [
+            command,
+            flags
+        ]
+        command_args += self.__common_options()
+
+        if self.__control_path is not None:
+            self.__ensure_control_master()
+            command_args += [
+                "-o", "ControlMaster=no",  # use the master, but never become one
+                "-o", "ControlPath={}".format(self.__control_path),
+            ]
+
+        if extra_options:
+            command_args += extra_options
 
         command_args.append(args)
 
         command = " ".join(command_args)
         self.logger.debug("Command: {}".format(command))
+        return command
+
+    def __run_command(self,
+                      command: str,
+                      flags: str,
+                      args: str) -> bytes:
+        command = self.__build_command(command, flags, args)
 
         start_time = time.time()
         sp = pexpect.spawn(command)
         try:
+            # Set when the command completes without a password prompt
+            # This happens when the command runs over an existing master connection
+            completed = False
             if self.__password is not None:
                 i = sp.expect([
                     'password: ',  # i=0, all's good
-                    pexpect.EOF,  # i=1, unknown error
+                    pexpect.EOF,  # i=1, unknown error, or done if using a master connection
                     'lost connection',  # i=2, connection refused
                     'Could not resolve hostname',  # i=3, bad hostname
                     'Connection refused',  # i=4, connection refused
-                ])
-                if i > 0:
-                    before = sp.before.decode().strip() if sp.before != pexpect.EOF else ""
-                    after = sp.after.decode().strip() if sp.after != pexpect.EOF else ""
-                    self.logger.warning("Command failed: '{} - {}'".format(before, after))
-                if i == 1:
-                    error_msg = "Unknown error"
-                    if sp.before.decode().strip():
-                        error_msg += " - " + sp.before.decode().strip()
-                    raise SshcpError(error_msg)
-                elif i == 3:
-                    raise SshcpError("Bad hostname: {}".format(self.__host))
-                elif i in {2, 4}:
-                    error_msg = "Connection refused by server"
-                    if sp.before.decode().strip():
-                        error_msg += " - " + sp.before.decode().strip()
-                    raise SshcpError(error_msg)
-                sp.sendline(self.__password)
-
-            i = sp.expect(
+                ], timeout=self.__TIMEOUT_SECS if self.__control_path is not None else -1)
+                if i == 1 and self.__control_path is not None:
+                    completed = True
+                else:
+                    if i > 0:
+                        before = sp.before.decode().strip() if sp.before != pexpect.EOF else ""
+                        after = sp.after.decode().strip() if sp.after != pexpect.EOF else ""
+                        self.logger.warning("Command failed: '{} - {}'".format(before, after))
+                    if i == 1:
+                        error_msg = "Unknown error"
+                        if sp.before.decode().strip():
+                            error_msg += " - " + sp.before.decode().strip()
+                        raise SshcpError(error_msg)
+                    elif i == 3:
+                        raise SshcpError("Bad hostname: {}".format(self.__host))
+                    elif i in {2, 4}:
+                        error_msg = "Connection refused by server"
+                        if sp.before.decode().strip():
+                            error_msg += " - " + sp.before.decode().strip()
+                        raise SshcpError(error_msg)
+                    sp.sendline(self.__password)
+
+            i = 0 if completed else sp.expect(
                 [
                     pexpect.EOF,  # i=0, all's good
                     'password: ',  # i=1, wrong password
@@ -139,12 +203,247 @@ class Sshcp:
 
         return sp.before.replace(b'\r\n', b'\n').strip()
 
+    def __run_command_streaming(self,
+                                command: str,
+                                flags: str,
+                                args: str,
+                                consumer: Optional[Callable[[memoryview], None]]) -> Optional[bytes]:
+        """
+        Run the command over pipes instead of a pty
+        A password, if any, is supplied through SSH_ASKPASS since there is
+        no terminal to prompt on
+        :param consumer: called with each chunk of output, see shell_stream()
+        :return: the output, or None if it was passed to the consumer
+        """
+        command = self.__build_command(command, flags, args, self.__no_prompt_options())
+        env, askpass_path = self.__create_askpass_env()
+
+        start_time = time.time()
+        buffer = bytearray(Sshcp.__STREAM_CHUNK_SIZE)
+        view = memoryview(buffer)
+        out = bytearray() if consumer is None else None
+        try:
+            with tempfile.TemporaryFile() as stderr_file:
+                # New session so that ssh has no terminal to prompt on
+                sp = subprocess.Popen(shlex.split(command),
+                                      stdin=subprocess.DEVNULL,
+                                      stdout=subprocess.PIPE,
+                                      stderr=stderr_file,
+                                      env=env,
+                                      bufsize=0,
+                                      start_new_session=True)
+                try:
+                    with selectors.DefaultSelector() as selector:
+                        selector.register(sp.stdout, selectors.EVENT_READ)
+                        while True:
+                            if not selector.select(timeout=Sshcp.__TIMEOUT_SECS):
+                                self.logger.error("Timed out")
+                                raise SshcpError("Timed out")
+                            num_bytes = sp.stdout.readinto(buffer)
+                            if not num_bytes:
+                                break
+                            if consumer is None:
+                                out += view[:num_bytes]
+                            else:
+                                consumer(view[:num_bytes])
+                    sp.wait(timeout=Sshcp.__TIMEOUT_SECS)
+                except subprocess.TimeoutExpired:
+                    self.logger.error("Timed out")
+                    raise SshcpError("Timed out")
+                finally:
+                    if sp.poll() is None:
+                        sp.kill()
+                        sp.wait()
+                    sp.stdout.close()
+                stderr_file.seek(0)
+                error = stderr_file.read().decode(errors="replace").strip()
+        finally:
+            view.release()
+            if askpass_path is not None:
+                os.remove(askpass_path)
+        end_time = time.time()
+
+        self.logger.debug("Return code: {}".format(sp.returncode))
+        self.logger.debug("Command took {:.3f}s".format(end_time-start_time))
+        if sp.returncode != 0:
+            self.logger.warning("Command failed: '{}'".format(error))
+            # ssh exits with 255 for its own errors
+            if sp.returncode == 255:
+                if "Permission denied" in error:
+                    raise SshcpError("Incorrect password" if self.__password is not None else error)
+                elif "Could not resolve hostname" in error:
+                    raise SshcpError("Bad hostname: {}".format(self.__host))
+                elif "Connection refused" in error or "lost connection" in error:
+                    raise SshcpError("Connection refused by server - {}".format(error))
+            raise SshcpError(error or "Unknown error")
+
+        return bytes(out) if out is not None else None
+
+    def __no_prompt_options(self) -> list:
+        """
+        Options for commands that run without a terminal to prompt on
+        """
+        if self.__password is None:
+            return ["-o", "BatchMode=yes"]  # never prompt
+        return ["-o", "NumberOfPasswordPrompts=1"]
+
+    def __create_askpass_env(self) -> (dict, Optional[str]):
+        """
+        Create the environment for a command that runs without a terminal
+        A password, if any, is supplied through an SSH_ASKPASS script.
+        The caller must remove the script when the command is done.
+        :return: the environment and the path of the askpass script, if any
+        """
+        env = dict(os.environ)
+        if self.__password is None:
+            return env, None
+        fd, askpass_path = tempfile.mkstemp(prefix="seedsync-askpass-")
+        with os.fdopen(fd, "w") as f:
+            f.write(Sshcp.__ASKPASS_SCRIPT)
+        os.chmod(askpass_path, 0o700)
+        env.update({
+            "SSH_ASKPASS": askpass_path,
+            "SSH_ASKPASS_REQUIRE": "force",
+            # Older ssh versions only use askpass if a display is set
+            "DISPLAY": env.get("DISPLAY", "none"),
+            Sshcp.__ASKPASS_ENV: self.__password
+        })
+        return env, askpass_path
+
+    def __control_command(self, operation: str) -> bool:
+        """
+        Send a control command to the master connection
+        Returns true if the master handled the command successfully
+        :param operation: ssh -O operation, e.g. check
+        :return:
+        """
+        command_args = [
+            "ssh",
+            "-O", operation,
+            "-o", "ControlPath={}".format(self.__control_path),
+            "-p", str(self.__port),
+            "{}@{}".format(self.__user, self.__host)
+        ]
+        try:
+            result = subprocess.run(command_args,
+                                    stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL,
+                                    timeout=Sshcp.__CONTROL_CHECK_TIMEOUT_SECS)
+        except subprocess.TimeoutExpired:
+            return False
+        return result.returncode == 0
+
+    def __ensure_control_master(self):
+        """
+        Make sure a responsive master connection is running
+        Startup is serialized across processes with a lock file next to the
+        control socket, so only one of them starts a master at a time.
+        A master that is not responding is told to exit and its socket is
+        removed before a new one is started.
+        :return:
+        """
+        if self.__is_control_master_alive():
+            return
+        with open(self.__control_path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have started the master while we waited
+            if self.__is_control_master_alive():
+                return
+            if os.path.exists(self.__control_path):
+                self.logger.warning("Ssh master connection is not responding, re-establishing")
+                # Don't leave the old master running in the background
+                self.__control_command("exit")
+                try:
+                    os.remove(self.__control_path)
+                except OSError:
+                    pass
+            self.__start_control_master()
+
+    def __is_control_master_alive(self) -> bool:
+        return os.path.exists(self.__control_path) and self.__control_command("check")
+
+    def __start_control_master(self):
+        """
+        Start a master connection in the background
+        ssh authenticates in the foreground and then forks the master (-f).
+        The master is run without a pty, and its output goes to a file, so
+        nothing waits on file descriptors that the forked master keeps open.
+        If the master can't be started, commands connect directly and report
+        the error themselves.
+        :return:
+        """
+        self.logger.debug("Establishing ssh master connection")
+        command_args = ["ssh", "-fNM"]
+        command_args += self.__common_options()
+        command_args += self.__no_prompt_options()
+        command_args += [
+            "-o", "ControlPath={}".format(self.__control_path),
+            "-o", "ControlPersist={}".format(Sshcp.__CONTROL_PERSIST_SECS),
+            # drop a master whose connection has silently died
+            "-o", "ServerAliveInterval={}".format(Sshcp.__SERVER_ALIVE_INTERVAL_SECS),
+            "-o", "ServerAliveCountMax={}".format(Sshcp.__SERVER_ALIVE_COUNT_MAX),
+            "-p", str(self.__port),
+            "{}@{}".format(self.__user, self.__host)
+        ]
+        env, askpass_path = self.__create_askpass_env()
+        try:
+            with tempfile.TemporaryFile() as stderr_file:
+                try:
+                    # New session so that ssh has no terminal to prompt on
+                    result = subprocess.run(command_args,
+                                            stdin=subprocess.DEVNULL,
+                                            stdout=subprocess.DEVNULL,
+                                            stderr=stderr_file,
+                                            env=env,
+                                            start_new_session=True,
+                                            timeout=Sshcp.__TIMEOUT_SECS)
+                except subprocess.TimeoutExpired:
+                    self.logger.warning("Timed out establishing ssh master connection")
+                    return
+                if result.returncode != 0:
+                    stderr_file.seek(0)
+                    error = stderr_file.read().decode(errors="replace").strip()
+                    self.logger.warning("Failed to establish ssh master connection: '{}'".format(error))
+        finally:
+            if askpass_path is not None:
+                os.remove(askpass_path)
+
     def shell(self, command: str) -> bytes:
         """
         Run a shell command on remote service and return output
         :param command:
         :return:
         """
+        flags, args = self.__shell_args(command)
+        return self.__run_command(
+            command="ssh",
+            flags=flags,
+            args=args
+        )
+
+    def shell_stream(self,
+                     command: str,
+                     consumer: Optional[Callable[[memoryview], None]] = None) -> Optional[bytes]:
+        """
+        Run a shell command on remote service without a pty
+        Unlike shell(), the output is exactly what the command wrote to stdout,
+        and stderr is only used for the error message on failure
+        :param command:
+        :param consumer: if given, called with each chunk of output as it arrives
+                         instead of collecting the output. The chunk is only valid
+                         during the call, the underlying buffer is reused.
+        :return: the output, or None if a consumer was given
+        """
+        flags, args = self.__shell_args(command)
+        return self.__run_command_streaming(
+            command="ssh",
+            flags=flags,
+            args=args,
+            consumer=consumer
+        )
+
+    def __shell_args(self, command: str) -> (str, str):
         if not command:
             raise ValueError("Command cannot be empty")
 
@@ -166,11 +465,7 @@ class Sshcp:
             "{}@{}".format(self.__user, self.__host),
             command
         ]
-        return self.__run_command(
-            command="ssh",
-            flags=" ".join(flags),
-            args=" ".join(args)
-        )
+        return " ".join(flags), " ".join(args)
 
     def copy(self, local_path: str, remote_path: str):
         """
@@ -1,4 +1,8 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 from .scanner import SystemScanner, SystemScannerError
+from .scanner_cache import SystemScannerCache
+from .scan_delta import SystemScanDelta
+from .scan_codec import ScanCodec, ScanDecoder, ScanCodecError
+from .inotify import Inotify, InotifyEvent, InotifyError
 from .file import SystemFile
@@ -1,5 +1,6 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import hashlib
 from typing import List
 from datetime import datetime
 
@@ -7,7 +8,25 @@ from datetime import datetime
 class SystemFile:
     """
     Represents a system file or directory
+
+    Each file has a content hash that covers its own properties and the hashes
+    of its children (like a Merkle tree). The hash is computed on first use and
+    cached, so comparing two unchanged trees does not walk them. A file's tree
+    must be complete before its hash is first used.
+
+    Scans can have hundreds of thousands of files, so files use slots and the
+    children list is only created for directories that have children.
     """
+    __slots__ = (
+        "__name",
+        "__size",
+        "__is_dir",
+        "__timestamp_created",
+        "__timestamp_modified",
+        "__children",
+        "__content_hash"
+    )
+
     def __init__(self,
                  name: str,
                  size: int,
@@ -21,13 +40,38 @@ class SystemFile:
         self.__is_dir = is_dir
         self.__timestamp_created = time_created
         self.__timestamp_modified = time_modified
-        self.__children = []
+        self.__children = None  # created on first child
+        self.__content_hash = None
+
+    def __getstate__(self):
+        return (self.__name, self.__size, self.__is_dir, self.__timestamp_created,
+                self.__timestamp_modified, self.__children, self.__content_hash)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Pickled by a version without slots
+            state = tuple(state.get("_SystemFile__" + key) for key in
+                          ("name", "size", "is_dir", "timestamp_created",
+                           "timestamp_modified", "children", "content_hash"))
+        (self.__name, self.__size, self.__is_dir, self.__timestamp_created,
+         self.__timestamp_modified, self.__children, self.__content_hash) = state
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if self is other:
+            return True
+        if not isinstance(other, SystemFile):
+            return NotImplemented
+        return self.content_hash == other.content_hash
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str({
+            "name": self.__name,
+            "size": self.__size,
+            "is_dir": self.__is_dir,
+            "timestamp_created": self.__timestamp_created,
+            "timestamp_modified": self.__timestamp_modified,
+            "children": self.children
+        })
 
     @property
     def name(self) -> str: return self.__name
@@ -45,9 +89,28 @@ class SystemFile:
     def timestamp_modified(self) -> datetime: return self.__timestamp_modified
 
     @property
-    def children(self) -> List["SystemFile"]: return self.__children
+    def children(self) -> List["SystemFile"]:
+        return self.__children if self.__children is not None else []
+
+    @property
+    def content_hash(self) -> bytes:
+        """Hash of this file's properties and its entire tree"""
+        if self.__content_hash is None:
+            content = repr((
+                self.__name,
+                self.__size,
+                self.__is_dir,
+                self.__timestamp_created,
+                self.__timestamp_modified,
+                tuple(child.content_hash for child in self.children)
+            ))
+            self.__content_hash = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+        return self.__content_hash
 
     def add_child(self, file: "SystemFile"):
         if not self.__is_dir:
             raise TypeError("Cannot add children to a file")
+        if self.__children is None:
+            self.__children = []
         self.__children.append(file)
+        self.__content_hash = None
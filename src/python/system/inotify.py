@@ -0,0 +1,141 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+from typing import List, NamedTuple, Optional
+
+# my libs
+from common import AppError
+
+
+class InotifyError(AppError):
+    """
+    Exception indicating an inotify failure
+
+    Args:
+        error_number: errno of the failed call, if any
+    """
+    def __init__(self, message: str, error_number: Optional[int] = None):
+        super().__init__(message)
+        self.error_number = error_number
+
+
+class InotifyEvent(NamedTuple):
+    wd: int
+    mask: int
+    cookie: int
+    name: str  # name of the entry within the watched directory, empty for the directory itself
+
+
+class Inotify:
+    """
+    Minimal ctypes wrapper around the Linux inotify API
+    The inotify instance is non-blocking; read_events() returns immediately.
+    """
+    # Event masks, from <sys/inotify.h>
+    IN_ACCESS = 0x00000001
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_CLOSE_NOWRITE = 0x00000010
+    IN_OPEN = 0x00000020
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_UNMOUNT = 0x00002000
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_DONT_FOLLOW = 0x02000000
+    IN_ISDIR = 0x40000000
+
+    __IN_CLOEXEC = 0o2000000
+    __IN_NONBLOCK = 0o4000
+    __EVENT_HEADER = struct.Struct("iIII")
+    __READ_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.__libc = None
+        self.__fd = None
+
+    @staticmethod
+    def is_supported() -> bool:
+        """Returns true if inotify is available on this system"""
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            libc = Inotify.__load_libc()
+        except OSError:
+            return False
+        return hasattr(libc, "inotify_init1")
+
+    @staticmethod
+    def __load_libc() -> ctypes.CDLL:
+        return ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+    def open(self):
+        if self.__fd is not None:
+            return
+        try:
+            self.__libc = Inotify.__load_libc()
+        except OSError as e:
+            raise InotifyError("Failed to load libc: {}".format(str(e)))
+        fd = self.__libc.inotify_init1(Inotify.__IN_NONBLOCK | Inotify.__IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError("inotify_init1 failed: {}".format(os.strerror(err)), err)
+        self.__fd = fd
+
+    def close(self):
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """
+        Watch a path, or update the mask of an existing watch
+        :param path:
+        :param mask:
+        :return: watch descriptor; the same path (inode) always gets the same descriptor
+        """
+        wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(path), ctypes.c_uint32(mask))
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise InotifyError("inotify_add_watch failed for {}: {}".format(path, os.strerror(err)), err)
+        return wd
+
+    def remove_watch(self, wd: int):
+        if self.__libc.inotify_rm_watch(self.__fd, wd) < 0:
+            err = ctypes.get_errno()
+            # Watch is already gone if the path was deleted
+            if err != errno.EINVAL:
+                raise InotifyError("inotify_rm_watch failed: {}".format(os.strerror(err)), err)
+
+    def read_events(self) -> List[InotifyEvent]:
+        """
+        Read all pending events without blocking
+        :return:
+        """
+        events = []
+        while True:
+            try:
+                buf = os.read(self.__fd, Inotify.__READ_SIZE)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            offset = 0
+            while offset < len(buf):
+                wd, mask, cookie, length = Inotify.__EVENT_HEADER.unpack_from(buf, offset)
+                offset += Inotify.__EVENT_HEADER.size
+                name = os.fsdecode(buf[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                events.append(InotifyEvent(wd=wd, mask=mask, cookie=cookie, name=name))
+        return events
@@ -0,0 +1,507 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import zlib
+try:
+    import lzma
+except ImportError:
+    # Python can be built without lzma support
+    lzma = None
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+
+# my libs
+from common import AppError
+from .file import SystemFile
+from .scan_delta import SystemScanDelta
+
+
+class ScanCodecError(AppError):
+    """
+    Exception indicating malformed scan data
+    """
+    pass
+
+
+class ScanCodec:
+    """
+    Compact binary encoding of scan results, used instead of pickle to send
+    scans from scan_fs to the RemoteScanner
+
+    Layout:
+        header      magic "SSFB", version byte
+        message     "L" file list | "D" delta
+        delta       generation str, base generation (flag byte, str),
+                    varint count of removed names followed by the names,
+                    then a file list
+        file list   varint count of root files, each followed by its tree in pre-order
+        file        flags byte, name, varint size, timestamps, content hash
+                    (root files only), and for directories a varint child count
+        end         "E"
+
+    Names are interned: a name is written as a varint reference to a previously
+    seen name, or 0 followed by the length-prefixed utf-8 name.
+    Timestamps are microseconds as zigzag varints. Files next to each other tend
+    to have close timestamps, so the created time is relative to the created time
+    of the previous file, and the modified time is relative to the created time.
+    Timestamps are expected to be naive datetimes, as created by SystemScanner.
+
+    The encoded data can optionally be compressed, in which case it is framed as:
+        header      magic "SSFZ", compression byte ("z" zlib | "x" lzma)
+        payload     compressed data
+        end         "E"
+
+    RemoteScanner reads the output of scan_fs over plain pipes (Sshcp.shell_stream),
+    so the data arrives byte-exact and is decoded in chunks as it arrives. The end
+    markers let the decoder tell a complete scan from one that was cut short.
+    """
+    MAGIC = b"SSFB"
+    MAGIC_COMPRESSED = b"SSFZ"
+    VERSION = 1
+
+    COMPRESSION_ZLIB = "zlib"
+    COMPRESSION_LZMA = "lzma"
+    COMPRESSIONS = (COMPRESSION_ZLIB, COMPRESSION_LZMA)
+    _COMPRESSION_IDS = {COMPRESSION_ZLIB: ord("z"), COMPRESSION_LZMA: ord("x")}
+
+    _MESSAGE_LIST = ord("L")
+    _MESSAGE_DELTA = ord("D")
+    _END = ord("E")
+
+    _FLAG_DIR = 0x01
+    _FLAG_CREATED = 0x02
+    _FLAG_MODIFIED = 0x04
+    _FLAG_HASH = 0x08
+
+    _HASH_SIZE = 16
+    _EPOCH = datetime(1970, 1, 1)
+    _MICROSECOND = timedelta(microseconds=1)
+
+    @staticmethod
+    def encode(result: Union[List[SystemFile], SystemScanDelta], compression: Optional[str] = None) -> bytes:
+        """
+        Encode a scan result
+        :param result: list of root files, or a scan delta
+        :param compression: one of COMPRESSIONS, or None for no compression
+        :return:
+        """
+        encoder = _Encoder()
+        out = encoder.out
+        out += ScanCodec.MAGIC
+        out.append(ScanCodec.VERSION)
+        if isinstance(result, SystemScanDelta):
+            out.append(ScanCodec._MESSAGE_DELTA)
+            encoder.write_str(result.generation)
+            if result.base_generation is None:
+                out.append(0)
+            else:
+                out.append(1)
+                encoder.write_str(result.base_generation)
+            encoder.write_uint(len(result.removed))
+            for name in result.removed:
+                encoder.write_str(name)
+            encoder.write_files(result.updated)
+        else:
+            out.append(ScanCodec._MESSAGE_LIST)
+            encoder.write_files(result)
+        out.append(ScanCodec._END)
+        if compression is None:
+            return bytes(out)
+        return ScanCodec.__compress(out, compression)
+
+    @staticmethod
+    def __compress(data: bytearray, compression: str) -> bytes:
+        if compression == ScanCodec.COMPRESSION_ZLIB:
+            payload = zlib.compress(data)
+        elif compression == ScanCodec.COMPRESSION_LZMA:
+            if lzma is None:
+                raise ScanCodecError("lzma compression is not available")
+            payload = lzma.compress(data)
+        else:
+            raise ValueError("Unknown compression: {}".format(compression))
+        return b"".join([
+            ScanCodec.MAGIC_COMPRESSED,
+            bytes([ScanCodec._COMPRESSION_IDS[compression]]),
+            payload,
+            bytes([ScanCodec._END])
+        ])
+
+    @staticmethod
+    def decode(data: bytes) -> Union[List[SystemFile], SystemScanDelta]:
+        """
+        Decode a complete scan result
+        :param data:
+        :return:
+        """
+        decoder = ScanDecoder()
+        decoder.feed(data)
+        return decoder.result()
+
+
+class _Encoder:
+    def __init__(self):
+        self.out = bytearray()
+        self.__names = {}
+        self.__last_created = 0
+
+    def write_uint(self, value: int):
+        out = self.out
+        while value >= 0x80:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def write_int(self, value: int):
+        # zigzag, so small negative values stay small
+        self.write_uint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+
+    def write_str(self, value: str):
+        data = value.encode("utf-8", "surrogateescape")
+        self.write_uint(len(data))
+        self.out += data
+
+    def write_name(self, name: str):
+        ref = self.__names.get(name)
+        if ref is not None:
+            self.write_uint(ref)
+        else:
+            self.out.append(0)
+            self.write_str(name)
+            self.__names[name] = len(self.__names) + 1
+
+    @staticmethod
+    def timestamp_to_int(timestamp: datetime) -> int:
+        if timestamp.tzinfo is not None:
+            raise ScanCodecError("Timezone-aware timestamps are not supported")
+        return (timestamp - ScanCodec._EPOCH) // ScanCodec._MICROSECOND
+
+    def write_files(self, files: List[SystemFile]):
+        self.write_uint(len(files))
+        for file in files:
+            self.write_file(file, is_root=True)
+
+    def write_file(self, file: SystemFile, is_root: bool = False):
+        # Iterative pre-order traversal, trees can be deep
+        stack = [(file, is_root)]
+        while stack:
+            file, is_root = stack.pop()
+            created = file.timestamp_created
+            modified = file.timestamp_modified
+            flags = 0
+            if file.is_dir:
+                flags |= ScanCodec._FLAG_DIR
+            if created is not None:
+                flags |= ScanCodec._FLAG_CREATED
+            if modified is not None:
+                flags |= ScanCodec._FLAG_MODIFIED
+            if is_root:
+                # Root hashes let the receiver compare trees without hashing them
+                flags |= ScanCodec._FLAG_HASH
+            self.out.append(flags)
+            self.write_name(file.name)
+            self.write_uint(file.size)
+            created_int = None
+            if created is not None:
+                created_int = _Encoder.timestamp_to_int(created)
+                self.write_int(created_int - self.__last_created)
+                self.__last_created = created_int
+            if modified is not None:
+                modified_int = _Encoder.timestamp_to_int(modified)
+                self.write_int(modified_int - created_int if created_int is not None else modified_int)
+            if is_root:
+                self.out += file.content_hash
+            if file.is_dir:
+                children = file.children
+                self.write_uint(len(children))
+                stack.extend((child, False) for child in reversed(children))
+
+
+class _Incomplete(Exception):
+    """Raised when the buffer ends in the middle of a record"""
+    pass
+
+
+# Decoding helpers take the buffer and a position and return (value, next position)
+# They let IndexError propagate when the buffer ends mid-record
+
+
+def _read_uint(buffer: bytearray, pos: int) -> (int, int):
+    byte = buffer[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    value = byte & 0x7f
+    shift = 7
+    while True:
+        pos += 1
+        byte = buffer[pos]
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+        if shift > 70:
+            raise ScanCodecError("Malformed scan data: varint too long")
+
+
+def _read_int(buffer: bytearray, pos: int) -> (int, int):
+    value, pos = _read_uint(buffer, pos)
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1), pos
+
+
+def _read_str(buffer: bytearray, pos: int) -> (str, int):
+    length, pos = _read_uint(buffer, pos)
+    end = pos + length
+    if end > len(buffer):
+        raise IndexError()
+    return buffer[pos:end].decode("utf-8", "surrogateescape"), end
+
+
+class ScanDecoder:
+    """
+    Incremental decoder for ScanCodec data
+
+    Data can be fed in chunks as it arrives. Each file is decoded as soon as its
+    record is complete, and consumed bytes are released, so memory use is
+    proportional to the decoded files rather than the encoded data.
+    Compressed data is detected from its header and decompressed as it arrives.
+    """
+    # Release consumed bytes once this many have accumulated
+    __COMPACT_SIZE = 1024 * 1024
+
+    def __init__(self):
+        # Compression framing state
+        self.__framing_done = False
+        self.__framing_buffer = bytearray()
+        self.__decompressor = None
+        self.__compressed_tail = bytearray()
+        # Encoded data state
+        self.__buffer = bytearray()
+        self.__pos = 0
+        self.__names = [None]  # 1-based references
+        self.__header_done = False
+        self.__done = False
+        # Message state
+        self.__is_delta = False
+        self.__generation = None
+        self.__base_generation = None
+        self.__removed = None  # type: Optional[List[str]]
+        self.__roots = None  # type: Optional[List[SystemFile]]
+        self.__num_roots = 0
+        # Stack of [children list, remaining children count] for open directories
+        self.__stack = []
+        self.__last_created_timestamp = ScanCodec._EPOCH
+
+    @property
+    def done(self) -> bool:
+        if self.__decompressor is not None:
+            return self.__done and bytes(self.__compressed_tail) == bytes([ScanCodec._END])
+        return self.__done
+
+    def feed(self, data: bytes):
+        """
+        Decode as much as possible of the data received so far
+        :param data:
+        :return:
+        """
+        if not self.__framing_done:
+            self.__framing_buffer += data
+            header_size = len(ScanCodec.MAGIC_COMPRESSED) + 1
+            if len(self.__framing_buffer) < header_size:
+                return
+            data = bytes(self.__framing_buffer)
+            self.__framing_buffer = None
+            self.__framing_done = True
+            if data.startswith(ScanCodec.MAGIC_COMPRESSED):
+                compression_id = data[len(ScanCodec.MAGIC_COMPRESSED)]
+                if compression_id == ScanCodec._COMPRESSION_IDS[ScanCodec.COMPRESSION_ZLIB]:
+                    self.__decompressor = zlib.decompressobj()
+                elif compression_id == ScanCodec._COMPRESSION_IDS[ScanCodec.COMPRESSION_LZMA]:
+                    if lzma is None:
+                        raise ScanCodecError("lzma compression is not available")
+                    self.__decompressor = lzma.LZMADecompressor()
+                else:
+                    raise ScanCodecError("Malformed scan data: unknown compression")
+                data = data[header_size:]
+
+        if self.__decompressor is None:
+            self.__feed_decoded(data)
+            return
+
+        if not self.__decompressor.eof:
+            try:
+                decompressed = self.__decompressor.decompress(data)
+            except (zlib.error, EOFError) + ((lzma.LZMAError,) if lzma else ()) as e:
+                raise ScanCodecError("Malformed scan data: {}".format(str(e)))
+            self.__feed_decoded(decompressed)
+            if not self.__decompressor.eof:
+                return
+            data = self.__decompressor.unused_data
+            if not self.__done:
+                raise ScanCodecError("Malformed scan data: compressed data ended early")
+        self.__compressed_tail += data
+        if not bytes([ScanCodec._END]).startswith(bytes(self.__compressed_tail)):
+            raise ScanCodecError("Malformed scan data: unexpected data after end")
+
+    def __feed_decoded(self, data: bytes):
+        """
+        Decode as much as possible of the uncompressed data received so far
+        :param data:
+        :return:
+        """
+        if self.__done:
+            if data:
+                raise ScanCodecError("Malformed scan data: unexpected data after end")
+            return
+        self.__buffer += data
+        try:
+            self.__parse()
+        except (_Incomplete, IndexError):
+            # Wait for the rest of the record
+            pass
+        except (UnicodeDecodeError, ValueError, OverflowError) as e:
+            raise ScanCodecError("Malformed scan data: {}".format(str(e)))
+        if self.__pos >= ScanDecoder.__COMPACT_SIZE or self.__done:
+            del self.__buffer[:self.__pos]
+            self.__pos = 0
+        if self.__done and self.__buffer:
+            raise ScanCodecError("Malformed scan data: unexpected data after end")
+
+    def result(self) -> Union[List[SystemFile], SystemScanDelta]:
+        """
+        Returns the decoded scan
+        Raises ScanCodecError if the data is incomplete
+        :return:
+        """
+        if not self.done:
+            raise ScanCodecError("Incomplete scan data")
+        if self.__is_delta:
+            return SystemScanDelta(generation=self.__generation,
+                                   base_generation=self.__base_generation,
+                                   updated=self.__roots,
+                                   removed=self.__removed)
+        return self.__roots
+
+    def __parse(self):
+        # Each step reads from a local position and only commits it to
+        # self.__pos once its record is complete
+        buffer = self.__buffer
+        if not self.__header_done:
+            magic_size = len(ScanCodec.MAGIC)
+            if len(buffer) < magic_size + 2:
+                raise _Incomplete()
+            if bytes(buffer[:magic_size]) != ScanCodec.MAGIC:
+                raise ScanCodecError("Malformed scan data: bad header")
+            if buffer[magic_size] != ScanCodec.VERSION:
+                raise ScanCodecError("Unsupported scan data version {}".format(buffer[magic_size]))
+            message = buffer[magic_size + 1]
+            if message not in (ScanCodec._MESSAGE_LIST, ScanCodec._MESSAGE_DELTA):
+                raise ScanCodecError("Malformed scan data: unknown message")
+            self.__is_delta = message == ScanCodec._MESSAGE_DELTA
+            self.__pos = magic_size + 2
+            self.__header_done = True
+
+        if self.__is_delta and self.__removed is None:
+            pos = self.__pos
+            generation, pos = _read_str(buffer, pos)
+            has_base = buffer[pos]
+            pos += 1
+            base_generation = None
+            if has_base:
+                base_generation, pos = _read_str(buffer, pos)
+            num_removed, pos = _read_uint(buffer, pos)
+            removed = []
+            for _ in range(num_removed):
+                name, pos = _read_str(buffer, pos)
+                removed.append(name)
+            self.__generation = generation
+            self.__base_generation = base_generation
+            self.__removed = removed
+            self.__pos = pos
+
+        if self.__roots is None:
+            self.__num_roots, self.__pos = _read_uint(buffer, self.__pos)
+            self.__roots = []
+
+        self.__parse_files()
+
+        if buffer[self.__pos] != ScanCodec._END:
+            raise ScanCodecError("Malformed scan data: missing end marker")
+        self.__pos += 1
+        self.__done = True
+
+    def __parse_files(self):
+        # This is the hot loop, so everything is kept in locals
+        buffer = self.__buffer
+        names = self.__names
+        stack = self.__stack
+        roots = self.__roots
+        num_roots = self.__num_roots
+        read_uint = _read_uint
+        read_int = _read_int
+        read_str = _read_str
+        epoch = ScanCodec._EPOCH
+        hash_size = ScanCodec._HASH_SIZE
+        flag_dir = ScanCodec._FLAG_DIR
+        flag_created = ScanCodec._FLAG_CREATED
+        flag_modified = ScanCodec._FLAG_MODIFIED
+        flag_hash = ScanCodec._FLAG_HASH
+        new_file = SystemFile.__new__
+        last_created_timestamp = self.__last_created_timestamp
+        pos = self.__pos
+        while stack or len(roots) < num_roots:
+            flags = buffer[pos]
+            ref, pos = read_uint(buffer, pos + 1)
+            new_name = None
+            if ref == 0:
+                new_name, pos = read_str(buffer, pos)
+                name = new_name
+            elif ref < len(names):
+                name = names[ref]
+            else:
+                raise ScanCodecError("Malformed scan data: bad name reference")
+            size, pos = read_uint(buffer, pos)
+            created = None
+            modified = None
+            if flags & flag_created:
+                created_delta, pos = read_int(buffer, pos)
+                if created_delta == 0:
+                    # Timestamps are immutable, so share them
+                    created = last_created_timestamp
+                else:
+                    created = last_created_timestamp + timedelta(microseconds=created_delta)
+                if flags & flag_modified:
+                    modified_delta, pos = read_int(buffer, pos)
+                    modified = created if modified_delta == 0 else created + timedelta(microseconds=modified_delta)
+            elif flags & flag_modified:
+                modified_int, pos = read_int(buffer, pos)
+                modified = epoch + timedelta(microseconds=modified_int)
+            content_hash = None
+            if flags & flag_hash:
+                if pos + hash_size > len(buffer):
+                    raise _Incomplete()
+                content_hash = bytes(buffer[pos:pos + hash_size])
+                pos += hash_size
+            is_dir = bool(flags & flag_dir)
+            children = None
+            num_children = 0
+            if is_dir:
+                num_children, pos = read_uint(buffer, pos)
+                if num_children > 0:
+                    children = []
+
+            # Record is complete, commit it
+            self.__pos = pos
+            if created is not None:
+                last_created_timestamp = self.__last_created_timestamp = created
+            if new_name is not None:
+                names.append(new_name)
+            file = new_file(SystemFile)
+            file.__setstate__((name, size, is_dir, created, modified, children, content_hash))
+            if stack:
+                parent = stack[-1]
+                parent[0].append(file)
+                parent[1] -= 1
+                if parent[1] == 0:
+                    stack.pop()
+            else:
+                roots.append(file)
+            if children is not None:
+                stack.append([children, num_children])
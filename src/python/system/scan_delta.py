@@ -0,0 +1,119 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import os
+import pickle
+from typing import Dict, List, Optional, Tuple
+
+from .file import SystemFile
+
+
+class SystemScanDelta:
+    """
+    Changes in a scan result relative to a previous scan of the same path
+
+    Changes are tracked at the granularity of root files: a root file that was
+    added or changed anywhere in its tree is sent in full.
+    A delta without a base generation is a full snapshot of the scan.
+    """
+    def __init__(self,
+                 generation: str,
+                 base_generation: Optional[str],
+                 updated: List[SystemFile],
+                 removed: List[str]):
+        """
+        :param generation: id of the scan this delta brings the receiver up to
+        :param base_generation: id of the scan this delta applies to, None if
+                                this is a full snapshot
+        :param updated: root files that were added or changed
+        :param removed: names of root files that were removed
+        """
+        self.generation = generation
+        self.base_generation = base_generation
+        self.updated = updated
+        self.removed = removed
+
+    def __eq__(self, other):
+        return self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return str(self.__dict__)
+
+    @property
+    def is_full(self) -> bool:
+        return self.base_generation is None
+
+    def apply(self, files: List[SystemFile]) -> List[SystemFile]:
+        """
+        Apply this delta to the files of the base generation
+        :param files:
+        :return: files of the new generation, sorted by name
+        """
+        if self.is_full:
+            files_dict = {}
+        else:
+            files_dict = {f.name: f for f in files}
+            for name in self.removed:
+                files_dict.pop(name, None)
+        for file in self.updated:
+            files_dict[file.name] = file
+        return [files_dict[name] for name in sorted(files_dict.keys())]
+
+    @staticmethod
+    def digest(files: List[SystemFile]) -> Dict[str, bytes]:
+        """
+        Returns a map of root file name to a digest of its entire tree
+        Digests are used to remember a scan without storing the whole tree
+        :param files:
+        :return:
+        """
+        return {f.name: f.content_hash for f in files}
+
+    @staticmethod
+    def create(generation: str,
+               base_generation: Optional[str],
+               files: List[SystemFile],
+               base_digests: Optional[Dict[str, bytes]],
+               digests: Dict[str, bytes]) -> "SystemScanDelta":
+        """
+        Create a delta between a previous scan and the current one
+        :param generation: id of the current scan
+        :param base_generation: id of the previous scan, None to create a full snapshot
+        :param files: files of the current scan
+        :param base_digests: digests of the previous scan
+        :param digests: digests of the current scan
+        :return:
+        """
+        if base_generation is None or base_digests is None:
+            return SystemScanDelta(generation, None, files, [])
+        updated = [f for f in files if base_digests.get(f.name) != digests[f.name]]
+        removed = sorted(name for name in base_digests.keys() if name not in digests)
+        return SystemScanDelta(generation, base_generation, updated, removed)
+
+    @staticmethod
+    def load_state(file_path: str) -> Tuple[Optional[str], Optional[Dict[str, bytes]]]:
+        """
+        Load the generation and digests of the last scan sent
+        Returns (None, None) if there is no usable state
+        :param file_path:
+        :return:
+        """
+        try:
+            with open(file_path, "rb") as f:
+                generation, digests = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError):
+            return None, None
+        return generation, digests
+
+    @staticmethod
+    def save_state(file_path: str, generation: str, digests: Dict[str, bytes]):
+        """
+        Persist the generation and digests of the scan being sent
+        :param file_path:
+        :param generation:
+        :param digests:
+        :return:
+        """
+        temp_file_path = "{}.{}.tmp".format(file_path, os.getpid())
+        with open(temp_file_path, "wb") as f:
+            pickle.dump((generation, digests), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file_path, file_path)
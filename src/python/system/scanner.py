@@ -2,12 +2,14 @@
 
 import os
 import re
-from typing import List
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional, Dict, Tuple
+from datetime import datetime, timedelta
 
 # my libs
 from common import AppError
 from .file import SystemFile
+from .scanner_cache import SystemScannerCache, CachedEntry
 
 
 class SystemScannerError(AppError):
@@ -46,6 +48,10 @@ class SystemScanner:
         self.exclude_prefixes = []
         self.exclude_suffixes = [SystemScanner.__LFTP_STATUS_FILE_SUFFIX]
         self.__lftp_temp_file_suffix = None
+        self.__cache = None  # type: Optional[SystemScannerCache]
+        self.__visited_dirs = set()
+        self.__settle_threshold = None
+        self.__num_workers = 1
 
     def add_exclude_prefix(self, prefix: str):
         """
@@ -72,6 +78,30 @@ class SystemScanner:
         """
         self.__lftp_temp_file_suffix = suffix
 
+    def set_cache(self, cache: Optional[SystemScannerCache]):
+        """
+        Set the directory listing cache used by scan()
+        Directories that are unchanged since the cache was populated are
+        not listed again. The cache is updated by each scan.
+        :param cache: cache to use, or None to disable caching
+        :return:
+        """
+        self.__cache = cache
+
+    def set_num_workers(self, num_workers: int):
+        """
+        Set the number of threads used by scan() to walk directories in parallel
+        This helps on high-latency filesystems (e.g. NFS) where each directory
+        listing and stat is a round trip. The result is identical to a
+        single-threaded scan.
+        Parallel walking is not used when a cache is set.
+        :param num_workers: 1 for a single-threaded scan
+        :return:
+        """
+        if num_workers < 1:
+            raise ValueError("Number of workers must be at least 1")
+        self.__num_workers = num_workers
+
     def scan(self) -> List[SystemFile]:
         """
         Scan the path to generate list of system files
@@ -81,7 +111,17 @@ class SystemScanner:
             raise SystemScannerError("Path does not exist: {}".format(self.path_to_scan))
         elif not os.path.isdir(self.path_to_scan):
             raise SystemScannerError("Path is not a directory: {}".format(self.path_to_scan))
-        return self.__create_children(self.path_to_scan)
+        if self.__cache is None:
+            if self.__num_workers > 1:
+                return self.__scan_parallel()
+            return self.__create_children(self.path_to_scan)
+
+        self.__visited_dirs = set()
+        self.__settle_threshold = datetime.now() - timedelta(seconds=self.__cache.settle_time_in_secs)
+        children = self.__create_children(self.path_to_scan, os.stat(self.path_to_scan))
+        # Evict directories that were not seen in this scan
+        self.__cache.retain(self.__visited_dirs)
+        return children
 
     def scan_single(self, name: str) -> SystemFile:
         """
@@ -125,22 +165,8 @@ class SystemScanner:
             The SystemFile object
         """
         if entry.is_dir():
-            sub_children = self.__create_children(entry.path)
-            name = entry.name.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
-            size = sum(sub_child.size for sub_child in sub_children)
-            time_created = None
-            try:
-                time_created = datetime.fromtimestamp(entry.stat().st_birthtime)
-            except AttributeError:
-                pass
-            time_modified = datetime.fromtimestamp(entry.stat().st_mtime)
-            sys_file = SystemFile(name,
-                                  size,
-                                  True,
-                                  time_created=time_created,
-                                  time_modified=time_modified)
-            for sub_child in sub_children:
-                sys_file.add_child(sub_child)
+            sub_children = self.__create_children(entry.path, entry.stat())
+            sys_file = SystemScanner.__create_dir_system_file(entry, sub_children)
         else:
             file_size = entry.stat().st_size
             # Check if it's a partial lftp file, and if so, use the lftp
@@ -168,19 +194,121 @@ class SystemScanner:
                                   time_modified=time_modified)
         return sys_file
 
-    def __create_children(self, path: str) -> List[SystemFile]:
+    @staticmethod
+    def __create_dir_system_file(entry, sub_children: List[SystemFile]) -> SystemFile:
+        """
+        Creates a system file for a directory from its DirEntry and scanned children
+        """
+        name = entry.name.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+        size = sum(sub_child.size for sub_child in sub_children)
+        time_created = None
+        try:
+            time_created = datetime.fromtimestamp(entry.stat().st_birthtime)
+        except AttributeError:
+            pass
+        time_modified = datetime.fromtimestamp(entry.stat().st_mtime)
+        sys_file = SystemFile(name,
+                              size,
+                              True,
+                              time_created=time_created,
+                              time_modified=time_modified)
+        for sub_child in sub_children:
+            sys_file.add_child(sub_child)
+        return sys_file
+
+    def __is_excluded(self, name: str) -> bool:
+        for prefix in self.exclude_prefixes:
+            if name.startswith(prefix):
+                return True
+        for suffix in self.exclude_suffixes:
+            if name.endswith(suffix):
+                return True
+        return False
+
+    def __scan_parallel(self) -> List[SystemFile]:
+        """
+        Scan using a pool of threads
+        Each directory is listed by a separate task, and files are stat'ed by the
+        task listing their directory. Once all directories are listed, the tree is
+        assembled in the same order as a single-threaded scan.
+        """
+        listings = {}  # type: Dict[str, Optional[List[Tuple[os.DirEntry, Optional[SystemFile]]]]]
+        with ThreadPoolExecutor(max_workers=self.__num_workers) as executor:
+            pending = {executor.submit(self.__list_dir, self.path_to_scan)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, listing = future.result()
+                    listings[path] = listing
+                    for entry, sys_file in listing or []:
+                        if sys_file is None:
+                            pending.add(executor.submit(self.__list_dir, entry.path))
+        children = self.__assemble_children(self.path_to_scan, listings)
+        if children is None:
+            raise SystemScannerError("Path does not exist: {}".format(self.path_to_scan))
+        return children
+
+    def __list_dir(self, path: str) -> Tuple[str, Optional[List[Tuple[os.DirEntry, Optional[SystemFile]]]]]:
+        """
+        List a single directory for a parallel scan
+        Returns the directory's entries, each with its system file if it is a
+        file, or None if it is a directory. The listing is None if the directory
+        was deleted while scanning.
+        """
+        listing = []
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return path, None
+        for entry in entries:
+            if self.__is_excluded(entry.name):
+                continue
+            # Files may get deleted while scanning, ignore the error
+            try:
+                if entry.is_dir():
+                    # Fetch the stat now so it's cached for assembly
+                    entry.stat()
+                    listing.append((entry, None))
+                else:
+                    listing.append((entry, self.__create_system_file(entry)))
+            except FileNotFoundError:
+                continue
+        return path, listing
+
+    def __assemble_children(self,
+                            path: str,
+                            listings: Dict[str, Optional[List[Tuple[os.DirEntry, Optional[SystemFile]]]]]) \
+            -> Optional[List[SystemFile]]:
+        listing = listings.get(path)
+        if listing is None:
+            return None
+        children = []
+        for entry, sys_file in listing:
+            if sys_file is None:
+                sub_children = self.__assemble_children(entry.path, listings)
+                if sub_children is None:
+                    # Deleted while scanning
+                    continue
+                sys_file = SystemScanner.__create_dir_system_file(entry, sub_children)
+            children.append(sys_file)
+        children.sort(key=lambda fl: fl.name)
+        return children
+
+    def __create_children(self, path: str, stat: os.stat_result = None) -> List[SystemFile]:
+        if self.__cache is not None and stat is not None:
+            self.__visited_dirs.add(path)
+            listing = self.__cache.get_listing(path, stat)
+            if listing is not None:
+                return self.__create_children_from_listing(path, stat, listing)
+
         children = []
+        listing = []
+        names = set()
         # Files may get deleted while scanning, ignore the error
         for entry in os.scandir(path):
+            names.add(entry.name)
             # Skip excluded entries
-            skip = False
-            for prefix in self.exclude_prefixes:
-                if entry.name.startswith(prefix):
-                    skip = True
-            for suffix in self.exclude_suffixes:
-                if entry.name.endswith(suffix):
-                    skip = True
-            if skip:
+            if self.__is_excluded(entry.name):
                 continue
 
             try:
@@ -188,9 +316,78 @@ class SystemScanner:
             except FileNotFoundError:
                 continue
             children.append(sys_file)
+            if self.__cache is not None:
+                listing.append(CachedEntry(
+                    raw_name=entry.name,
+                    is_dir=sys_file.is_dir,
+                    file=None if sys_file.is_dir else sys_file,
+                    stat_key=SystemScanner.__stat_key(sys_file.is_dir, entry.stat()),
+                    volatile=False
+                ))
         children.sort(key=lambda fl: fl.name)
+
+        if self.__cache is not None and stat is not None:
+            # Partial lftp files may grow without touching the directory mtime
+            status_suffix = SystemScanner.__LFTP_STATUS_FILE_SUFFIX
+            listing = [
+                e._replace(volatile=True) if e.raw_name + status_suffix in names else e
+                for e in listing
+            ]
+            self.__cache.put_listing(path, stat, listing)
         return children
 
+    def __create_children_from_listing(self,
+                                       path: str,
+                                       stat: os.stat_result,
+                                       listing: List[CachedEntry]) -> List[SystemFile]:
+        """
+        Create children from a cached directory listing
+        Every entry is re-stat'ed, since files modified in-place do not change
+        the directory mtime. Cached files are reused if their size and mtime are
+        unchanged, unless they are volatile or were modified recently.
+        Directories are validated against the cache.
+        """
+        children = []
+        new_listing = []
+        for cached in listing:
+            entry_path = os.path.join(path, cached.raw_name)
+            try:
+                entry_stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            stat_key = SystemScanner.__stat_key(cached.is_dir, entry_stat)
+            if not cached.is_dir and not cached.volatile and \
+                    cached.stat_key == stat_key and \
+                    cached.file.timestamp_modified is not None and \
+                    cached.file.timestamp_modified < self.__settle_threshold:
+                children.append(cached.file)
+                new_listing.append(cached)
+                continue
+
+            try:
+                sys_file = self.__create_system_file(
+                    PseudoDirEntry(
+                        name=cached.raw_name,
+                        path=entry_path,
+                        is_dir=cached.is_dir,
+                        stat=entry_stat
+                    )
+                )
+            except FileNotFoundError:
+                continue
+            children.append(sys_file)
+            new_listing.append(cached._replace(file=None if cached.is_dir else sys_file, stat_key=stat_key))
+        children.sort(key=lambda fl: fl.name)
+        self.__cache.put_listing(path, stat, new_listing)
+        return children
+
+    @staticmethod
+    def __stat_key(is_dir: bool, stat: os.stat_result) -> Optional[Tuple[int, int]]:
+        """
+        Returns the part of a file's stat that changes when it's modified in-place
+        """
+        return None if is_dir else (stat.st_size, stat.st_mtime_ns)
+
     @staticmethod
     def _lftp_status_file_size(status: str) -> int:
         """
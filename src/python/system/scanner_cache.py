@@ -0,0 +1,124 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import os
+import pickle
+from typing import Dict, List, Optional, Tuple, NamedTuple
+
+from .file import SystemFile
+
+
+class CachedEntry(NamedTuple):
+    """
+    A single entry of a cached directory listing
+    """
+    # Name as returned by the filesystem, used to rebuild the entry's path
+    raw_name: str
+    is_dir: bool
+    # Scanned file, None for directories since they are always descended into
+    file: Optional[SystemFile]
+    # (size, mtime_ns) of the file when it was scanned, None for directories
+    stat_key: Optional[Tuple[int, int]]
+    # True if the entry may change without touching the directory mtime
+    # (e.g. a partial lftp file whose size comes from its status file)
+    volatile: bool
+
+
+class SystemScannerCache:
+    """
+    Cache of directory listings used by SystemScanner to skip unchanged directories
+
+    A listing is keyed by the directory path and is considered valid as long as
+    the directory's inode and modification time are unchanged. A directory's mtime
+    only changes when entries are added, removed or renamed, so a valid listing
+    lets the scanner skip the scandir call and the per-file stat calls.
+    Sub-directories are still stat'ed and validated individually since changes
+    deep in the tree are not reflected in the mtime of their ancestors.
+
+    Files that are modified in-place do not update the directory mtime. To catch
+    those, each cached file is re-stat'ed and reused only if its size and mtime
+    are unchanged. Files modified within the last settle_time_in_secs are always
+    re-scanned.
+    """
+    __VERSION = 2
+
+    def __init__(self, signature: Tuple = (), settle_time_in_secs: int = 300):
+        """
+        :param signature: scan parameters; a cache loaded with a different
+                          signature is discarded
+        :param settle_time_in_secs: files modified more recently than this are
+                                    always re-scanned
+        """
+        self.signature = signature
+        self.settle_time_in_secs = settle_time_in_secs
+        # path -> (inode, mtime_ns, listing)
+        self.__listings = {}  # type: Dict[str, Tuple[int, int, List[CachedEntry]]]
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.__listings)
+
+    def get_listing(self, path: str, stat: os.stat_result) -> Optional[List[CachedEntry]]:
+        """
+        Returns the cached listing of the directory, or None if there is no
+        valid listing for the given directory stat
+        :param path:
+        :param stat:
+        :return:
+        """
+        cached = self.__listings.get(path)
+        if cached is None or cached[0] != stat.st_ino or cached[1] != stat.st_mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cached[2]
+
+    def put_listing(self, path: str, stat: os.stat_result, listing: List[CachedEntry]):
+        self.__listings[path] = (stat.st_ino, stat.st_mtime_ns, listing)
+
+    def clear(self):
+        self.__listings.clear()
+
+    def retain(self, paths: set):
+        """
+        Drop the listings of any directories not in the given set of paths
+        Used after a scan to evict directories that no longer exist
+        :param paths:
+        :return:
+        """
+        for path in [p for p in self.__listings if p not in paths]:
+            del self.__listings[path]
+
+    def save(self, file_path: str):
+        """
+        Persist the cache to file
+        The file is written atomically so a concurrent scan never reads a partial cache
+        :param file_path:
+        :return:
+        """
+        temp_file_path = "{}.{}.tmp".format(file_path, os.getpid())
+        with open(temp_file_path, "wb") as f:
+            pickle.dump((SystemScannerCache.__VERSION, self.signature, self.__listings), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file_path, file_path)
+
+    @staticmethod
+    def load(file_path: str, signature: Tuple = (), settle_time_in_secs: int = 300) -> "SystemScannerCache":
+        """
+        Load a cache from file
+        Returns an empty cache if the file is missing, unreadable, from a different
+        version, or was created with a different signature
+        :param file_path:
+        :param signature:
+        :param settle_time_in_secs:
+        :return:
+        """
+        cache = SystemScannerCache(signature=signature, settle_time_in_secs=settle_time_in_secs)
+        try:
+            with open(file_path, "rb") as f:
+                version, file_signature, listings = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError):
+            return cache
+        if version == SystemScannerCache.__VERSION and file_signature == signature:
+            cache.__listings = listings
+        return cache
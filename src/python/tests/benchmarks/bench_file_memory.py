@@ -0,0 +1,83 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+"""
+Measures the memory used by SystemFile and ModelFile trees
+
+Usage (from src/python):
+    python -m tests.benchmarks.bench_file_memory [--roots N] [--dirs N] [--files N]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List
+
+from system import SystemFile
+from model import ModelFile
+
+
+def build_system_files(num_roots: int, num_dirs: int, num_files: int) -> List[SystemFile]:
+    timestamp = datetime(2018, 11, 9, 21, 40, 18)
+    roots = []
+    for r in range(num_roots):
+        root = SystemFile("root{}".format(r), 0, True, timestamp, timestamp)
+        for d in range(num_dirs):
+            sub_dir = SystemFile("dir{}".format(d), 0, True, timestamp, timestamp)
+            for f in range(num_files):
+                sub_dir.add_child(SystemFile("file{}.mkv".format(f), 1024 * f, False, timestamp, timestamp))
+            root.add_child(sub_dir)
+        roots.append(root)
+    return roots
+
+
+def build_model_files(num_roots: int, num_dirs: int, num_files: int) -> List[ModelFile]:
+    timestamp = datetime(2018, 11, 9, 21, 40, 18)
+    roots = []
+    for r in range(num_roots):
+        root = ModelFile("root{}".format(r), True)
+        root.remote_size = 0
+        for d in range(num_dirs):
+            sub_dir = ModelFile("dir{}".format(d), True)
+            root.add_child(sub_dir)
+            for f in range(num_files):
+                file = ModelFile("file{}.mkv".format(f), False)
+                sub_dir.add_child(file)
+                file.remote_size = 1024 * f
+                file.local_size = 1024 * f
+                file.remote_modified_timestamp = timestamp
+        roots.append(root)
+    return roots
+
+
+def measure(build: Callable[[], List]) -> int:
+    """
+    Returns the bytes allocated by the objects that build() returns
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File tree memory benchmark")
+    parser.add_argument("--roots", type=int, default=100)
+    parser.add_argument("--dirs", type=int, default=10)
+    parser.add_argument("--files", type=int, default=200)
+    args = parser.parse_args()
+
+    num_nodes = args.roots * (1 + args.dirs * (1 + args.files))
+    print("Nodes per tree set: {}".format(num_nodes))
+    for name, build in (("SystemFile", build_system_files), ("ModelFile", build_model_files)):
+        used = measure(lambda: build(args.roots, args.dirs, args.files))
+        print("{:<12} {:>8.1f} MiB  {:>6.0f} bytes/node".format(
+            name, used / (1024 * 1024), used / num_nodes
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+"""
+Measures LftpJobStatusParser on large "jobs -v" outputs
+
+The outputs are assembled from blocks recorded from lftp (see
+test_job_status_parser.py), repeated for many parallel jobs.
+
+Usage (from src/python):
+    python -m tests.benchmarks.bench_lftp_status_parser [--jobs N] [--transfers N]
+"""
+
+import argparse
+import gc
+import time
+from typing import Callable
+
+from lftp import LftpJobStatusParser
+
+
+QUEUE_HEADER = """
+[1] queue (sftp://someone:@localhost)  -- 15.8 KiB/s
+sftp://someone:@localhost/home/someone
+Now executing: [2] mirror -c /tmp/test_lftp/remote/a /tmp/test_lftp/local/ -- 17k/26M (0%) 5.0 KiB/s
+""".strip()
+
+QUEUE_EXECUTING = "        -[{id}] mirror -c /remote/path/Show.Name.S{id:02d} /local/path/ -- 35k/394k (8%) 10.8 KiB/s"
+
+QUEUED_HEADER = "Commands queued:"
+
+QUEUED_PGET = " {num}. pget -c /remote/path/Movie.Name.{num}.mkv -o /local/path/"
+
+QUEUED_MIRROR = " {num}. mirror -c /remote/path/Show.Name.S{num:02d}.720p /local/path/"
+
+MIRROR_JOB = "[{id}] mirror -c /remote/path/Show.Name.S{id:02d} /local/path/  -- 35k/394k (8%) 10.8 KiB/s"
+
+MIRROR_TRANSFER = """
+\\transfer `Show.Name.S{id:02d}/Episode.{num:02d}.mkv'
+`Episode.{num:02d}.mkv', got 12333 of 131072 (9%) 3.9K/s eta:30s
+\\chunk 0-32768
+`Episode.{num:02d}.mkv' at 2970 (2%) 996b/s eta:30s [Receiving data]
+\\chunk 98304-131071
+`Episode.{num:02d}.mkv' at 101288 (9%) 998b/s eta:30s [Receiving data]
+\\chunk 65536-98303
+`Episode.{num:02d}.mkv' at 68727 (9%) 1001b/s eta:1h45m [Receiving data]
+\\chunk 32768-65535
+`Episode.{num:02d}.mkv' at 35956 (9%) 998b/s eta:30s [Receiving data]
+""".strip()
+
+MIRROR_CHMOD = """
+chmod Episode.{num:02d}.nfo
+file:/local/path/Show.Name.S{id:02d}
+`Episode.{num:02d}.nfo' []
+""".strip()
+
+PGET_JOB = """
+[{id}] pget -c /remote/path/Movie.Name.{id}.mkv -o /local/path/
+sftp://someone:@localhost/home/someone
+`/remote/path/Movie.Name.{id}.mkv' at 7536640 (20%) 1.36M/s eta:8s [Receiving data]
+""".strip()
+
+
+def build_output(num_jobs: int, num_transfers: int, num_queued: int) -> str:
+    lines = ["jobs -v", QUEUE_HEADER]
+    lines += [QUEUE_EXECUTING.format(id=i) for i in range(3, num_jobs + 2)]
+    lines.append(QUEUED_HEADER)
+    for num in range(1, num_queued + 1):
+        lines.append((QUEUED_PGET if num % 2 else QUEUED_MIRROR).format(num=num))
+    for i in range(2, num_jobs + 2):
+        if i % 5 == 0:
+            lines.append(PGET_JOB.format(id=i))
+            continue
+        lines.append(MIRROR_JOB.format(id=i))
+        for num in range(num_transfers):
+            lines.append(MIRROR_TRANSFER.format(id=i, num=num))
+            lines.append(MIRROR_CHMOD.format(id=i, num=num))
+    return "\n".join(lines)
+
+
+def time_it(func: Callable, min_time: float = 1.0) -> float:
+    gc.collect()
+    count = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lftp status parser benchmark")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of running jobs")
+    parser.add_argument("--transfers", type=int, default=10, help="Number of transfers per mirror job")
+    parser.add_argument("--queued", type=int, default=50, help="Number of queued commands")
+    args = parser.parse_args()
+
+    job_status_parser = LftpJobStatusParser()
+    print("{:>6} {:>8} {:>10} {:>10}".format("jobs", "lines", "parse ms", "us/line"))
+    for num_jobs in ([args.jobs] if args.jobs else [1, 10, 50, 200]):
+        output = build_output(num_jobs, args.transfers, args.queued)
+        num_lines = output.count("\n") + 1
+        statuses = job_status_parser.parse(output)
+        assert len(statuses) == num_jobs + args.queued
+        elapsed = time_it(lambda: job_status_parser.parse(output))
+        print("{:>6} {:>8} {:>10.2f} {:>10.2f}".format(
+            num_jobs, num_lines, elapsed * 1000, elapsed * 1e6 / num_lines
+        ))
+
+
+if __name__ == "__main__":
+    main()
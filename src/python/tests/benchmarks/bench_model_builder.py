@@ -0,0 +1,77 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+"""
+Measures the time of a full ModelBuilder.build_model on a synthetic tree
+
+Usage (from src/python):
+    python -m tests.benchmarks.bench_model_builder [--entries N]
+"""
+
+import argparse
+import gc
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from system import SystemFile
+from controller.model_builder import ModelBuilder
+
+
+def build_tree(num_entries: int, size_divisor: int = 1) -> List[SystemFile]:
+    """
+    Builds roots of 10 directories with 50 files each
+    :param num_entries:
+    :param size_divisor: divides file sizes, to make partially downloaded local trees
+    :return:
+    """
+    base = datetime(2018, 11, 9, 21, 40, 18)
+    roots = []
+    count = 0
+    r = 0
+    while count < num_entries:
+        ts = base + timedelta(seconds=r)
+        root = SystemFile("root{}".format(r), 0, True, ts, ts)
+        count += 1
+        for d in range(10):
+            sub_dir = SystemFile("dir{}".format(d), 0, True, ts, ts)
+            root.add_child(sub_dir)
+            count += 1
+            for f in range(50):
+                sub_dir.add_child(SystemFile("file{}.mkv".format(f), (734003200 + f) // size_divisor, False, ts, ts))
+                count += 1
+        roots.append(root)
+        r += 1
+    return roots
+
+
+def time_it(func: Callable, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model build benchmark")
+    parser.add_argument("--entries", type=int, default=500000)
+    args = parser.parse_args()
+
+    remote_files = build_tree(args.entries)
+    local_files = build_tree(args.entries, size_divisor=2)
+
+    def build():
+        builder = ModelBuilder()
+        builder.set_remote_files(remote_files)
+        builder.set_local_files(local_files)
+        return builder.build_model()
+
+    print("Entries: {}".format(args.entries))
+    print("Full build: {:.2f} s".format(time_it(build)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+"""
+Compares the scan wire format, with and without compression, against pickle
+on a synthetic tree
+
+Usage (from src/python):
+    python -m tests.benchmarks.bench_scan_codec [--entries N]
+"""
+
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from system import SystemFile, ScanCodec
+
+
+def build_tree(num_entries: int) -> List[SystemFile]:
+    """
+    Builds roots of 10 directories with 50 files each, typical of season packs
+    File names repeat across directories like they do in real libraries
+    """
+    base = datetime(2018, 11, 9, 21, 40, 18)
+    roots = []
+    count = 0
+    r = 0
+    while count < num_entries:
+        ts = base + timedelta(seconds=r * 37, microseconds=r)
+        root = SystemFile("Show.Name.S{:02d}.1080p.WEB-DL-GROUP{}".format(r % 30, r), 0, True, ts, ts)
+        count += 1
+        for d in range(10):
+            sub_dir = SystemFile("Disc {}".format(d), 0, True, ts, ts)
+            root.add_child(sub_dir)
+            count += 1
+            for f in range(50):
+                # Files are written one after another, so timestamps are distinct but close
+                created = ts + timedelta(seconds=d * 50 + f, microseconds=f * 7919)
+                modified = created + timedelta(seconds=f * 3, microseconds=f * 104729)
+                sub_dir.add_child(SystemFile("Episode.{:02d}.mkv".format(f), 734003200 + f * 4099, False,
+                                             created, modified))
+                count += 1
+        roots.append(root)
+        r += 1
+    return roots
+
+
+def time_it(func: Callable, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func: Callable) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan wire format benchmark")
+    parser.add_argument("--entries", type=int, default=500000)
+    args = parser.parse_args()
+
+    files = build_tree(args.entries)
+    # scan_fs computes the root hashes for deltas either way
+    for f in files:
+        _ = f.content_hash
+
+    pickled = pickle.dumps(files)
+    encoded = ScanCodec.encode(files)
+    assert ScanCodec.decode(encoded) == files
+    compressed = {c: ScanCodec.encode(files, compression=c) for c in ScanCodec.COMPRESSIONS}
+
+    print("Entries: {}".format(args.entries))
+    print("{:<8} {:>10} {:>10} {:>10} {:>12}".format("format", "size KiB", "encode s", "decode s", "decode peak"))
+    for name, data, encode, decode in (
+        ("pickle", pickled, lambda: pickle.dumps(files), lambda: pickle.loads(pickled)),
+        ("codec", encoded, lambda: ScanCodec.encode(files), lambda: ScanCodec.decode(encoded)),
+    ) + tuple(
+        (c, compressed[c],
+         lambda c=c: ScanCodec.encode(files, compression=c),
+         lambda c=c: ScanCodec.decode(compressed[c]))
+        for c in ScanCodec.COMPRESSIONS
+    ):
+        print("{:<8} {:>10.0f} {:>10.2f} {:>10.2f} {:>8.1f} MiB".format(
+            name,
+            len(data) / 1024,
+            time_it(encode),
+            time_it(decode),
+            peak_memory(decode) / (1024 * 1024)
+        ))
+
+
+if __name__ == "__main__":
+    main()
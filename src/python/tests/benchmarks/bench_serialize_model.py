@@ -0,0 +1,120 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+"""
+Measures serialization of the model for the web stream on synthetic trees
+
+Usage (from src/python):
+    python -m tests.benchmarks.bench_serialize_model [--nodes N ...]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, List
+
+from model import ModelFile
+from web.serialize import SerializeModel
+
+
+def build_tree(num_nodes: int) -> List[ModelFile]:
+    """
+    Builds roots of 10 directories with 50 files each, typical of season packs
+    """
+    base = datetime(2018, 11, 9, 21, 40, 18)
+    roots = []
+    count = 0
+    r = 0
+    while count < num_nodes:
+        ts = base + timedelta(seconds=r * 37, microseconds=r)
+        root = ModelFile("Show.Name.S{:02d}.1080p.WEB-DL-GROUP{}".format(r % 30, r), True)
+        root.remote_size = 10 * 50 * 734003200
+        root.local_size = r * 4099
+        root.state = ModelFile.State.DOWNLOADING if r % 10 == 0 else ModelFile.State.DEFAULT
+        root.downloading_speed = 1234567 if r % 10 == 0 else None
+        root.eta = 3600 if r % 10 == 0 else None
+        root.is_extractable = True
+        root.remote_created_timestamp = ts
+        root.remote_modified_timestamp = ts
+        root.local_created_timestamp = ts
+        root.local_modified_timestamp = ts
+        count += 1
+        for d in range(10):
+            sub_dir = ModelFile("Disc {}".format(d), True)
+            sub_dir.remote_size = 50 * 734003200
+            sub_dir.remote_created_timestamp = ts
+            sub_dir.remote_modified_timestamp = ts
+            root.add_child(sub_dir)
+            count += 1
+            for f in range(50):
+                created = ts + timedelta(seconds=d * 50 + f, microseconds=f * 7919)
+                file = ModelFile("Episode.{:02d}.mkv".format(f), False)
+                file.remote_size = 734003200 + f * 4099
+                file.local_size = f * 4099 if f % 2 else None
+                file.remote_created_timestamp = created
+                file.remote_modified_timestamp = created + timedelta(seconds=f * 3)
+                sub_dir.add_child(file)
+                count += 1
+        root.freeze()
+        roots.append(root)
+        r += 1
+    return roots
+
+
+def time_it(func: Callable, repeat: int = 3) -> float:
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func: Callable) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak
+
+
+def consume(chunks: Iterator[bytes]) -> int:
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model serialization benchmark")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args()
+
+    serialize = SerializeModel()
+    print("{:>8} {:>10} {:>10} {:>10} {:>12} {:>12} {:>12}".format(
+        "nodes", "size MiB", "init s", "update ms", "init peak", "chunks s", "chunks peak"
+    ))
+    for num_nodes in args.nodes:
+        files = build_tree(num_nodes)
+        update = SerializeModel.UpdateEvent(SerializeModel.UpdateEvent.Change.UPDATED, files[0], files[0])
+        out = serialize.model(files)
+        print("{:>8} {:>10.1f} {:>10.3f} {:>10.2f} {:>8.1f} MiB {:>12.3f} {:>8.1f} MiB".format(
+            num_nodes,
+            len(out) / (1024 * 1024),
+            time_it(lambda: serialize.model(files)),
+            time_it(lambda: serialize.update_event(update), repeat=10) * 1000,
+            peak_memory(lambda: serialize.model(files)) / (1024 * 1024),
+            time_it(lambda: consume(serialize.model_chunks(files))),
+            peak_memory(lambda: consume(serialize.model_chunks(files))) / (1024 * 1024)
+        ))
+        del out
+        del files
+
+
+if __name__ == "__main__":
+    main()
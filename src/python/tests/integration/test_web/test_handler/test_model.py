@@ -0,0 +1,84 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import json
+from urllib.parse import quote
+
+from tests.integration.test_web.test_web_app import BaseTestWebApp
+from model import ModelFile
+
+
+class TestModelHandler(BaseTestWebApp):
+    def setUp(self):
+        super().setUp()
+        a = ModelFile("a", True)
+        a.local_size = 300
+        aa = ModelFile("aa", True)
+        aa.local_size = 300
+        for i in range(3):
+            aaa = ModelFile("aa{}".format(i), False)
+            aaa.local_size = 100
+            aa.add_child(aaa)
+        a.add_child(aa)
+        b = ModelFile("b c", False)
+        files = {"a": a, "b c": b}
+        self.controller.get_model_file.side_effect = lambda name: files.get(name)
+
+    def get_file(self, full_path: str, query: str = "", status: int = 200):
+        # Paths are double encoded by the client
+        url = "/server/model/file/" + quote(quote(full_path, safe=""), safe="")
+        if query:
+            url += "?" + query
+        return self.test_app.get(url, status=status)
+
+    def test_get_root(self):
+        resp = self.get_file("a")
+        self.assertEqual(200, resp.status_int)
+        json_dict = json.loads(str(resp.html))
+        self.assertEqual("a", json_dict["name"])
+        self.assertEqual(300, json_dict["local_size"])
+        self.assertEqual(1, json_dict["children_count"])
+        self.assertEqual(0, json_dict["children_offset"])
+        self.assertEqual(1, len(json_dict["children"]))
+        child = json_dict["children"][0]
+        self.assertEqual("aa", child["name"])
+        self.assertEqual("a/aa", child["full_path"])
+        self.assertEqual(3, child["children_count"])
+        # Only summaries of the children
+        self.assertNotIn("children", child)
+
+    def test_get_nested_file(self):
+        resp = self.get_file("a/aa")
+        json_dict = json.loads(str(resp.html))
+        self.assertEqual("aa", json_dict["name"])
+        self.assertEqual(["aa0", "aa1", "aa2"], [c["name"] for c in json_dict["children"]])
+
+        resp = self.get_file("a/aa/aa1")
+        json_dict = json.loads(str(resp.html))
+        self.assertEqual("a/aa/aa1", json_dict["full_path"])
+        self.assertEqual(0, json_dict["children_count"])
+        self.assertEqual([], json_dict["children"])
+
+    def test_get_file_with_special_characters(self):
+        resp = self.get_file("b c")
+        json_dict = json.loads(str(resp.html))
+        self.assertEqual("b c", json_dict["name"])
+
+    def test_get_page_of_children(self):
+        resp = self.get_file("a/aa", "offset=1&limit=1")
+        json_dict = json.loads(str(resp.html))
+        self.assertEqual(3, json_dict["children_count"])
+        self.assertEqual(1, json_dict["children_offset"])
+        self.assertEqual(["aa1"], [c["name"] for c in json_dict["children"]])
+
+        resp = self.get_file("a/aa", "offset=2&limit=10")
+        json_dict = json.loads(str(resp.html))
+        self.assertEqual(["aa2"], [c["name"] for c in json_dict["children"]])
+
+    def test_get_missing_file(self):
+        self.get_file("x", status=404)
+        self.get_file("a/x", status=404)
+        self.get_file("a/aa/aa1/x", status=404)
+
+    def test_get_invalid_page(self):
+        self.get_file("a", "offset=x", status=400)
+        self.get_file("a", "limit=-1", status=400)
@@ -1,6 +1,7 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import unittest
+import json
 from unittest.mock import MagicMock, patch
 from threading import Timer
 
@@ -31,13 +32,13 @@ class TestModelStreamHandler(BaseTestWebApp):
 
         # Setup mock serialize instance
         mock_serialize = mock_serialize_model_cls.return_value
-        mock_serialize.model.return_value = "\n"
+        mock_serialize.model_chunks.return_value = iter([b"\n"])
 
         # Initial model
         self.model_files = [ModelFile("a", True), ModelFile("b", False)]
 
         self.test_app.get("/server/stream")
-        mock_serialize.model.assert_called_once_with([ModelFile("a", True), ModelFile("b", False)])
+        mock_serialize.model_chunks.assert_called_once_with([ModelFile("a", True), ModelFile("b", False)], False)
 
     @patch("web.handler.stream_model.SerializeModel")
     def test_stream_model_serializes_updates(self, mock_serialize_model_cls):
@@ -46,7 +47,7 @@ class TestModelStreamHandler(BaseTestWebApp):
 
         # Setup mock serialize instance
         mock_serialize = mock_serialize_model_cls.return_value
-        mock_serialize.model.return_value = "\n"
+        mock_serialize.model_chunks.return_value = iter([b"\n"])
         mock_serialize.update_event.return_value = "\n"
         # Use the real UpdateEvent class
         mock_serialize_model_cls.UpdateEvent = SerializeModel.UpdateEvent
@@ -78,3 +79,71 @@ class TestModelStreamHandler(BaseTestWebApp):
         self.assertEqual(SerializeModel.UpdateEvent.Change.UPDATED, call3[0][0].change)
         self.assertEqual(old_file, call3[0][0].old_file)
         self.assertEqual(new_file, call3[0][0].new_file)
+
+    def test_stream_model_sends_patches_when_requested(self):
+        # Schedule server stop
+        Timer(1.0, self.web_app.stop).start()
+
+        old_file = ModelFile("c", False)
+        old_file.local_size = 100
+        self.model_files = [old_file]
+        new_file = ModelFile("c", False)
+        new_file.local_size = 200
+
+        def send_updates():
+            self.model_listener.file_updated(old_file, new_file)
+        Timer(0.5, send_updates).start()
+
+        resp = self.test_app.get("/server/stream?model_patch=1")
+        self.assertIn("event: model-patch\n", resp.text)
+        self.assertNotIn("event: model-updated\n", resp.text)
+
+    def test_stream_model_sends_updates_by_default(self):
+        # Schedule server stop
+        Timer(1.0, self.web_app.stop).start()
+
+        old_file = ModelFile("c", False)
+        old_file.local_size = 100
+        self.model_files = [old_file]
+        new_file = ModelFile("c", False)
+        new_file.local_size = 200
+
+        def send_updates():
+            self.model_listener.file_updated(old_file, new_file)
+        Timer(0.5, send_updates).start()
+
+        resp = self.test_app.get("/server/stream")
+        self.assertIn("event: model-updated\n", resp.text)
+        self.assertNotIn("event: model-patch\n", resp.text)
+
+    def test_stream_model_sends_summaries_when_requested(self):
+        # Schedule server stop
+        Timer(0.5, self.web_app.stop).start()
+
+        a = ModelFile("a", True)
+        a.add_child(ModelFile("aa", False))
+        a.add_child(ModelFile("ab", False))
+        self.model_files = [a]
+
+        resp = self.test_app.get("/server/stream?model_summary=1")
+        init = next(line for line in resp.text.split("\n\n") if line.startswith("event: model-init"))
+        data = json.loads(init.split("data: ", maxsplit=1)[1])
+        self.assertEqual("a", data[0]["name"])
+        self.assertEqual(2, data[0]["children_count"])
+        self.assertNotIn("children", data[0])
+
+    def test_stream_model_sends_large_model_in_chunks(self):
+        # Schedule server stop
+        Timer(1.0, self.web_app.stop).start()
+
+        for i in range(100):
+            a = ModelFile("a{}".format(i), True)
+            for j in range(100):
+                a.add_child(ModelFile("aa{}".format(j), False))
+            self.model_files.append(a)
+
+        resp = self.test_app.get("/server/stream")
+        init = next(line for line in resp.text.split("\n\n") if line.startswith("event: model-init"))
+        data = json.loads(init.split("data: ", maxsplit=1)[1])
+        self.assertEqual(["a{}".format(i) for i in range(100)], [f["name"] for f in data])
+        self.assertEqual("a99/aa99", data[99]["children"][99]["full_path"])
@@ -28,11 +28,15 @@ class TestStatusStreamHandler(BaseTestWebApp):
         # Schedule server stop
         Timer(0.5, self.web_app.stop).start()
 
-        # Schedule status update
-        def update_status():
+        # Schedule status updates
+        # Statuses that aren't sent yet are replaced by newer ones, so space them out
+        def update_status_up():
             self.context.status.server.up = False
+
+        def update_status_error_msg():
             self.context.status.server.error_msg = "Something bad happened"
-        Timer(0.3, update_status).start()
+        Timer(0.2, update_status_up).start()
+        Timer(0.35, update_status_error_msg).start()
 
         # Setup mock serialize instance
         mock_serialize = mock_serialize_status_cls.return_value
@@ -1,15 +1,19 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import logging
 import sys
+import time
+from threading import Timer
 
+import timeout_decorator
 from webtest import TestApp
 
 from common import overrides, Status, Config
 from controller import AutoQueuePersist
 from web import WebAppBuilder
+from web.utils import StreamOverflowError
 
 
 class BaseTestWebApp(unittest.TestCase):
@@ -63,3 +67,52 @@ class BaseTestWebApp(unittest.TestCase):
 class TestWebApp(BaseTestWebApp):
     def test_process(self):
         self.web_app.process()
+
+    @patch("web.web_app.WebApp._STREAM_HEARTBEAT_INTERVAL_IN_MS", 100)
+    def test_stream_sends_heartbeats_when_idle(self):
+        # Schedule server stop
+        Timer(0.5, self.web_app.stop).start()
+
+        resp = self.test_app.get("/server/stream")
+        self.assertIn(": heartbeat\n\n", resp.text)
+
+    def test_stop_wakes_up_idle_streams(self):
+        # Schedule server stop
+        Timer(0.2, self.web_app.stop).start()
+
+        start = time.time()
+        self.test_app.get("/server/stream")
+        self.assertLess(time.time() - start, 2.0)
+
+    def test_process_publishes_stream_queue_metrics(self):
+        # Schedule server stop
+        Timer(0.5, self.web_app.stop).start()
+
+        stream_queues = []
+
+        def process():
+            self.web_app.process()
+            stream_queues.append(self.context.status.web.stream_queues)
+        Timer(0.2, process).start()
+
+        self.test_app.get("/server/stream")
+        self.assertEqual(1, len(stream_queues))
+        self.assertEqual(["status", "log", "model"], [name for name, _ in stream_queues[0]])
+        for _, metrics in stream_queues[0]:
+            self.assertEqual(0, metrics.drops)
+
+    @patch("web.web_app.WebApp._STREAM_METRICS_INTERVAL_IN_MS", 0)
+    def test_process_removes_metrics_of_closed_streams(self):
+        Timer(0.2, self.web_app.stop).start()
+        self.test_app.get("/server/stream")
+        self.context.status.web.stream_queues = (("stale", None),)
+        self.web_app.process()
+        self.assertEqual((), self.context.status.web.stream_queues)
+
+    @timeout_decorator.timeout(5)
+    @patch("web.handler.stream_status.StatusListener.get_next_event")
+    def test_stream_disconnects_on_overflow(self, mock_get_next_event):
+        mock_get_next_event.side_effect = StreamOverflowError()
+        # Stream ends without being stopped
+        resp = self.test_app.get("/server/stream")
+        self.assertIn("event: status\n", resp.text)
@@ -46,3 +46,32 @@ class TestJob(unittest.TestCase):
         job.terminate()
         job.join()
         self.assertTrue(job.cleanup_run)
+
+    def test_custom_sleep(self):
+        class DummySleepingJob(Job):
+            def __init__(self, *args):
+                super().__init__(*args)
+                self.sleep_count = 0
+
+            def setup(self):
+                pass
+
+            def execute(self):
+                pass
+
+            def cleanup(self):
+                pass
+
+            def sleep(self):
+                self.sleep_count += 1
+                time.sleep(0.01)
+
+        context = MagicMock()
+        # noinspection PyTypeChecker
+        job = DummySleepingJob("DummySleepingJob", context)
+        job.start()
+        time.sleep(0.2)
+        job.terminate()
+        job.join()
+        # Default sleep would only have run a couple of times
+        self.assertGreater(job.sleep_count, 5)
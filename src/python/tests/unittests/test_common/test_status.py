@@ -133,6 +133,9 @@ class TestStatus(unittest.TestCase):
         self.assertEqual(None, status.server.error_msg)
         self.assertEqual(None, status.controller.latest_local_scan_time)
         self.assertEqual(None, status.controller.latest_remote_scan_time)
+        self.assertEqual(None, status.controller.local_scan_interval_ms)
+        self.assertEqual(None, status.controller.remote_scan_interval_ms)
+        self.assertEqual((), status.web.stream_queues)
 
     def test_components_registered(self):
         # Test that all components were registered
@@ -153,6 +156,10 @@ class TestStatus(unittest.TestCase):
         self.assertEqual(time1, copy.controller.latest_local_scan_time)
         self.assertEqual(time2, copy.controller.latest_remote_scan_time)
 
+        status.web.stream_queues = (("log", None),)
+        copy = status.copy()
+        self.assertEqual((("log", None),), copy.web.stream_queues)
+
     def test_copy_values(self):
         status = Status()
         status.server.up = False
@@ -278,3 +278,44 @@ class TestExtractProcess(unittest.TestCase):
         self.process.extract(c)
         while self.extract_counter.value < 3:
             pass
+
+    @timeout_decorator.timeout(10)
+    def test_sets_wake_event_on_status_change(self):
+        # Use this as a signal to mock to control which status to send
+        self.status_signal = multiprocessing.Value('i', 0)
+
+        s_a = ExtractStatus(name="a", is_dir=True, state=ExtractStatus.State.EXTRACTING)
+
+        def _status():
+            return [s_a] if self.status_signal.value == 1 else []
+        self.mock_dispatch.status.side_effect = _status
+
+        wake_event = multiprocessing.Event()
+        self.process = ExtractProcess(out_dir_path="", local_path="", wake_event=wake_event)
+        self.process.start()
+
+        # Unchanged statuses don't wake
+        time.sleep(0.5)
+        wake_event.clear()
+        time.sleep(0.5)
+        self.assertFalse(wake_event.is_set())
+
+        self.status_signal.value = 1
+        self.assertTrue(wake_event.wait(timeout=5))
+        while self.process.pop_latest_statuses() is None:
+            pass
+
+    @timeout_decorator.timeout(10)
+    def test_sets_wake_event_on_completion(self):
+        # Dispatch runs in the child process, so complete an extraction from there
+        self.mock_dispatch.add_listener.side_effect = \
+            lambda listener: listener.extract_completed(name="a", is_dir=True)
+
+        wake_event = multiprocessing.Event()
+        self.process = ExtractProcess(out_dir_path="", local_path="", wake_event=wake_event)
+        self.process.start()
+        self.assertTrue(wake_event.wait(timeout=5))
+        completed = []
+        while not completed:
+            completed = self.process.pop_completed()
+        self.assertEqual("a", completed[0].name)
@@ -1453,3 +1453,81 @@ class TestModelBuilder(unittest.TestCase):
         # Invalidate on different
         self.model_builder.set_extracted_files({"a", "c"})
         self.assertTrue(self.model_builder.has_changes())
+
+    def test_rebuild_reuses_unchanged_files(self):
+        self.model_builder.set_remote_files([
+            SystemFile("a", 10),
+            SystemFile("b", 20),
+            SystemFile("c", 30)
+        ])
+        self.model_builder.set_local_files([
+            SystemFile("a", 5),
+            SystemFile("b", 5)
+        ])
+        model1 = self.model_builder.build_model()
+        self.assertIsNone(self.model_builder.get_rebuilt_file_names())
+
+        # Only b changes
+        self.model_builder.set_local_files([
+            SystemFile("a", 5),
+            SystemFile("b", 20)
+        ])
+        model2 = self.model_builder.build_model()
+        self.assertEqual({"b"}, self.model_builder.get_rebuilt_file_names())
+        self.assertIs(model1.get_file("a"), model2.get_file("a"))
+        self.assertIs(model1.get_file("c"), model2.get_file("c"))
+        self.assertIsNot(model1.get_file("b"), model2.get_file("b"))
+        self.assertEqual(20, model2.get_file("b").local_size)
+        self.assertEqual(ModelFile.State.DOWNLOADED, model2.get_file("b").state)
+
+        # Lftp status on c only
+        self.model_builder.set_lftp_statuses([
+            LftpJobStatus(0, LftpJobStatus.Type.PGET, LftpJobStatus.State.QUEUED, "c", "")
+        ])
+        model3 = self.model_builder.build_model()
+        self.assertEqual({"c"}, self.model_builder.get_rebuilt_file_names())
+        self.assertIs(model2.get_file("a"), model3.get_file("a"))
+        self.assertIs(model2.get_file("b"), model3.get_file("b"))
+        self.assertEqual(ModelFile.State.QUEUED, model3.get_file("c").state)
+
+        # Removing a file
+        self.model_builder.set_remote_files([
+            SystemFile("b", 20),
+            SystemFile("c", 30)
+        ])
+        self.model_builder.set_local_files([
+            SystemFile("b", 20)
+        ])
+        model4 = self.model_builder.build_model()
+        self.assertEqual({"b", "c"}, model4.get_file_names())
+        self.assertIs(model3.get_file("b"), model4.get_file("b"))
+
+        # Clear rebuilds everything
+        self.model_builder.clear()
+        self.model_builder.set_remote_files([SystemFile("b", 20)])
+        self.model_builder.build_model()
+        self.assertIsNone(self.model_builder.get_rebuilt_file_names())
+
+    def test_rebuild_on_downloaded_files_modified_in_place(self):
+        downloaded_files = {"a"}
+        self.model_builder.set_remote_files([SystemFile("a", 10), SystemFile("b", 10)])
+        self.model_builder.set_downloaded_files(downloaded_files)
+        model = self.model_builder.build_model()
+        self.assertEqual(ModelFile.State.DELETED, model.get_file("a").state)
+        self.assertEqual(ModelFile.State.DEFAULT, model.get_file("b").state)
+
+        # Callers add to the same set
+        downloaded_files.add("b")
+        self.model_builder.set_downloaded_files(downloaded_files)
+        self.assertTrue(self.model_builder.has_changes())
+        model = self.model_builder.build_model()
+        self.assertEqual({"b"}, self.model_builder.get_rebuilt_file_names())
+        self.assertEqual(ModelFile.State.DELETED, model.get_file("b").state)
+
+    def test_build_freezes_files(self):
+        r_a = SystemFile("a", 10, True)
+        r_a.add_child(SystemFile("aa", 10, False))
+        self.model_builder.set_remote_files([r_a])
+        model = self.model_builder.build_model()
+        self.assertTrue(model.get_file("a").is_frozen)
+        self.assertTrue(model.get_file("a").get_children()[0].is_frozen)
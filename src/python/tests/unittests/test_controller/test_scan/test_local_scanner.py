@@ -0,0 +1,219 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from controller.scan import LocalScanner, ScannerError
+from system import SystemScanner, Inotify, InotifyError
+
+
+def my_mkdir(*args):
+    os.mkdir(os.path.join(TestLocalScanner.temp_dir, *args))
+
+
+def my_touch(size, *args):
+    path = os.path.join(TestLocalScanner.temp_dir, *args)
+    with open(path, 'wb') as f:
+        f.write(bytearray([0xff] * size))
+
+
+@unittest.skipUnless(Inotify.is_supported(), "requires inotify")
+class TestLocalScanner(unittest.TestCase):
+    temp_dir = None
+
+    def setUp(self):
+        TestLocalScanner.temp_dir = tempfile.mkdtemp(prefix="test_local_scanner")
+        # a [dir]
+        #   aa [file, 10 bytes]
+        #   ab [dir]
+        #     aba [file, 20 bytes]
+        # b [file, 30 bytes]
+        my_mkdir("a")
+        my_touch(10, "a", "aa")
+        my_mkdir("a", "ab")
+        my_touch(20, "a", "ab", "aba")
+        my_touch(30, "b")
+
+    def tearDown(self):
+        shutil.rmtree(TestLocalScanner.temp_dir)
+
+    def assert_matches_full_scan(self, files):
+        scanner = SystemScanner(TestLocalScanner.temp_dir)
+        scanner.set_lftp_temp_suffix(".lftp")
+        self.assertEqual(scanner.scan(), files)
+
+    def test_initial_scan(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        files = scanner.scan()
+        self.assertEqual(["a", "b"], [f.name for f in files])
+        self.assert_matches_full_scan(files)
+
+    def test_only_rescans_changed_roots(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        scanner.scan()
+
+        with patch.object(SystemScanner, "scan", side_effect=AssertionError("full scan")):
+            # No changes
+            self.assertIsNone(scanner.scan())
+
+            # New root file
+            my_touch(40, "c")
+            files = scanner.scan()
+            self.assertEqual(["a", "b", "c"], [f.name for f in files])
+            self.assertEqual(40, files[2].size)
+
+            # Change deep in a directory
+            my_touch(5, "a", "ab", "abb")
+            files = scanner.scan()
+            self.assertEqual(10 + 20 + 5, files[0].size)
+
+            # New directory, and then a change inside it
+            my_mkdir("a", "ac")
+            scanner.scan()
+            my_touch(7, "a", "ac", "aca")
+            files = scanner.scan()
+            self.assertEqual(10 + 20 + 5 + 7, files[0].size)
+
+            # Renamed root
+            os.rename(os.path.join(TestLocalScanner.temp_dir, "b"),
+                      os.path.join(TestLocalScanner.temp_dir, "d"))
+            files = scanner.scan()
+            self.assertEqual(["a", "c", "d"], [f.name for f in files])
+
+            # Deleted directory
+            shutil.rmtree(os.path.join(TestLocalScanner.temp_dir, "a", "ab"))
+            files = scanner.scan()
+            self.assertEqual(10 + 7, files[0].size)
+
+            # Deleted root
+            shutil.rmtree(os.path.join(TestLocalScanner.temp_dir, "a"))
+            files = scanner.scan()
+            self.assertEqual(["c", "d"], [f.name for f in files])
+
+        self.assert_matches_full_scan(files)
+
+    def test_returns_none_without_changes(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        self.assertIsNotNone(scanner.scan())
+        self.assertIsNone(scanner.scan())
+        # Events that don't change the scan are not reported either
+        path_b = os.path.join(TestLocalScanner.temp_dir, "b")
+        os.utime(path_b, ns=(os.stat(path_b).st_atime_ns, os.stat(path_b).st_mtime_ns))
+        self.assertIsNone(scanner.scan())
+        my_touch(40, "c")
+        self.assertEqual(["a", "b", "c"], [f.name for f in scanner.scan()])
+        self.assertIsNone(scanner.scan())
+
+    def test_moved_directory_is_still_watched(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        scanner.scan()
+        os.rename(os.path.join(TestLocalScanner.temp_dir, "a"),
+                  os.path.join(TestLocalScanner.temp_dir, "e"))
+        scanner.scan()
+        my_touch(3, "e", "ab", "abc")
+        files = scanner.scan()
+        self.assertEqual(["b", "e"], [f.name for f in files])
+        self.assertEqual(10 + 20 + 3, files[1].size)
+        self.assert_matches_full_scan(files)
+
+    def test_detects_files_growing_in_place(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        scanner.scan()
+        with patch.object(SystemScanner, "scan", side_effect=AssertionError("full scan")):
+            # Files are kept open so that only writes are reported
+            with open(os.path.join(TestLocalScanner.temp_dir, "b"), "ab") as b_file, \
+                    open(os.path.join(TestLocalScanner.temp_dir, "a", "ab", "aba"), "ab") as aba_file:
+                b_file.write(bytearray([0xff] * 5))
+                b_file.flush()
+                aba_file.write(bytearray([0xff] * 7))
+                aba_file.flush()
+                files = scanner.scan()
+                self.assertEqual(10 + 20 + 7, files[0].size)
+                self.assertEqual(30 + 5, files[1].size)
+        self.assert_matches_full_scan(files)
+
+    def test_debounces_writes_per_directory(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        with patch("controller.scan.local_scanner.time") as mock_time, \
+                open(os.path.join(TestLocalScanner.temp_dir, "b"), "ab") as b_file:
+            mock_time.time.return_value = 1000.0
+            scanner.scan()
+            b_file.write(bytearray([0xff] * 5))
+            b_file.flush()
+            self.assertEqual(30 + 5, scanner.scan()[1].size)
+
+            # Writes within the debounce interval wait for it to pass
+            b_file.write(bytearray([0xff] * 5))
+            b_file.flush()
+            mock_time.time.return_value = 1000.0 + 4
+            self.assertIsNone(scanner.scan())
+            mock_time.time.return_value = 1000.0 + 5
+            self.assertEqual(30 + 10, scanner.scan()[1].size)
+
+            # Other changes are not held back
+            my_touch(40, "c")
+            b_file.write(bytearray([0xff] * 5))
+            b_file.flush()
+            files = scanner.scan()
+            self.assertEqual(["a", "b", "c"], [f.name for f in files])
+            self.assertEqual(30 + 10, files[1].size)
+
+    def test_temp_and_status_files_map_to_root(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=True, use_inotify=True)
+        scanner.scan()
+        my_touch(100, "c.lftp")
+        files = scanner.scan()
+        self.assertEqual(["a", "b", "c"], [f.name for f in files])
+        with open(os.path.join(TestLocalScanner.temp_dir, "c.lftp.lftp-pget-status"), "w") as f:
+            f.write("size=100\n0.pos=40\n0.limit=100\n")
+        files = scanner.scan()
+        self.assertEqual(40, files[2].size)
+        os.rename(os.path.join(TestLocalScanner.temp_dir, "c.lftp"),
+                  os.path.join(TestLocalScanner.temp_dir, "c"))
+        os.remove(os.path.join(TestLocalScanner.temp_dir, "c.lftp.lftp-pget-status"))
+        files = scanner.scan()
+        self.assertEqual(100, files[2].size)
+        self.assert_matches_full_scan(files)
+
+    def test_falls_back_to_full_scans_on_watch_limit(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        with patch.object(Inotify, "add_watch", side_effect=InotifyError("limit", errno.ENOSPC)):
+            files = scanner.scan()
+        self.assertEqual(["a", "b"], [f.name for f in files])
+        # Subsequent scans are full scans
+        my_touch(40, "c")
+        with patch.object(SystemScanner, "scan", wraps=lambda: []) as mock_scan:
+            scanner.scan()
+            mock_scan.assert_called_once_with()
+
+    def test_event_driven_until_fallback(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        self.assertTrue(scanner.is_event_driven())
+        with patch.object(Inotify, "add_watch", side_effect=InotifyError("limit", errno.ENOSPC)):
+            scanner.scan()
+        self.assertFalse(scanner.is_event_driven())
+        self.assertFalse(LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False).is_event_driven())
+
+    def test_error_on_missing_path(self):
+        scanner = LocalScanner(os.path.join(TestLocalScanner.temp_dir, "nope"),
+                               use_temp_file=False, use_inotify=True)
+        with self.assertRaises(ScannerError) as ctx:
+            scanner.scan()
+        self.assertFalse(ctx.exception.recoverable)
+
+    def test_periodic_full_scan(self):
+        scanner = LocalScanner(TestLocalScanner.temp_dir, use_temp_file=False, use_inotify=True)
+        with patch("controller.scan.local_scanner.time") as mock_time:
+            mock_time.time.return_value = 1000.0
+            scanner.scan()
+            with patch.object(SystemScanner, "scan", return_value=[]) as mock_scan:
+                mock_time.time.return_value = 1000.0 + 299
+                scanner.scan()
+                mock_scan.assert_not_called()
+                mock_time.time.return_value = 1000.0 + 300
+                self.assertEqual([], scanner.scan())
+                mock_scan.assert_called_once_with()
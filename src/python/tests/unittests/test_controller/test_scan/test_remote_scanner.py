@@ -6,12 +6,13 @@ import sys
 from unittest.mock import patch, call, ANY
 import tempfile
 import os
-import pickle
 import shutil
+import re
 
 from controller.scan import RemoteScanner, ScannerError
 from ssh import SshcpError
 from common import Localization
+from system import SystemFile, SystemScanDelta, ScanCodec
 
 
 class TestRemoteScanner(unittest.TestCase):
@@ -34,6 +35,12 @@ class TestRemoteScanner(unittest.TestCase):
         # Ssh to return mangled binary by default
         self.mock_ssh.shell.return_value = b'error'
 
+        # Streamed commands are served by the shell mock so that tests can
+        # count and inspect all commands in one place
+        def shell_stream(command, consumer):
+            consumer(memoryview(self.mock_ssh.shell(command)))
+        self.mock_ssh.shell_stream.side_effect = shell_stream
+
     @classmethod
     def setUpClass(cls):
         TestRemoteScanner.temp_dir = tempfile.mkdtemp(prefix="test_remote_scanner")
@@ -68,6 +75,7 @@ class TestRemoteScanner(unittest.TestCase):
         self.assertEqual(1234, self.ssh_args["port"])
         self.assertEqual("my remote user", self.ssh_args["user"])
         self.assertEqual("my password", self.ssh_args["password"])
+        self.assertTrue(self.ssh_args["use_control_master"])
 
     def test_installs_scan_script_on_first_scan(self):
         scanner = RemoteScanner(
@@ -82,7 +90,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns error for md5sum check, empty pickle dump for later commands
+        # Ssh returns error for md5sum check, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -90,7 +98,7 @@ class TestRemoteScanner(unittest.TestCase):
                 return "".encode()
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()
@@ -117,7 +125,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns error for md5sum check, empty pickle dump for later commands
+        # Ssh returns error for md5sum check, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -125,7 +133,7 @@ class TestRemoteScanner(unittest.TestCase):
                 return "".encode()
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()
@@ -148,7 +156,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns error for md5sum check, empty pickle dump for later commands
+        # Ssh returns error for md5sum check, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -156,7 +164,7 @@ class TestRemoteScanner(unittest.TestCase):
                 return "".encode()
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()
@@ -179,7 +187,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns empty on md5sum, empty pickle dump for later commands
+        # Ssh returns empty on md5sum, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -187,7 +195,7 @@ class TestRemoteScanner(unittest.TestCase):
                 return "d41d8cd98f00b204e9800998ecf8427e".encode()
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()
@@ -211,7 +219,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns error for md5sum check, empty pickle dump for later commands
+        # Ssh returns error for md5sum check, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -219,7 +227,7 @@ class TestRemoteScanner(unittest.TestCase):
                 return "some output from md5sum".encode()
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()
@@ -242,7 +250,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns error for md5sum check, empty pickle dump for later commands
+        # Ssh returns error for md5sum check, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -250,7 +258,7 @@ class TestRemoteScanner(unittest.TestCase):
                 raise SshcpError("an ssh error")
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         with self.assertRaises(ScannerError) as ctx:
@@ -271,7 +279,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         self.ssh_run_command_count = 0
 
-        # Ssh returns error for md5sum check, empty pickle dump for later commands
+        # Ssh returns error for md5sum check, empty scan for later commands
         def ssh_shell(*args):
             self.ssh_run_command_count += 1
             if self.ssh_run_command_count == 1:
@@ -279,15 +287,108 @@ class TestRemoteScanner(unittest.TestCase):
                 return b''
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()
         self.assertEqual(2, self.mock_ssh.shell.call_count)
-        self.mock_ssh.shell.assert_called_with(
-            "'/remote/path/to/scan/script' '/remote/path/to/scan'"
+        self.assertRegex(
+            self.mock_ssh.shell.call_args[0][0],
+            r"^'/remote/path/to/scan/script' '/remote/path/to/scan' "
+            r"--cache '/remote/path/to/scan/script.cache' "
+            r"--delta-state '/remote/path/to/scan/script.state' "
+            r"--generation \w+ --full-rescan$"
+        )
+
+        # Subsequent scans use the cache
+        scanner.scan()
+        self.assertEqual(3, self.mock_ssh.shell.call_count)
+        self.assertRegex(
+            self.mock_ssh.shell.call_args[0][0],
+            r"^'/remote/path/to/scan/script' '/remote/path/to/scan' "
+            r"--cache '/remote/path/to/scan/script.cache' "
+            r"--delta-state '/remote/path/to/scan/script.state' "
+            r"--generation \w+$"
+        )
+
+    def test_compressed_scan(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script",
+            compression=ScanCodec.COMPRESSION_ZLIB
+        )
+        files = [SystemFile("file{}".format(i), i, False) for i in range(10000)]
+
+        self.ssh_run_command_count = 0
+
+        # Ssh returns error for md5sum check, compressed scan for later commands
+        def ssh_shell(*args):
+            self.ssh_run_command_count += 1
+            if self.ssh_run_command_count == 1:
+                # md5sum check
+                return b''
+            else:
+                # later tries
+                return ScanCodec.encode(files, compression=ScanCodec.COMPRESSION_ZLIB)
+        self.mock_ssh.shell.side_effect = ssh_shell
+
+        self.assertEqual(files, scanner.scan())
+        self.assertRegex(
+            self.mock_ssh.shell.call_args[0][0],
+            r"^'/remote/path/to/scan/script' '/remote/path/to/scan' "
+            r"--cache '/remote/path/to/scan/script.cache' "
+            r"--delta-state '/remote/path/to/scan/script.state' "
+            r"--generation \w+ --full-rescan --compress zlib$"
+        )
+
+    def test_raises_error_on_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            RemoteScanner(
+                remote_address="my remote address",
+                remote_username="my remote user",
+                remote_password="my password",
+                remote_port=1234,
+                remote_path_to_scan="/remote/path/to/scan",
+                local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+                remote_path_to_scan_script="/remote/path/to/scan/script",
+                compression="rot13"
+            )
+
+    def test_periodically_does_full_rescan(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
         )
 
+        self.ssh_run_command_count = 0
+
+        # Ssh returns error for md5sum check, empty scan for later commands
+        def ssh_shell(*args):
+            self.ssh_run_command_count += 1
+            if self.ssh_run_command_count == 1:
+                # md5sum check
+                return b''
+            else:
+                # later tries
+                return ScanCodec.encode([])
+        self.mock_ssh.shell.side_effect = ssh_shell
+
+        full_rescans = []
+        for _ in range(42):
+            scanner.scan()
+            full_rescans.append(self.mock_ssh.shell.call_args[0][0].endswith("--full-rescan"))
+        self.assertEqual([0, 21], [i for i, full in enumerate(full_rescans) if full])
+
     def test_raises_nonrecoverable_error_on_first_failed_ssh(self):
         scanner = RemoteScanner(
             remote_address="my remote address",
@@ -313,7 +414,7 @@ class TestRemoteScanner(unittest.TestCase):
                 raise SshcpError("an ssh error")
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         with self.assertRaises(ScannerError) as ctx:
@@ -343,13 +444,13 @@ class TestRemoteScanner(unittest.TestCase):
                 return b''
             elif self.ssh_run_command_count == 2:
                 # first try
-                return pickle.dumps([])
+                return ScanCodec.encode([])
             elif self.ssh_run_command_count == 3:
                 # second try
                 raise SshcpError("an ssh error")
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()  # no error first time
@@ -380,13 +481,13 @@ class TestRemoteScanner(unittest.TestCase):
                 return b''
             elif self.ssh_run_command_count == 2:
                 # first try
-                return pickle.dumps([])
+                return ScanCodec.encode([])
             elif self.ssh_run_command_count == 3:
                 # second try
                 raise SshcpError("an ssh error")
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         scanner.scan()  # no error first time
@@ -433,7 +534,7 @@ class TestRemoteScanner(unittest.TestCase):
 
         with self.assertRaises(ScannerError) as ctx:
             scanner.scan()
-        self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN.format("Invalid pickled data"), str(ctx.exception))
+        self.assertEqual(Localization.Error.REMOTE_SERVER_SCAN.format("Invalid scan data"), str(ctx.exception))
         self.assertFalse(ctx.exception.recoverable)
 
     def test_raises_nonrecoverable_error_on_failed_scan(self):
@@ -461,7 +562,7 @@ class TestRemoteScanner(unittest.TestCase):
                 raise SshcpError("SystemScannerError: something failed")
             else:
                 # later tries
-                return pickle.dumps([])
+                return ScanCodec.encode([])
         self.mock_ssh.shell.side_effect = ssh_shell
 
         with self.assertRaises(ScannerError) as ctx:
@@ -471,3 +572,100 @@ class TestRemoteScanner(unittest.TestCase):
             str(ctx.exception)
         )
         self.assertFalse(ctx.exception.recoverable)
+
+    def test_applies_scan_deltas(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a = SystemFile("a", 1, False)
+        b = SystemFile("b", 2, False)
+        b2 = SystemFile("b", 22, False)
+        c = SystemFile("c", 3, False)
+        self.commands = []
+        self.responses = [
+            lambda gen: SystemScanDelta(gen, None, [a, b], []),
+            lambda gen: SystemScanDelta(gen, self.generations[0], [b2, c], ["a"]),
+            lambda gen: SystemScanDelta(gen, self.generations[1], [], []),
+        ]
+        self.generations = []
+
+        def ssh_shell(command):
+            if command.startswith("md5sum"):
+                return b''
+            self.commands.append(command)
+            self.generations.append(re.search(r"--generation (\w+)", command).group(1))
+            return ScanCodec.encode(self.responses.pop(0)(self.generations[-1]))
+        self.mock_ssh.shell.side_effect = ssh_shell
+
+        self.assertEqual([a, b], scanner.scan())
+        self.assertNotIn("--base-generation", self.commands[0])
+        self.assertEqual([b2, c], scanner.scan())
+        self.assertIn("--base-generation {}".format(self.generations[0]), self.commands[1])
+        self.assertEqual([b2, c], scanner.scan())
+        self.assertIn("--base-generation {}".format(self.generations[1]), self.commands[2])
+        self.assertEqual(3, len(set(self.generations)))
+
+    def test_raises_recoverable_error_on_generation_mismatch(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a = SystemFile("a", 1, False)
+        self.commands = []
+        self.responses = [
+            lambda gen: SystemScanDelta(gen, None, [a], []),
+            lambda gen: SystemScanDelta(gen, "bad generation", [], ["a"]),
+            lambda gen: SystemScanDelta(gen, None, [a], []),
+        ]
+
+        def ssh_shell(command):
+            if command.startswith("md5sum"):
+                return b''
+            self.commands.append(command)
+            generation = re.search(r"--generation (\w+)", command).group(1)
+            return ScanCodec.encode(self.responses.pop(0)(generation))
+        self.mock_ssh.shell.side_effect = ssh_shell
+
+        self.assertEqual([a], scanner.scan())
+        with self.assertRaises(ScannerError) as ctx:
+            scanner.scan()
+        self.assertTrue(ctx.exception.recoverable)
+        # Next scan requests a full snapshot
+        self.assertEqual([a], scanner.scan())
+        self.assertNotIn("--base-generation", self.commands[2])
+
+    def test_accepts_full_file_list(self):
+        scanner = RemoteScanner(
+            remote_address="my remote address",
+            remote_username="my remote user",
+            remote_password="my password",
+            remote_port=1234,
+            remote_path_to_scan="/remote/path/to/scan",
+            local_path_to_scan_script=TestRemoteScanner.temp_scan_script,
+            remote_path_to_scan_script="/remote/path/to/scan/script"
+        )
+
+        a = SystemFile("a", 1, False)
+
+        def ssh_shell(command):
+            if command.startswith("md5sum"):
+                return b''
+            return ScanCodec.encode([a])
+        self.mock_ssh.shell.side_effect = ssh_shell
+
+        self.assertEqual([a], scanner.scan())
+        self.assertEqual([a], scanner.scan())
+        self.assertNotIn("--base-generation", self.mock_ssh.shell.call_args[0][0])
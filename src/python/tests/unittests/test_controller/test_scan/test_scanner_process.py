@@ -174,3 +174,151 @@ class TestScannerProcess(unittest.TestCase):
                 self.process.propagate_exception()
         # noinspection PyUnreachableCode
         self.assertEqual("non-recoverable error", str(ctx.exception))
+
+    @timeout_decorator.timeout(10)
+    def test_fixed_interval_by_default(self):
+        self.process = ScannerProcess(scanner=DummyScanner(),
+                                      interval_in_ms=100)
+        self.process.start()
+        intervals = []
+        while len(intervals) < 3:
+            result = self.process.pop_latest_result()
+            if result:
+                intervals.append(result.interval_in_ms)
+        self.assertEqual([100, 100, 100], intervals)
+
+    @timeout_decorator.timeout(10)
+    def test_backs_off_while_unchanged(self):
+        # Use this as a signal to mock to control which result to send
+        self.scan_signal = multiprocessing.Value('i', 0)
+
+        mock_scanner = DummyScanner()
+        mock_scanner.scan = MagicMock()
+        mock_scanner.scan.side_effect = lambda: [SystemFile("a", self.scan_signal.value, False)]
+
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=50,
+                                      max_interval_in_ms=400)
+        self.process.start()
+
+        def next_interval():
+            while True:
+                _result = self.process.pop_latest_result()
+                if _result:
+                    return _result.interval_in_ms
+
+        # First scan has nothing to compare to
+        self.assertEqual(50, next_interval())
+        self.assertEqual(100, next_interval())
+        self.assertEqual(200, next_interval())
+        self.assertEqual(400, next_interval())
+        self.assertEqual(400, next_interval())
+
+        # Changed scan snaps back
+        self.scan_signal.value = 1
+        self.process.force_scan()
+        interval = next_interval()
+        while interval == 400:
+            # scan that was in flight before the change
+            interval = next_interval()
+        self.assertEqual(50, interval)
+        self.assertEqual(100, next_interval())
+
+    @timeout_decorator.timeout(10)
+    def test_force_scan_and_active_snap_back(self):
+        self.process = ScannerProcess(scanner=DummyScanner(),
+                                      interval_in_ms=50,
+                                      max_interval_in_ms=10000)
+        self.process.start()
+
+        def next_interval():
+            while True:
+                _result = self.process.pop_latest_result()
+                if _result:
+                    return _result.interval_in_ms
+
+        while next_interval() < 800:
+            pass
+
+        # Forced scan resets the interval
+        # The first result may be from a scan that was in flight
+        self.process.force_scan()
+        self.assertIn(50, [next_interval(), next_interval()])
+
+        # Scans stay at the minimum interval while active
+        while next_interval() < 400:
+            pass
+        self.process.set_active(True)
+        self.assertIn(50, [next_interval(), next_interval()])
+        self.assertEqual(50, next_interval())
+        self.assertEqual(50, next_interval())
+
+        self.process.set_active(False)
+        interval = next_interval()
+        while interval == 50:
+            interval = next_interval()
+        self.assertEqual(100, interval)
+
+    @timeout_decorator.timeout(10)
+    def test_event_driven_scanner_keeps_min_interval(self):
+        mock_scanner = DummyScanner()
+        mock_scanner.is_event_driven = MagicMock(return_value=True)
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=50,
+                                      max_interval_in_ms=400)
+        self.process.start()
+        intervals = []
+        while len(intervals) < 5:
+            result = self.process.pop_latest_result()
+            if result:
+                intervals.append(result.interval_in_ms)
+        self.assertEqual([50] * 5, intervals)
+
+    @timeout_decorator.timeout(10)
+    def test_event_driven_scanner_publishes_only_changes(self):
+        self.scan_counter = multiprocessing.Value('i', 0)
+
+        def scan():
+            self.scan_counter.value += 1
+            # Changes on the first and every 5th scan
+            return [SystemFile("a", self.scan_counter.value, False)] if self.scan_counter.value % 5 == 1 else None
+
+        wake_event = multiprocessing.Event()
+        mock_scanner = DummyScanner()
+        mock_scanner.scan = MagicMock(side_effect=scan)
+        mock_scanner.is_event_driven = MagicMock(return_value=True)
+        self.process = ScannerProcess(scanner=mock_scanner,
+                                      interval_in_ms=20,
+                                      max_interval_in_ms=400,
+                                      wake_event=wake_event)
+        self.process.start()
+        sizes = []
+        while len(sizes) < 3:
+            wake_event.wait()
+            wake_event.clear()
+            result = self.process.pop_latest_result()
+            if result:
+                sizes.append(result.files[0].size)
+                self.assertEqual(20, result.interval_in_ms)
+        # Results queued together are popped as the latest one,
+        # but each is from a changed scan
+        self.assertEqual([1, 1, 1], [size % 5 for size in sizes])
+        self.assertEqual(sorted(set(sizes)), sizes)
+
+    def test_max_interval_less_than_min(self):
+        with self.assertRaises(ValueError):
+            ScannerProcess(scanner=DummyScanner(), interval_in_ms=100, max_interval_in_ms=50)
+
+    @timeout_decorator.timeout(10)
+    def test_sets_wake_event_on_result(self):
+        wake_event = multiprocessing.Event()
+        self.process = ScannerProcess(scanner=DummyScanner(),
+                                      interval_in_ms=100,
+                                      wake_event=wake_event)
+        self.process.start()
+        self.assertTrue(wake_event.wait(timeout=5))
+        wake_event.clear()
+        self.assertTrue(wake_event.wait(timeout=5))
+        result = None
+        while result is None:
+            result = self.process.pop_latest_result()
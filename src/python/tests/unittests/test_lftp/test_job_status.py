@@ -89,6 +89,18 @@ class TestLftpJobStatus(unittest.TestCase):
                           ("b", LftpJobStatus.TransferState(25, 100, 25, 0, 0))},
                          set(status.get_active_file_transfer_states()))
 
+    def test_active_transfer_state_lookup(self):
+        status = LftpJobStatus(job_id=-1,
+                               job_type=LftpJobStatus.Type.MIRROR,
+                               state=LftpJobStatus.State.RUNNING,
+                               name="",
+                               flags="")
+        status.add_active_file_transfer_state("a/aa", LftpJobStatus.TransferState(10, 20, 50, 0, 0))
+        self.assertEqual(LftpJobStatus.TransferState(10, 20, 50, 0, 0),
+                         status.get_active_file_transfer_state("a/aa"))
+        self.assertIsNone(status.get_active_file_transfer_state("a"))
+        self.assertIsNone(status.get_active_file_transfer_state("aa"))
+
     def test_active_transfer_state_fails_on_queued(self):
         status = LftpJobStatus(job_id=-1,
                                job_type=LftpJobStatus.Type.MIRROR,
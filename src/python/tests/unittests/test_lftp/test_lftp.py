@@ -5,7 +5,10 @@ import os
 import shutil
 import sys
 import tempfile
+import threading
+import time
 import unittest
+from unittest.mock import patch
 
 import timeout_decorator
 
@@ -201,6 +204,72 @@ class TestLftp(unittest.TestCase):
         statuses = self.lftp.status()
         self.assertEqual(0, len(statuses))
 
+    @timeout_decorator.timeout(5)
+    def test_status_polling(self):
+        self.lftp.rate_limit = 10  # so jobs don't finish right away
+        self.lftp.start_status_polling(0.1)
+        with self.assertRaises(LftpError):
+            self.lftp.start_status_polling(0.1)
+        self.lftp.queue("c", False)
+        while True:
+            statuses = self.lftp.pop_latest_status()
+            if statuses:
+                break
+        self.assertEqual(1, len(statuses))
+        self.assertEqual("c", statuses[0].name)
+        self.assertEqual(LftpJobStatus.State.RUNNING, statuses[0].state)
+        self.lftp.stop_status_polling()
+        # The last poll is popped at most once
+        self.lftp.pop_latest_status()
+        self.assertIsNone(self.lftp.pop_latest_status())
+
+    @timeout_decorator.timeout(5)
+    def test_status_polling_event_only_on_change(self):
+        status_event = threading.Event()
+        job = LftpJobStatus(job_id=1, job_type=LftpJobStatus.Type.PGET,
+                            state=LftpJobStatus.State.QUEUED, name="c", flags="")
+        with patch.object(Lftp, "status", return_value=[]) as mock_status:
+            self.lftp.start_status_polling(0.01, status_event)
+            self.assertTrue(status_event.wait(1))
+            self.assertEqual([], self.lftp.pop_latest_status())
+            status_event.clear()
+            # Unchanged polls are not published
+            call_count = mock_status.call_count
+            while mock_status.call_count < call_count + 5:
+                time.sleep(0.01)
+            self.assertFalse(status_event.is_set())
+            self.assertIsNone(self.lftp.pop_latest_status())
+            # Changes are
+            mock_status.return_value = [job]
+            self.assertTrue(status_event.wait(1))
+            self.assertEqual([job], self.lftp.pop_latest_status())
+            status_event.clear()
+            # So are errors, once
+            mock_status.side_effect = LftpError("bad status")
+            self.assertTrue(status_event.wait(1))
+            with self.assertRaises(LftpError):
+                self.lftp.pop_latest_status()
+            status_event.clear()
+            call_count = mock_status.call_count
+            while mock_status.call_count < call_count + 5:
+                time.sleep(0.01)
+            self.assertFalse(status_event.is_set())
+            self.lftp.stop_status_polling()
+
+    @timeout_decorator.timeout(5)
+    def test_status_polling_commands(self):
+        # Commands can be run while the status is being polled
+        self.lftp.rate_limit = 10  # so jobs don't finish right away
+        self.lftp.start_status_polling(0)
+        self.lftp.queue("c", False)
+        self.lftp.queue("d d", False)
+        self.assertEqual("10", self.lftp.rate_limit)
+        self.assertTrue(self.lftp.kill("c"))
+        while True:
+            statuses = self.lftp.pop_latest_status()
+            if statuses is not None and [s.name for s in statuses] == ["d d"]:
+                break
+
     @timeout_decorator.timeout(5)
     def test_queue_file(self):
         self.lftp.rate_limit = 10  # so jobs don't finish right away
@@ -115,3 +115,27 @@ class TestModelDiffUtil(unittest.TestCase):
         updated = [d for d in diffs if d.change == ModelDiff.Change.UPDATED]
         self.assertEqual(1, len(updated))
         self.assertEqual(ModelDiff(ModelDiff.Change.UPDATED, c1, c2), updated[0])
+
+    def test_diff_changed_file_names(self):
+        model_before = Model()
+        model_after = Model()
+        a = ModelFile("a", False)
+        b1 = ModelFile("b", False)
+        b1.local_size = 100
+        b2 = ModelFile("b", False)
+        b2.local_size = 200
+        c1 = ModelFile("c", False)
+        c1.local_size = 100
+        c2 = ModelFile("c", False)
+        c2.local_size = 200
+        model_before.add_file(b1)
+        model_before.add_file(c1)
+        model_after.add_file(a)
+        model_after.add_file(b2)
+        model_after.add_file(c2)
+
+        # only b is compared, added files are always reported
+        diffs = ModelDiffUtil.diff_models(model_before, model_after, {"b"})
+        self.assertEqual(2, len(diffs))
+        self.assertIn(ModelDiff(ModelDiff.Change.ADDED, None, a), diffs)
+        self.assertIn(ModelDiff(ModelDiff.Change.UPDATED, b1, b2), diffs)
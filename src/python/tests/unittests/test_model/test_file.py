@@ -1,5 +1,6 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import copy
 import unittest
 from datetime import datetime
 
@@ -177,6 +178,18 @@ class TestModelFile(unittest.TestCase):
         file_parent.add_child(file_child2)
         self.assertEqual([file_child1, file_child2], file_parent.get_children())
 
+    def test_get_child(self):
+        file_parent = ModelFile("parent", True)
+        self.assertIsNone(file_parent.get_child("child1"))
+        file_child1 = ModelFile("child1", True)
+        file_child2 = ModelFile("child2", False)
+        file_parent.add_child(file_child1)
+        file_parent.add_child(file_child2)
+        self.assertIs(file_child1, file_parent.get_child("child1"))
+        self.assertIs(file_child2, file_parent.get_child("child2"))
+        self.assertIsNone(file_parent.get_child("child3"))
+        self.assertIsNone(file_child2.get_child("child1"))
+
     def test_child_equality(self):
         l_a = ModelFile("a", True)
         l_a.remote_size = 3+1+2
@@ -253,3 +266,72 @@ class TestModelFile(unittest.TestCase):
         self.assertIsNone(a.parent)
         self.assertEqual(a, aa.parent)
         self.assertEqual(aa, aaa.parent)
+
+    def test_content_hash(self):
+        a1 = ModelFile("a", True)
+        a1.add_child(ModelFile("aa", False))
+        a1.add_child(ModelFile("ab", False))
+        a2 = ModelFile("a", True)
+        a2.add_child(ModelFile("ab", False))
+        a2.add_child(ModelFile("aa", False))
+        # Children order does not matter
+        self.assertEqual(a1.content_hash, a2.content_hash)
+
+        # Update timestamp is not part of the hash
+        a2.update_timestamp = datetime(2018, 11, 9, 21, 40, 18)
+        self.assertEqual(a1.content_hash, a2.content_hash)
+
+        # Modifying a descendant after hashing changes the hash of its ancestors
+        aa2 = next(f for f in a2.get_children() if f.name == "aa")
+        aa2.local_size = 10
+        self.assertNotEqual(a1.content_hash, a2.content_hash)
+        aa2.local_size = None
+        self.assertEqual(a1.content_hash, a2.content_hash)
+
+    def test_freeze(self):
+        a = ModelFile("a", True)
+        aa = ModelFile("aa", True)
+        a.add_child(aa)
+        aaa = ModelFile("aaa", False)
+        aa.add_child(aaa)
+        self.assertFalse(a.is_frozen)
+        a.freeze()
+        self.assertTrue(a.is_frozen)
+        self.assertTrue(aaa.is_frozen)
+        with self.assertRaises(TypeError):
+            a.local_size = 100
+        with self.assertRaises(TypeError):
+            aaa.state = ModelFile.State.DOWNLOADED
+        with self.assertRaises(TypeError):
+            aa.add_child(ModelFile("aab", False))
+        with self.assertRaises(TypeError):
+            ModelFile("b", True).add_child(aa)
+        # Hash can still be computed
+        self.assertEqual(a.content_hash, a.content_hash)
+        self.assertIsNone(aaa.local_size)
+
+    def test_content_hash_frozen(self):
+        a = ModelFile("a", True)
+        a.add_child(ModelFile("aa", False))
+        a.freeze()
+        b = ModelFile("a", True)
+        b.add_child(ModelFile("aa", False))
+        # Hash of the frozen file is cached and matches the unfrozen file's
+        self.assertIs(a.content_hash, a.content_hash)
+        self.assertEqual(a.content_hash, b.content_hash)
+
+    def test_attribute_writes_not_hooked(self):
+        # Attribute writes are on the hot path of model builds, so they must
+        # not go through a python __setattr__
+        self.assertIs(object.__setattr__, ModelFile.__setattr__)
+
+    def test_copy_frozen(self):
+        a = ModelFile("a", True)
+        a.add_child(ModelFile("aa", False))
+        a.local_size = 10
+        a.freeze()
+        b = copy.deepcopy(a)
+        self.assertEqual(a, b)
+        self.assertTrue(b.is_frozen)
+        self.assertEqual(10, b.local_size)
+        self.assertEqual(b, b.get_children()[0].parent)
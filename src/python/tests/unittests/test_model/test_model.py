@@ -84,6 +84,19 @@ class TestLftpModel(unittest.TestCase):
         self.model.add_file(ModelFile("d", False))
         self.assertEqual({"a", "c", "d"}, self.model.get_file_names())
 
+    def test_get_files(self):
+        self.assertEqual([], self.model.get_files())
+        a = ModelFile("a", False)
+        b = ModelFile("b", False)
+        self.model.add_file(a)
+        self.model.add_file(b)
+        files = self.model.get_files()
+        self.assertEqual({"a", "b"}, {f.name for f in files})
+        self.assertIs(a, next(f for f in files if f.name == "a"))
+        # Returned list is not affected by later changes
+        self.model.remove_file("a")
+        self.assertEqual(2, len(files))
+
     def test_add_listener(self):
         listener = DummyModelListener()
         self.model.add_listener(listener)
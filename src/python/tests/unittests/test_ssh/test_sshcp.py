@@ -4,9 +4,14 @@ import unittest
 import os
 import tempfile
 import shutil
+import fcntl
 import filecmp
 import logging
+import re
+import signal
+import subprocess
 import sys
+from unittest.mock import patch
 
 import timeout_decorator
 from parameterized import parameterized
@@ -184,3 +189,235 @@ class TestSshcp(unittest.TestCase):
         with self.assertRaises(SshcpError) as ctx:
             sshcp.shell("./some_bad_command.sh".format(self.local_dir))
         self.assertTrue("./some_bad_command.sh" in str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(10)
+    def test_shell_control_master(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                      use_control_master=True)
+        # First command establishes the master, later ones reuse it
+        for _ in range(3):
+            out = sshcp.shell("cd {}; pwd".format(self.local_dir))
+            self.assertEqual(self.local_dir, out.decode().strip())
+
+        # Another instance shares the same master
+        sshcp2 = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                       use_control_master=True)
+        out = sshcp2.shell("cd {}; pwd".format(self.local_dir))
+        self.assertEqual(self.local_dir, out.decode().strip())
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(20)
+    def test_shell_control_master_recovers_from_dead_master(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                      use_control_master=True)
+        sshcp.shell("pwd")
+        # noinspection PyUnresolvedReferences
+        control_path = sshcp._Sshcp__control_path
+        self.assertTrue(os.path.exists(control_path))
+
+        # Kill the master and remove its socket
+        check = subprocess.run(["ssh", "-O", "check", "-o", "ControlPath={}".format(control_path), "dummy"],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        pid = int(re.search(r"pid=(\d+)", check.stdout.decode()).group(1))
+        os.kill(pid, signal.SIGKILL)
+        if os.path.exists(control_path):
+            os.remove(control_path)
+
+        out = sshcp.shell("cd {}; pwd".format(self.local_dir))
+        self.assertEqual(self.local_dir, out.decode().strip())
+        self.assertTrue(os.path.exists(control_path))
+
+        # A stale socket without a master is replaced too
+        check = subprocess.run(["ssh", "-O", "check", "-o", "ControlPath={}".format(control_path), "dummy"],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        pid = int(re.search(r"pid=(\d+)", check.stdout.decode()).group(1))
+        os.kill(pid, signal.SIGKILL)
+        out = sshcp.shell_stream("cd {}; pwd".format(self.local_dir))
+        self.assertEqual((self.local_dir + "\n").encode(), out)
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(10)
+    def test_copy_control_master(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                      use_control_master=True)
+        sshcp.shell("pwd")
+        sshcp.copy(local_path=self.local_file, remote_path=self.remote_file)
+        self.assertTrue(filecmp.cmp(self.local_file, self.remote_file))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(10)
+    def test_shell_control_master_error_bad_command(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                      use_control_master=True)
+        sshcp.shell("pwd")
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell("./some_bad_command.sh")
+        self.assertTrue("./some_bad_command.sh" in str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_control_master_error_bad_host(self, _, password):
+        sshcp = Sshcp(host="badhost", port=self.port, user=self.user, password=password,
+                      use_control_master=True)
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell("cd {}; pwd".format(self.local_dir))
+        self.assertTrue("Bad hostname" in str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password)
+        out = sshcp.shell_stream("cd {}; pwd".format(self.local_dir))
+        self.assertEqual((self.local_dir + "\n").encode(), out)
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream_is_byte_exact(self, _, password):
+        data = b" \r\n" + bytes(range(256)) * 1000 + b"\n\r "
+        with open(self.local_file, "wb") as f:
+            f.write(data)
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password)
+        out = sshcp.shell_stream("cat {}".format(self.local_file))
+        self.assertEqual(data, out)
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream_consumer(self, _, password):
+        data = bytes(range(256)) * 4000
+        with open(self.local_file, "wb") as f:
+            f.write(data)
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password)
+        chunks = []
+        out = sshcp.shell_stream("cat {}".format(self.local_file), lambda chunk: chunks.append(bytes(chunk)))
+        self.assertIsNone(out)
+        self.assertEqual(data, b"".join(chunks))
+
+    @timeout_decorator.timeout(5)
+    def test_shell_stream_error_bad_password(self):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password="wrong password")
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell_stream("cd {}; pwd".format(self.local_dir))
+        self.assertEqual("Incorrect password", str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream_error_bad_host(self, _, password):
+        sshcp = Sshcp(host="badhost", port=self.port, user=self.user, password=password)
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell_stream("cd {}; pwd".format(self.local_dir))
+        self.assertTrue("Bad hostname" in str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream_error_bad_port(self, _, password):
+        sshcp = Sshcp(host=self.host, port=6666, user=self.user, password=password)
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell_stream("cd {}; pwd".format(self.local_dir))
+        self.assertTrue("Connection refused by server" in str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(5)
+    def test_shell_stream_error_bad_command(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password)
+        with self.assertRaises(SshcpError) as ctx:
+            sshcp.shell_stream("./some_bad_command.sh")
+        self.assertTrue("./some_bad_command.sh" in str(ctx.exception))
+
+    @parameterized.expand(_PARAMS)
+    @timeout_decorator.timeout(10)
+    def test_shell_stream_control_master(self, _, password):
+        sshcp = Sshcp(host=self.host, port=self.port, user=self.user, password=password,
+                      use_control_master=True)
+        # Streamed and pty commands share the master
+        for _ in range(2):
+            out = sshcp.shell_stream("cd {}; pwd".format(self.local_dir))
+            self.assertEqual((self.local_dir + "\n").encode(), out)
+            out = sshcp.shell("cd {}; pwd".format(self.local_dir))
+            self.assertEqual(self.local_dir, out.decode().strip())
+
+
+class FakeFlock:
+    """
+    Stand-in for fcntl.flock that records the locked files
+    """
+    def __init__(self):
+        self.locked_paths = []
+        self.on_lock = None
+
+    def __call__(self, lock_file, operation):
+        assert operation == fcntl.LOCK_EX
+        self.locked_paths.append(lock_file.name)
+        if self.on_lock:
+            self.on_lock()
+
+class TestSshcpControlMasterStartup(unittest.TestCase):
+    """
+    Covers master startup with ssh mocked out, so it needs no ssh server
+    """
+    @overrides(unittest.TestCase)
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix="test_sshcp_master")
+        self.sshcp = Sshcp(host="127.0.0.1", port=22, user="user", use_control_master=True)
+        self.control_path = os.path.join(self.temp_dir, "master")
+        self.sshcp._Sshcp__control_path = self.control_path
+
+        # Mocked ssh: a master is alive if it was started and not told to exit
+        self.master_alive = False
+        self.calls = []
+
+        def run(args, **_):
+            if args[:2] == ["ssh", "-O"]:
+                operation = args[2]
+                self.calls.append((operation, os.path.exists(self.control_path)))
+                if operation == "exit":
+                    self.master_alive = False
+                return subprocess.CompletedProcess(args, 0 if self.master_alive else 255)
+            elif args[:2] == ["ssh", "-fNM"]:
+                self.calls.append(("start", os.path.exists(self.control_path)))
+                open(self.control_path, "w").close()
+                self.master_alive = True
+                return subprocess.CompletedProcess(args, 0)
+            raise AssertionError("Unexpected command {}".format(args))
+
+        run_patcher = patch("ssh.sshcp.subprocess.run", side_effect=run)
+        run_patcher.start()
+        self.addCleanup(run_patcher.stop)
+        self.flock = FakeFlock()
+        flock_patcher = patch("ssh.sshcp.fcntl.flock", side_effect=self.flock)
+        flock_patcher.start()
+        self.addCleanup(flock_patcher.stop)
+
+    @overrides(unittest.TestCase)
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_starts_master_under_lock(self):
+        self.sshcp._Sshcp__ensure_control_master()
+        self.assertEqual([("start", False)], self.calls)
+        self.assertEqual([self.control_path + ".lock"], self.flock.locked_paths)
+        self.assertTrue(self.master_alive)
+
+    def test_reuses_responsive_master(self):
+        self.sshcp._Sshcp__ensure_control_master()
+        self.calls.clear()
+        self.flock.locked_paths.clear()
+        self.sshcp._Sshcp__ensure_control_master()
+        self.assertEqual([("check", True)], self.calls)
+        self.assertEqual([], self.flock.locked_paths)
+
+    def test_does_not_start_master_started_while_waiting_for_lock(self):
+        def start_other_master():
+            open(self.control_path, "w").close()
+            self.master_alive = True
+        self.flock.on_lock = start_other_master
+        self.sshcp._Sshcp__ensure_control_master()
+        self.assertEqual([("check", True)], self.calls)
+
+    def test_exits_unresponsive_master_before_removing_socket(self):
+        open(self.control_path, "w").close()
+        self.sshcp._Sshcp__ensure_control_master()
+        # check before and after taking the lock, then exit while the socket still exists
+        self.assertEqual([("check", True), ("check", True), ("exit", True), ("start", False)], self.calls)
+        self.assertTrue(self.master_alive)
+
@@ -1,5 +1,6 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
+import pickle
 import unittest
 from datetime import datetime
 
@@ -83,3 +84,44 @@ class TestSystemFile(unittest.TestCase):
         self.assertTrue(a1 == a2)
         self.assertFalse(a1 == a3)
         self.assertFalse(a1 == a4)
+
+    def test_content_hash(self):
+        a1 = SystemFile("a", 50, is_dir=True)
+        a1.add_child(SystemFile("aa", 40, is_dir=False))
+        a2 = SystemFile("a", 50, is_dir=True)
+        a2.add_child(SystemFile("aa", 40, is_dir=False))
+        self.assertEqual(a1.content_hash, a2.content_hash)
+
+        # Adding a child changes the hash
+        a2.add_child(SystemFile("ab", 10, is_dir=False))
+        self.assertNotEqual(a1.content_hash, a2.content_hash)
+        self.assertFalse(a1 == a2)
+
+        # Hash survives pickling
+        a3 = pickle.loads(pickle.dumps(a2))
+        self.assertEqual(a2.content_hash, a3.content_hash)
+        self.assertTrue(a2 == a3)
+
+    def test_unpickle_legacy_state(self):
+        a = SystemFile("a", 50, is_dir=True)
+        aa = SystemFile("aa", 40, is_dir=False)
+        a.add_child(aa)
+        # Simulate a file pickled by a version without slots or the cached hash
+        old = SystemFile.__new__(SystemFile)
+        old.__setstate__({
+            "_SystemFile__name": "a",
+            "_SystemFile__size": 50,
+            "_SystemFile__is_dir": True,
+            "_SystemFile__timestamp_created": None,
+            "_SystemFile__timestamp_modified": None,
+            "_SystemFile__children": [aa]
+        })
+        self.assertEqual(a.content_hash, old.content_hash)
+        self.assertEqual([aa], old.children)
+
+    def test_children_created_lazily(self):
+        a = SystemFile("a", 0, is_dir=True)
+        self.assertEqual([], a.children)
+        a2 = pickle.loads(pickle.dumps(a))
+        self.assertEqual([], a2.children)
+        self.assertTrue(a == a2)
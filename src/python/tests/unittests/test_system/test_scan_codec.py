@@ -0,0 +1,134 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+from datetime import datetime, timezone
+from typing import List
+
+from system import SystemFile, SystemScanDelta, ScanCodec, ScanDecoder, ScanCodecError
+
+
+class TestScanCodec(unittest.TestCase):
+    def setUp(self):
+        ts = datetime(2018, 11, 9, 21, 40, 18, 123456)
+        self.a = SystemFile("a", 300, True, time_created=ts, time_modified=datetime(2018, 11, 10))
+        aa = SystemFile("aa", 300, True)
+        self.a.add_child(aa)
+        aa.add_child(SystemFile("a", 100, False, time_modified=datetime(1965, 1, 2, 3, 4, 5, 6)))
+        aa.add_child(SystemFile("aab", 200, False, time_created=ts))
+        self.a.add_child(SystemFile("empty dir", 0, True))
+        self.b = SystemFile("b\udcff ünicode", 2**40, False)
+        self.c = SystemFile("c", 0, True)
+
+    def assert_trees_equal(self, expected: List[SystemFile], actual: List[SystemFile]):
+        # Root hashes are sent with the data, so compare the trees field by field
+        self.assertEqual(len(expected), len(actual))
+        for e, a in zip(expected, actual):
+            self.assertEqual(e.name, a.name)
+            self.assertEqual(e.size, a.size)
+            self.assertEqual(e.is_dir, a.is_dir)
+            self.assertEqual(e.timestamp_created, a.timestamp_created)
+            self.assertEqual(e.timestamp_modified, a.timestamp_modified)
+            self.assert_trees_equal(e.children, a.children)
+
+    def test_file_list(self):
+        files = [self.a, self.b, self.c]
+        decoded = ScanCodec.decode(ScanCodec.encode(files))
+        self.assert_trees_equal(files, decoded)
+        self.assertEqual(files, decoded)
+        # Child hashes are computed from the decoded tree
+        self.assertEqual(self.a.children[0].content_hash, decoded[0].children[0].content_hash)
+
+    def test_empty_file_list(self):
+        self.assertEqual([], ScanCodec.decode(ScanCodec.encode([])))
+
+    def test_delta(self):
+        delta = SystemScanDelta("gen2", "gen1", [self.a, self.c], ["x", "y"])
+        decoded = ScanCodec.decode(ScanCodec.encode(delta))
+        self.assertEqual(delta, decoded)
+        self.assert_trees_equal(delta.updated, decoded.updated)
+
+    def test_full_delta(self):
+        delta = SystemScanDelta("gen2", None, [self.b], [])
+        decoded = ScanCodec.decode(ScanCodec.encode(delta))
+        self.assertTrue(decoded.is_full)
+        self.assertEqual(delta, decoded)
+
+    def test_names_are_interned(self):
+        files = [SystemFile("dir{}".format(i), 0, True) for i in range(10)]
+        for f in files:
+            f.add_child(SystemFile("a long repeated name.nfo", 10, False))
+        encoded = ScanCodec.encode(files)
+        self.assertEqual(1, encoded.count(b"a long repeated name.nfo"))
+
+    def test_survives_output_stripping(self):
+        # Command output is stripped of surrounding whitespace
+        files = [SystemFile(" ", 32, False)]
+        encoded = ScanCodec.encode(files)
+        self.assertEqual(encoded, encoded.strip())
+
+    def test_incremental_decode(self):
+        files = [self.a, self.b, self.c]
+        encoded = ScanCodec.encode(files)
+        decoder = ScanDecoder()
+        for i in range(len(encoded)):
+            self.assertFalse(decoder.done)
+            decoder.feed(encoded[i:i+1])
+        self.assertTrue(decoder.done)
+        self.assert_trees_equal(files, decoder.result())
+
+    def test_incomplete_data(self):
+        encoded = ScanCodec.encode([self.a])
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded[:-1])
+
+    def test_mangled_data(self):
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(b"mangled data")
+        encoded = ScanCodec.encode([self.a])
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded[:-1] + b"X")
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded + b"extra")
+
+    def test_timezone_aware_timestamp(self):
+        f = SystemFile("a", 0, False, time_created=datetime(2018, 1, 1, tzinfo=timezone.utc))
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.encode([f])
+
+    def test_compressed(self):
+        files = [self.a, self.b, self.c]
+        for compression in ScanCodec.COMPRESSIONS:
+            encoded = ScanCodec.encode(files, compression=compression)
+            self.assertEqual(encoded, encoded.strip())
+            self.assert_trees_equal(files, ScanCodec.decode(encoded))
+
+    def test_compressed_is_smaller(self):
+        files = [SystemFile("file{}.rar".format(i), 2**30, False) for i in range(1000)]
+        encoded = ScanCodec.encode(files)
+        self.assertLess(len(ScanCodec.encode(files, compression=ScanCodec.COMPRESSION_ZLIB)), len(encoded))
+
+    def test_compressed_incremental_decode(self):
+        files = [self.a, self.b, self.c]
+        for compression in ScanCodec.COMPRESSIONS:
+            encoded = ScanCodec.encode(files, compression=compression)
+            decoder = ScanDecoder()
+            for i in range(len(encoded)):
+                self.assertFalse(decoder.done)
+                decoder.feed(encoded[i:i+1])
+            self.assertTrue(decoder.done)
+            self.assert_trees_equal(files, decoder.result())
+
+    def test_compressed_mangled_data(self):
+        encoded = ScanCodec.encode([self.a], compression=ScanCodec.COMPRESSION_ZLIB)
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded[:-1])
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded[:5] + b"mangled data" + encoded[-1:])
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded + b"extra")
+        with self.assertRaises(ScanCodecError):
+            ScanCodec.decode(encoded[:4] + b"q" + encoded[5:])
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            ScanCodec.encode([self.a], compression="rot13")
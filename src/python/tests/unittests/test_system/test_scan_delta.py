@@ -0,0 +1,65 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from system import SystemFile, SystemScanDelta
+
+
+class TestSystemScanDelta(unittest.TestCase):
+    def setUp(self):
+        self.a = SystemFile("a", 100, True)
+        self.a.add_child(SystemFile("aa", 100, False))
+        self.b = SystemFile("b", 200, False)
+        self.c = SystemFile("c", 300, False)
+
+    def test_create_full_snapshot(self):
+        files = [self.a, self.b]
+        delta = SystemScanDelta.create("2", None, files, None, SystemScanDelta.digest(files))
+        self.assertTrue(delta.is_full)
+        self.assertEqual("2", delta.generation)
+        self.assertEqual(files, delta.updated)
+        self.assertEqual([], delta.removed)
+        # Full snapshot replaces everything
+        self.assertEqual(files, delta.apply([self.c]))
+
+    def test_create_delta(self):
+        before = [self.a, self.b]
+        a2 = SystemFile("a", 150, True)
+        a2.add_child(SystemFile("aa", 100, False))
+        a2.add_child(SystemFile("ab", 50, False))
+        after = [a2, self.c]
+        delta = SystemScanDelta.create("2", "1", after,
+                                       SystemScanDelta.digest(before),
+                                       SystemScanDelta.digest(after))
+        self.assertFalse(delta.is_full)
+        self.assertEqual("1", delta.base_generation)
+        self.assertEqual([a2, self.c], delta.updated)
+        self.assertEqual(["b"], delta.removed)
+        self.assertEqual(after, delta.apply(before))
+
+    def test_create_delta_unchanged(self):
+        files = [self.a, self.b]
+        digests = SystemScanDelta.digest(files)
+        delta = SystemScanDelta.create("2", "1", files, digests, SystemScanDelta.digest(files))
+        self.assertEqual([], delta.updated)
+        self.assertEqual([], delta.removed)
+        self.assertEqual(files, delta.apply(files))
+
+    def test_apply_sorts_by_name(self):
+        delta = SystemScanDelta("2", "1", [self.a], [])
+        self.assertEqual([self.a, self.b, self.c], delta.apply([self.b, self.c]))
+
+    def test_save_and_load_state(self):
+        temp_dir = tempfile.mkdtemp(prefix="test_scan_delta")
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "state")
+        self.assertEqual((None, None), SystemScanDelta.load_state(path))
+        digests = SystemScanDelta.digest([self.a, self.b])
+        SystemScanDelta.save_state(path, "1", digests)
+        self.assertEqual(("1", digests), SystemScanDelta.load_state(path))
+        with open(path, "wb") as f:
+            f.write(b"garbage")
+        self.assertEqual((None, None), SystemScanDelta.load_state(path))
@@ -7,7 +7,7 @@ import unittest
 from threading import Thread
 from datetime import datetime
 
-from system import SystemScanner, SystemScannerError
+from system import SystemScanner, SystemScannerError, SystemScannerCache
 
 
 def my_mkdir(*args):
@@ -660,3 +660,195 @@ class TestSystemScanner(unittest.TestCase):
         self.assertEqual("dir�dir", folder.name)
         self.assertEqual("file�file", file.name)
         self.assertEqual(128, file.size)
+
+    def test_scan_with_cache_matches_scan_without_cache(self):
+        self.setup_default_tree()
+        expected = SystemScanner(TestSystemScanner.temp_dir).scan()
+
+        cache = SystemScannerCache()
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_cache(cache)
+        # First scan populates the cache
+        self.assertEqual(expected, scanner.scan())
+        self.assertEqual(0, cache.hits)
+        # Second scan reuses every directory listing
+        self.assertEqual(expected, scanner.scan())
+        self.assertEqual(len(cache), cache.hits)
+
+    def test_scan_with_cache_detects_nested_changes(self):
+        self.setup_default_tree()
+        cache = SystemScannerCache()
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_cache(cache)
+        scanner.scan()
+
+        # Add a file deep in the tree, and remove a directory
+        my_touch(100, "b", "bb", "bbc", "bbca", "bbcab")
+        shutil.rmtree(os.path.join(TestSystemScanner.temp_dir, "a", "aa"))
+        files = scanner.scan()
+        self.assertEqual(SystemScanner(TestSystemScanner.temp_dir).scan(), files)
+        a, b, c = tuple(files)
+        self.assertEqual(["ab"], [f.name for f in a.children])
+        self.assertEqual(24*1024*1024+24+512+7+1+100, b.size)
+
+    def test_scan_with_cache_skips_settled_files(self):
+        self.setup_default_tree()
+        path_ab = os.path.join(TestSystemScanner.temp_dir, "a", "ab")
+        old_time = datetime(2018, 11, 9, 21, 40, 18).timestamp()
+        os.utime(path_ab, (old_time, old_time))
+
+        cache = SystemScannerCache(settle_time_in_secs=60)
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_cache(cache)
+        ab = scanner.scan()[0].children[1]
+
+        # Unchanged settled file is reused
+        self.assertIs(ab, scanner.scan()[0].children[1])
+
+    def test_scan_with_cache_detects_settled_files_modified_in_place(self):
+        self.setup_default_tree()
+        path_a = os.path.join(TestSystemScanner.temp_dir, "a")
+        path_ab = os.path.join(TestSystemScanner.temp_dir, "a", "ab")
+        old_time = datetime(2018, 11, 9, 21, 40, 18).timestamp()
+        os.utime(path_ab, (old_time, old_time))
+
+        cache = SystemScannerCache(settle_time_in_secs=60)
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_cache(cache)
+        scanner.scan()
+
+        # Grow a settled file in-place, keeping the dir mtime
+        dir_stat = os.stat(path_a)
+        with open(path_ab, "ab") as f:
+            f.write(bytearray([0xff] * 10))
+        os.utime(path_ab, (old_time + 1, old_time + 1))
+        os.utime(path_a, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+        a = scanner.scan()[0]
+        self.assertEqual(len(cache), cache.hits)
+        self.assertEqual(12*1024+4+10, a.children[1].size)
+        self.assertEqual(datetime.fromtimestamp(old_time + 1), a.children[1].timestamp_modified)
+
+        # Size alone is enough to detect the change
+        with open(path_ab, "ab") as f:
+            f.write(bytearray([0xff] * 10))
+        os.utime(path_ab, (old_time + 1, old_time + 1))
+        os.utime(path_a, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+        a = scanner.scan()[0]
+        self.assertEqual(12*1024+4+20, a.children[1].size)
+
+    def test_scan_with_cache_rescans_recent_files(self):
+        self.setup_default_tree()
+        path_a = os.path.join(TestSystemScanner.temp_dir, "a")
+        path_ab = os.path.join(TestSystemScanner.temp_dir, "a", "ab")
+
+        cache = SystemScannerCache(settle_time_in_secs=60)
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_cache(cache)
+        scanner.scan()
+
+        # Grow a recently modified file in-place, keeping the dir mtime
+        dir_stat = os.stat(path_a)
+        with open(path_ab, "ab") as f:
+            f.write(bytearray([0xff] * 10))
+        os.utime(path_a, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+        a = scanner.scan()[0]
+        self.assertEqual(12*1024+4+10, a.children[1].size)
+
+    def test_scan_cache_save_and_load(self):
+        self.setup_default_tree()
+        cache_dir = tempfile.mkdtemp(prefix="test_system_scanner_cache")
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_path = os.path.join(cache_dir, "cache")
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        cache = SystemScannerCache(signature=("sig",))
+        scanner.set_cache(cache)
+        expected = scanner.scan()
+        cache.save(cache_path)
+
+        # Same signature reuses the cache
+        loaded = SystemScannerCache.load(cache_path, signature=("sig",))
+        self.assertEqual(len(cache), len(loaded))
+        scanner.set_cache(loaded)
+        self.assertEqual(expected, scanner.scan())
+        self.assertEqual(len(loaded), loaded.hits)
+
+        # Different signature discards the cache
+        self.assertEqual(0, len(SystemScannerCache.load(cache_path, signature=("other",))))
+
+        # Missing or corrupt file gives an empty cache
+        self.assertEqual(0, len(SystemScannerCache.load(cache_path + "missing")))
+        with open(cache_path, "wb") as f:
+            f.write(b"garbage")
+        self.assertEqual(0, len(SystemScannerCache.load(cache_path, signature=("sig",))))
+
+    def test_scan_parallel_matches_scan(self):
+        self.setup_default_tree()
+        # Add a wider tree too
+        for i in range(20):
+            my_mkdir("d{}".format(i))
+            for j in range(i):
+                my_mkdir("d{}".format(i), "dd{}".format(j))
+                my_touch(i * j, "d{}".format(i), "dd{}".format(j), "f")
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.add_exclude_prefix(".")
+        expected = scanner.scan()
+        scanner.set_num_workers(8)
+        self.assertEqual(expected, scanner.scan())
+
+    def test_scan_parallel_lftp_partial_file(self):
+        tempdir = TestSystemScanner.temp_dir
+        os.mkdir(os.path.join(tempdir, "t"))
+        path = os.path.join(tempdir, "t", "partial.mkv")
+        with open(path, 'wb') as f:
+            f.write(bytearray([0xff] * 24588))
+        path = os.path.join(tempdir, "t", "partial.mkv.lftp-pget-status")
+        with open(path, "w") as f:
+            f.write("""
+            size=24588
+            0.pos=3157
+            0.limit=6147
+            """)
+        scanner = SystemScanner(tempdir)
+        scanner.set_num_workers(4)
+        files = scanner.scan()
+        self.assertEqual(1, len(files))
+        t = files[0]
+        self.assertEqual(24588-(6147-3157), t.size)
+        self.assertEqual(["partial.mkv"], [f.name for f in t.children])
+
+    def test_scan_parallel_files_deleted_while_scanning(self):
+        self.setup_default_tree()
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        scanner.set_num_workers(4)
+
+        stop = False
+
+        # Make and delete files while test runs
+        def monkey_with_files():
+            orig = os.path.join(TestSystemScanner.temp_dir, "b")
+            dest = os.path.join(TestSystemScanner.temp_dir, "b_copy")
+            while not stop:
+                shutil.copytree(orig, dest)
+                shutil.rmtree(dest)
+        thread = Thread(target=monkey_with_files)
+        thread.start()
+
+        try:
+            # Scan a bunch of times
+            for i in range(0, 500):
+                files = scanner.scan()
+                # Must have at least the untouched files
+                names = set([f.name for f in files])
+                self.assertIn("a", names)
+                self.assertIn("b", names)
+                self.assertIn("c", names)
+        finally:
+            stop = True
+            thread.join()
+
+    def test_scan_parallel_bad_num_workers(self):
+        scanner = SystemScanner(TestSystemScanner.temp_dir)
+        with self.assertRaises(ValueError):
+            scanner.set_num_workers(0)
@@ -0,0 +1,372 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+from unittest.mock import MagicMock, patch
+import json
+import time
+from typing import Optional
+
+import timeout_decorator
+
+from tests.unittests.test_web.test_serialize.test_serialize import parse_stream
+from web.handler.stream_model import ModelBroadcast, ModelStreamQueue, ModelUpdate
+from web.serialize import SerializeModel
+from web.utils import StreamHub, StreamQueueMetrics
+from model import ModelFile
+
+
+class TestModelBroadcast(unittest.TestCase):
+    def setUp(self):
+        self.controller = MagicMock()
+        self.model_files = [ModelFile("a", True), ModelFile("b", False)]
+
+        # Capture the model listener
+        def capture_listener(listener):
+            self.model_listener = listener
+            return self.model_files
+        self.model_listener = None
+        self.controller.get_model_files_and_add_listener.side_effect = capture_listener
+
+    def test_shares_one_listener(self):
+        broadcast = ModelBroadcast(self.controller)
+        queue1 = ModelStreamQueue()
+        queue2 = ModelStreamQueue()
+        self.assertEqual(self.model_files, broadcast.subscribe(queue1))
+        self.assertEqual(self.model_files, broadcast.subscribe(queue2))
+        self.controller.get_model_files_and_add_listener.assert_called_once_with(self.model_listener)
+
+        broadcast.unsubscribe(queue1)
+        self.controller.remove_model_listener.assert_not_called()
+        broadcast.unsubscribe(queue2)
+        self.controller.remove_model_listener.assert_called_once_with(self.model_listener)
+
+        # Listener is added again for new streams
+        broadcast.subscribe(queue1)
+        self.assertEqual(2, self.controller.get_model_files_and_add_listener.call_count)
+
+    @patch("web.handler.stream_model.SerializeModel")
+    def test_serializes_update_once(self, mock_serialize_model_cls):
+        mock_serialize = mock_serialize_model_cls.return_value
+        mock_serialize.update_event.return_value = "frame"
+
+        broadcast = ModelBroadcast(self.controller)
+        queues = [ModelStreamQueue() for _ in range(5)]
+        for queue in queues:
+            broadcast.subscribe(queue)
+
+        self.model_listener.file_added(ModelFile("c", False))
+        # Update is serialized by the streams, not by the controller's listener call
+        self.assertEqual(0, mock_serialize.update_event.call_count)
+        for queue in queues:
+            self.assertEqual("frame", queue.get_next_event())
+            self.assertIsNone(queue.get_next_event())
+        self.assertEqual(1, mock_serialize.update_event.call_count)
+
+    def test_unsubscribed_queue_gets_no_updates(self):
+        broadcast = ModelBroadcast(self.controller)
+        queue1 = ModelStreamQueue()
+        queue2 = ModelStreamQueue()
+        broadcast.subscribe(queue1)
+        broadcast.subscribe(queue2)
+        broadcast.unsubscribe(queue2)
+        self.model_listener.file_added(ModelFile("c", False))
+        self.assertIsNotNone(queue1.get_next_event())
+        self.assertIsNone(queue2.get_next_event())
+
+    def test_late_subscriber_gets_updated_model(self):
+        broadcast = ModelBroadcast(self.controller)
+        broadcast.subscribe(ModelStreamQueue())
+
+        new_a = ModelFile("a", True)
+        new_a.local_size = 100
+        self.model_listener.file_updated(self.model_files[0], new_a)
+        self.model_listener.file_removed(self.model_files[1])
+        self.model_listener.file_added(ModelFile("c", False))
+
+        queue = ModelStreamQueue()
+        files = broadcast.subscribe(queue)
+        self.assertEqual([new_a, ModelFile("c", False)], files)
+        self.assertEqual(100, files[0].local_size)
+        self.assertIsNone(queue.get_next_event())
+
+    def test_applies_updates_received_while_subscribing(self):
+        # Controller can send updates after adding the listener
+        # but before the broadcast has the initial model
+        def add_listener_and_update(listener):
+            self.model_listener = listener
+            listener.file_added(ModelFile("c", False))
+            return self.model_files
+        self.controller.get_model_files_and_add_listener.side_effect = add_listener_and_update
+
+        broadcast = ModelBroadcast(self.controller)
+        queue = ModelStreamQueue()
+        files = broadcast.subscribe(queue)
+        self.assertEqual(["a", "b", "c"], [f.name for f in files])
+        self.assertIsNone(queue.get_next_event())
+
+    @patch("web.handler.stream_model.SerializeModel")
+    def test_serializes_each_format_once(self, mock_serialize_model_cls):
+        mock_serialize = mock_serialize_model_cls.return_value
+        mock_serialize.update_event.return_value = "update frame"
+        mock_serialize.patch_event.return_value = "patch frame"
+
+        broadcast = ModelBroadcast(self.controller)
+        queues = [ModelStreamQueue() for _ in range(3)]
+        patch_queues = [ModelStreamQueue(patch=True) for _ in range(3)]
+        for queue in queues + patch_queues:
+            broadcast.subscribe(queue)
+
+        self.model_listener.file_updated(self.model_files[0], ModelFile("a", True))
+        for queue in queues:
+            self.assertEqual("update frame", queue.get_next_event())
+        for queue in patch_queues:
+            self.assertEqual("patch frame", queue.get_next_event())
+        self.assertEqual(1, mock_serialize.update_event.call_count)
+        self.assertEqual(1, mock_serialize.patch_event.call_count)
+
+        # Only patch streams left
+        for queue in queues:
+            broadcast.unsubscribe(queue)
+        self.model_listener.file_updated(self.model_files[0], ModelFile("a", True))
+        for queue in patch_queues:
+            self.assertEqual("patch frame", queue.get_next_event())
+        self.assertEqual(1, mock_serialize.update_event.call_count)
+        self.assertEqual(2, mock_serialize.patch_event.call_count)
+
+    @patch("web.handler.stream_model.SerializeModel")
+    def test_skips_empty_patches(self, mock_serialize_model_cls):
+        mock_serialize = mock_serialize_model_cls.return_value
+        mock_serialize.patch_event.return_value = None
+
+        broadcast = ModelBroadcast(self.controller)
+        queue = ModelStreamQueue(patch=True)
+        broadcast.subscribe(queue)
+        self.model_listener.file_updated(self.model_files[0], ModelFile("a", True))
+        self.assertIsNone(queue.get_next_event())
+
+    @patch("web.handler.stream_model.SerializeModel")
+    def test_serializes_summaries(self, mock_serialize_model_cls):
+        mock_serialize = mock_serialize_model_cls.return_value
+        mock_serialize.update_event.side_effect = lambda e, summary: "summary" if summary else "full"
+        mock_serialize.patch_event.side_effect = lambda e, summary: "patch summary" if summary else "patch"
+
+        broadcast = ModelBroadcast(self.controller)
+        queues = {
+            (patch_, summary): ModelStreamQueue(patch=patch_, summary=summary)
+            for patch_ in (False, True) for summary in (False, True)
+        }
+        for queue in queues.values():
+            broadcast.subscribe(queue)
+
+        self.model_listener.file_updated(self.model_files[0], ModelFile("a", True))
+        self.assertEqual("full", queues[(False, False)].get_next_event())
+        self.assertEqual("summary", queues[(False, True)].get_next_event())
+        self.assertEqual("patch", queues[(True, False)].get_next_event())
+        self.assertEqual("patch summary", queues[(True, True)].get_next_event())
+        self.assertEqual(2, mock_serialize.update_event.call_count)
+        self.assertEqual(2, mock_serialize.patch_event.call_count)
+
+        for queue in queues.values():
+            broadcast.unsubscribe(queue)
+        self.controller.remove_model_listener.assert_called_once_with(self.model_listener)
+
+    def test_resyncs_queue_that_falls_behind(self):
+        broadcast = ModelBroadcast(self.controller)
+        queue = ModelStreamQueue(max_pending_updates=2)
+        broadcast.subscribe(queue)
+        self.model_listener.file_added(ModelFile("c", False))
+        self.model_listener.file_added(ModelFile("d", False))
+        self.assertIsNone(queue.get_resync())
+        self.model_listener.file_added(ModelFile("e", False))
+        # Pending updates are dropped
+        self.assertIsNone(queue.get_next_event())
+        self.assertEqual(["a", "b", "c", "d", "e"], [f.name for f in queue.get_resync()])
+        self.assertIsNone(queue.get_next_event())
+        # Updates resume after the resync
+        self.model_listener.file_added(ModelFile("f", False))
+        self.assertIn('"name": "f"', queue.get_next_event())
+
+
+class TestModelStreamQueue(unittest.TestCase):
+    @staticmethod
+    def __event(change: SerializeModel.UpdateEvent.Change, old_file, new_file):
+        return SerializeModel.UpdateEvent(change, old_file, new_file)
+
+    @staticmethod
+    def __parse(frame: str):
+        out = parse_stream(frame)
+        return out["event"], json.loads(out["data"])
+
+    @staticmethod
+    def __put(queue: ModelStreamQueue, event: SerializeModel.UpdateEvent, frame: Optional[str]) -> bool:
+        # Serializes the event as the given frame
+        serialize = MagicMock()
+        serialize.update_event.return_value = frame
+        serialize.patch_event.return_value = frame
+        return queue.put(ModelUpdate(event, serialize))
+
+    def __update(self, queue: ModelStreamQueue, old_file: ModelFile, new_file: ModelFile):
+        event = self.__event(SerializeModel.UpdateEvent.Change.UPDATED, old_file, new_file)
+        queue.put(ModelUpdate(event, SerializeModel()))
+
+    def test_get_in_order(self):
+        queue = ModelStreamQueue()
+        self.assertIsNone(queue.get_next_event())
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("a", False)), "a")
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("b", False)), "b")
+        self.assertEqual("a", queue.get_next_event())
+        self.assertEqual("b", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+
+    def test_put_notifies_hub(self):
+        queue = ModelStreamQueue()
+        hub = StreamHub()
+        queue.set_hub(hub)
+        self.assertFalse(hub.wait(0))
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("a", False)), "a")
+        self.assertTrue(hub.wait(0))
+
+    def test_skips_invisible_updates(self):
+        queue = ModelStreamQueue(patch=True)
+        hub = StreamHub()
+        queue.set_hub(hub)
+        a = ModelFile("a", False)
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.UPDATED, a, a), None)
+        self.assertIsNone(queue.get_next_event())
+        self.assertEqual(0, queue.get_metrics().depth)
+
+    def test_coalesces_updates_of_same_file(self):
+        queue = ModelStreamQueue()
+        files = []
+        for i in range(5):
+            files.append(ModelFile("a", False))
+            files[-1].local_size = i
+        for i in range(4):
+            self.__update(queue, files[i], files[i + 1])
+        b = ModelFile("b", False)
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, b), "b")
+        event, data = self.__parse(queue.get_next_event())
+        self.assertEqual("model-updated", event)
+        self.assertEqual(0, data["old_file"]["local_size"])
+        self.assertEqual(4, data["new_file"]["local_size"])
+        self.assertEqual("b", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+
+    def test_coalesces_patches(self):
+        queue = ModelStreamQueue(patch=True)
+        old_a = ModelFile("a", False)
+        old_a.local_size = 0
+        mid_a = ModelFile("a", False)
+        mid_a.local_size = 1
+        mid_a.eta = 5
+        new_a = ModelFile("a", False)
+        new_a.local_size = 1
+        new_a.eta = 2
+        for old, new in ((old_a, mid_a), (mid_a, new_a)):
+            event = self.__event(SerializeModel.UpdateEvent.Change.UPDATED, old, new)
+            queue.put(ModelUpdate(event, SerializeModel()))
+        event, data = self.__parse(queue.get_next_event())
+        self.assertEqual("model-patch", event)
+        self.assertEqual([{"op": "replace", "path": [], "fields": {"local_size": 1, "eta": 2}}], data["ops"])
+
+    def test_coalesces_added_and_removed_files(self):
+        queue = ModelStreamQueue()
+        a = ModelFile("a", False)
+        new_a = ModelFile("a", False)
+        new_a.local_size = 100
+        # Added then updated is added
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, a), "added")
+        self.__update(queue, a, new_a)
+        event, data = self.__parse(queue.get_next_event())
+        self.assertEqual("model-added", event)
+        self.assertEqual(100, data["new_file"]["local_size"])
+        # Added then removed is nothing
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("b", False)), "added")
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.REMOVED, ModelFile("b", False), None), "removed")
+        self.assertIsNone(queue.get_next_event())
+        # Updated then removed is removed
+        self.__update(queue, a, new_a)
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.REMOVED, new_a, None), "removed")
+        event, data = self.__parse(queue.get_next_event())
+        self.assertEqual("model-removed", event)
+        self.assertEqual(None, data["old_file"]["local_size"])
+        self.assertEqual(None, data["new_file"])
+        # Removed then added is updated
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.REMOVED, a, None), "removed")
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, new_a), "added")
+        event, data = self.__parse(queue.get_next_event())
+        self.assertEqual("model-updated", event)
+        self.assertEqual(None, data["old_file"]["local_size"])
+        self.assertEqual(100, data["new_file"]["local_size"])
+        self.assertIsNone(queue.get_next_event())
+
+    @timeout_decorator.timeout(5)
+    def test_limits_update_rate_per_file(self):
+        queue = ModelStreamQueue(min_update_interval_in_ms=200)
+        hub = StreamHub()
+        queue.set_hub(hub)
+        files = []
+        for i in range(3):
+            files.append(ModelFile("a", False))
+            files[-1].local_size = i
+        b = ModelFile("b", False)
+        self.__update(queue, files[0], files[1])
+        self.assertIsNotNone(queue.get_next_event())
+        start = time.monotonic()
+        self.__update(queue, files[1], files[2])
+        # Other files are not held back
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, b), "b")
+        self.assertEqual("b", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+        # Hub is woken up when the update is due
+        while True:
+            self.assertTrue(hub.wait(10))
+            frame = queue.get_next_event()
+            if frame is not None:
+                break
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        event, data = self.__parse(frame)
+        self.assertEqual(2, data["new_file"]["local_size"])
+
+    def test_resync_drops_pending_updates(self):
+        queue = ModelStreamQueue()
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("a", False)), "a")
+        files = [ModelFile("b", False)]
+        queue.resync(files)
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("c", False)), "c")
+        # Updates wait for the resync
+        self.assertIsNone(queue.get_next_event())
+        self.assertEqual(files, queue.get_resync())
+        self.assertIsNone(queue.get_resync())
+        self.assertEqual("c", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+
+    def test_overflow(self):
+        queue = ModelStreamQueue(max_pending_updates=2)
+        added = SerializeModel.UpdateEvent.Change.ADDED
+        a = ModelFile("a", False)
+        self.assertTrue(self.__put(queue, self.__event(added, None, a), "a"))
+        self.assertTrue(self.__put(queue, self.__event(added, None, ModelFile("b", False)), "b"))
+        # Files that are already pending are coalesced
+        self.assertTrue(self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.UPDATED, a, a), "a"))
+        self.assertFalse(self.__put(queue, self.__event(added, None, ModelFile("c", False)), "c"))
+        # Pending updates are dropped
+        self.assertIsNone(queue.get_next_event())
+
+    def test_metrics(self):
+        queue = ModelStreamQueue(max_pending_updates=2)
+        added = SerializeModel.UpdateEvent.Change.ADDED
+        a = ModelFile("a", False)
+        self.assertEqual(StreamQueueMetrics(depth=0, drops=0, max_latency_in_ms=0), queue.get_metrics())
+        self.__put(queue, self.__event(added, None, a), "a")
+        self.__put(queue, self.__event(SerializeModel.UpdateEvent.Change.UPDATED, a, a), "a")
+        self.__put(queue, self.__event(added, None, ModelFile("b", False)), "b")
+        self.assertEqual(StreamQueueMetrics(depth=2, drops=1, max_latency_in_ms=0), queue.get_metrics())
+        time.sleep(0.1)
+        queue.get_next_event()
+        self.assertGreaterEqual(queue.get_metrics().max_latency_in_ms, 100)
+        # Overflow drops the pending and the new update
+        self.__put(queue, self.__event(added, None, ModelFile("c", False)), "c")
+        self.__put(queue, self.__event(added, None, ModelFile("d", False)), "d")
+        self.assertEqual(0, queue.get_metrics().depth)
+        self.assertEqual(4, queue.get_metrics().drops)
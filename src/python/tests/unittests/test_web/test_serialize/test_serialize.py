@@ -9,6 +9,9 @@ class DummySerialize(Serialize):
     def dummy(self):
         return self._sse_pack(event="event", data="data")
 
+    def dummy_chunks(self, data):
+        return self._sse_pack_chunks(event="event", data=data)
+
 
 def parse_stream(serialized_str: str):
     parsed = dict()
@@ -17,3 +20,27 @@ def parse_stream(serialized_str: str):
             key, value = line.split(":", maxsplit=1)
             parsed[key.strip()] = value.strip()
     return parsed
+
+
+class TestSerialize(unittest.TestCase):
+    def test_sse_pack_chunks(self):
+        serialize = DummySerialize()
+        chunks = list(serialize.dummy_chunks(["da", "ta"]))
+        self.assertEqual([serialize.dummy().encode()], chunks)
+
+    def test_sse_pack_chunks_splits_large_data(self):
+        serialize = DummySerialize()
+        piece = "x" * 1000
+        chunks = list(serialize.dummy_chunks(piece for _ in range(1000)))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLess(len(chunk), Serialize._SSE_CHUNK_SIZE + len(piece))
+        self.assertEqual(serialize._sse_pack(event="event", data=piece * 1000).encode(), b"".join(chunks))
+
+    def test_sse_pack_chunks_are_lazy(self):
+        serialize = DummySerialize()
+
+        def data():
+            yield "x" * Serialize._SSE_CHUNK_SIZE
+            raise AssertionError("Read past the first chunk")
+        self.assertTrue(next(serialize.dummy_chunks(data())).startswith(b"event: event\ndata: xxx"))
@@ -2,6 +2,7 @@
 
 import unittest
 import json
+from unittest.mock import patch
 from datetime import datetime
 from pytz import timezone
 
@@ -332,3 +333,286 @@ class TestSerializeModel(unittest.TestCase):
         self.assertEqual("c/ca/caa", data[2]["children"][0]["children"][0]["full_path"])
         self.assertEqual("c/ca/cab", data[2]["children"][0]["children"][1]["full_path"])
         self.assertEqual("c/cb", data[2]["children"][1]["full_path"])
+
+    @staticmethod
+    def __patch(serialize: SerializeModel, old_file: ModelFile, new_file: ModelFile):
+        out = serialize.patch_event(SerializeModel.UpdateEvent(
+            SerializeModel.UpdateEvent.Change.UPDATED, old_file, new_file
+        ))
+        if out is None:
+            return None
+        out = parse_stream(out)
+        return out["event"], json.loads(out["data"])
+
+    def test_patch_changed_fields(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        old_a.downloading_speed = 100
+        old_a.eta = 10
+        old_a.local_size = 50
+        new_a = ModelFile("a", True)
+        new_a.downloading_speed = 200
+        new_a.eta = 5
+        new_a.local_size = 50
+        event, data = self.__patch(serialize, old_a, new_a)
+        self.assertEqual("model-patch", event)
+        self.assertEqual("a", data["name"])
+        self.assertEqual([
+            {"op": "replace", "path": [], "fields": {"downloading_speed": 200, "eta": 5}}
+        ], data["ops"])
+
+    def test_patch_changed_fields_are_serialized(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        new_a = ModelFile("a", True)
+        new_a.state = ModelFile.State.DOWNLOADING
+        new_a.local_modified_timestamp = datetime(2018, 11, 9, 21, 40, 18, tzinfo=timezone('UTC'))
+        event, data = self.__patch(serialize, old_a, new_a)
+        self.assertEqual({"state": "downloading", "local_modified_timestamp": "1541799618.0"},
+                         data["ops"][0]["fields"])
+
+    def test_patch_only_changed_children(self):
+        serialize = SerializeModel()
+
+        def build(ba_size: int, bb_size: int):
+            a = ModelFile("a", True)
+            b = ModelFile("b", True)
+            ba = ModelFile("ba", False)
+            ba.local_size = ba_size
+            b.add_child(ba)
+            bb = ModelFile("bb", False)
+            bb.local_size = bb_size
+            b.add_child(bb)
+            a.add_child(b)
+            a.add_child(ModelFile("c", False))
+            return a
+        event, data = self.__patch(serialize, build(10, 20), build(10, 30))
+        self.assertEqual([
+            {"op": "replace", "path": ["b", "bb"], "fields": {"local_size": 30}}
+        ], data["ops"])
+
+    def test_patch_added_and_removed_children(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        old_a.add_child(ModelFile("b", False))
+        old_a.add_child(ModelFile("c", False))
+        new_a = ModelFile("a", True)
+        new_a.add_child(ModelFile("b", False))
+        new_d = ModelFile("d", True)
+        new_d.add_child(ModelFile("da", False))
+        new_a.add_child(new_d)
+        event, data = self.__patch(serialize, old_a, new_a)
+        self.assertEqual(2, len(data["ops"]))
+        add_op, remove_op = data["ops"]
+        self.assertEqual("add", add_op["op"])
+        self.assertEqual(["d"], add_op["path"])
+        self.assertEqual("d", add_op["file"]["name"])
+        self.assertEqual("a/d", add_op["file"]["full_path"])
+        self.assertEqual("da", add_op["file"]["children"][0]["name"])
+        self.assertEqual({"op": "remove", "path": ["c"]}, remove_op)
+
+    def test_patch_without_visible_changes(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        old_a.transferred_size = 10
+        new_a = ModelFile("a", True)
+        new_a.transferred_size = 20
+        self.assertIsNone(self.__patch(serialize, old_a, new_a))
+
+    def test_patch_event_sends_added_and_removed_as_updates(self):
+        serialize = SerializeModel()
+        out = parse_stream(serialize.patch_event(SerializeModel.UpdateEvent(
+            SerializeModel.UpdateEvent.Change.ADDED, None, ModelFile("a", True)
+        )))
+        self.assertEqual("model-added", out["event"])
+        out = parse_stream(serialize.patch_event(SerializeModel.UpdateEvent(
+            SerializeModel.UpdateEvent.Change.REMOVED, ModelFile("a", True), None
+        )))
+        self.assertEqual("model-removed", out["event"])
+
+    def test_model_summary(self):
+        serialize = SerializeModel()
+        a = ModelFile("a", True)
+        a.local_size = 300
+        aa = ModelFile("aa", True)
+        aa.add_child(ModelFile("aaa", False))
+        a.add_child(aa)
+        a.add_child(ModelFile("ab", False))
+        b = ModelFile("b", False)
+        out = parse_stream(serialize.model([a, b], summary=True))
+        self.assertEqual("model-init", out["event"])
+        data = json.loads(out["data"])
+        self.assertEqual(2, len(data))
+        self.assertEqual("a", data[0]["name"])
+        self.assertEqual(300, data[0]["local_size"])
+        self.assertEqual(2, data[0]["children_count"])
+        self.assertNotIn("children", data[0])
+        self.assertEqual(0, data[1]["children_count"])
+
+    def test_update_event_summary(self):
+        serialize = SerializeModel()
+        a = ModelFile("a", True)
+        a.add_child(ModelFile("aa", False))
+        out = parse_stream(serialize.update_event(SerializeModel.UpdateEvent(
+            SerializeModel.UpdateEvent.Change.ADDED, None, a
+        ), summary=True))
+        data = json.loads(out["data"])
+        self.assertEqual(1, data["new_file"]["children_count"])
+        self.assertNotIn("children", data["new_file"])
+
+    def test_patch_summary(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        old_a.local_size = 10
+        old_aa = ModelFile("aa", False)
+        old_aa.local_size = 10
+        old_a.add_child(old_aa)
+        new_a = ModelFile("a", True)
+        new_a.local_size = 30
+        new_aa = ModelFile("aa", False)
+        new_aa.local_size = 20
+        new_a.add_child(new_aa)
+        new_a.add_child(ModelFile("ab", False))
+        out = parse_stream(serialize.patch_event(SerializeModel.UpdateEvent(
+            SerializeModel.UpdateEvent.Change.UPDATED, old_a, new_a
+        ), summary=True))
+        data = json.loads(out["data"])
+        # Changes to children are folded into the root
+        self.assertEqual([
+            {"op": "replace", "path": [], "fields": {"local_size": 30, "children_count": 2}}
+        ], data["ops"])
+
+    def test_patch_summary_without_visible_changes(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        old_aa = ModelFile("aa", False)
+        old_aa.local_size = 10
+        old_a.add_child(old_aa)
+        new_a = ModelFile("a", True)
+        new_aa = ModelFile("aa", False)
+        new_aa.local_size = 20
+        new_a.add_child(new_aa)
+        self.assertIsNone(serialize.patch_event(SerializeModel.UpdateEvent(
+            SerializeModel.UpdateEvent.Change.UPDATED, old_a, new_a
+        ), summary=True))
+
+    def test_subtree(self):
+        serialize = SerializeModel()
+        a = ModelFile("a", True)
+        for i in range(5):
+            child = ModelFile("a{}".format(i), True)
+            child.add_child(ModelFile("x", False))
+            a.add_child(child)
+        data = json.loads(serialize.subtree(a, offset=1, limit=2))
+        self.assertEqual("a", data["name"])
+        self.assertEqual(5, data["children_count"])
+        self.assertEqual(1, data["children_offset"])
+        self.assertEqual(["a1", "a2"], [c["name"] for c in data["children"]])
+        self.assertEqual(1, data["children"][0]["children_count"])
+        self.assertNotIn("children", data["children"][0])
+
+    @staticmethod
+    def __json_dict(model_file: ModelFile, full_path: str) -> dict:
+        def timestamp(ts):
+            return str(ts.timestamp()) if ts else None
+        return {
+            "name": model_file.name,
+            "is_dir": model_file.is_dir,
+            "state": model_file.state.name.lower(),
+            "remote_size": model_file.remote_size,
+            "local_size": model_file.local_size,
+            "downloading_speed": model_file.downloading_speed,
+            "eta": model_file.eta,
+            "is_extractable": model_file.is_extractable,
+            "local_created_timestamp": timestamp(model_file.local_created_timestamp),
+            "local_modified_timestamp": timestamp(model_file.local_modified_timestamp),
+            "remote_created_timestamp": timestamp(model_file.remote_created_timestamp),
+            "remote_modified_timestamp": timestamp(model_file.remote_modified_timestamp),
+            "full_path": full_path,
+            "children": [
+                TestSerializeModel.__json_dict(c, full_path + "/" + c.name) for c in model_file.get_children()
+            ]
+        }
+
+    def test_model_encoding(self):
+        serialize = SerializeModel()
+        a = ModelFile("a \"quoted\" \\ name\n\t\x01", True)
+        a.state = ModelFile.State.DOWNLOADING
+        a.remote_size = 2**40
+        a.local_size = 0
+        a.downloading_speed = 100
+        a.eta = 0
+        a.is_extractable = True
+        a.local_created_timestamp = datetime(2018, 11, 9, 21, 40, 18, 123456, tzinfo=timezone('UTC'))
+        a.local_modified_timestamp = datetime(2018, 11, 9, 21, 40, 18, tzinfo=timezone('UTC'))
+        a.remote_created_timestamp = datetime(1965, 1, 2, 3, 4, 5, 6, tzinfo=timezone('UTC'))
+        a.remote_modified_timestamp = datetime(2018, 11, 9, 21, 40, 18, 1, tzinfo=timezone('UTC'))
+        aa = ModelFile("ünicode ☃ \U0001F600", True)
+        aa.add_child(ModelFile("aaa", False))
+        a.add_child(aa)
+        a.add_child(ModelFile("ab", False))
+        b = ModelFile("b", False)
+        for state in ModelFile.State:
+            b.state = state
+            files = [a, b]
+            out = parse_stream(serialize.model(files))
+            self.assertTrue(out["data"].isascii())
+            self.assertEqual([self.__json_dict(f, f.name) for f in files], json.loads(out["data"]))
+            out = parse_stream(serialize.update_event(SerializeModel.UpdateEvent(
+                SerializeModel.UpdateEvent.Change.UPDATED, b, a
+            )))
+            self.assertEqual({
+                "old_file": self.__json_dict(b, "b"),
+                "new_file": self.__json_dict(a, a.name)
+            }, json.loads(out["data"]))
+
+    def test_model_encoding_of_deep_trees(self):
+        serialize = SerializeModel()
+        a = ModelFile("a", True)
+        parent = a
+        for i in range(400):
+            child = ModelFile("d{}".format(i), True)
+            parent.add_child(child)
+            parent = child
+        out = parse_stream(serialize.model([a]))
+        data = json.loads(out["data"])
+        for i in range(400):
+            data = data[0] if i == 0 else data["children"][0]
+        self.assertEqual("d398", data["name"])
+        self.assertEqual("a/" + "/".join("d{}".format(i) for i in range(399)), data["full_path"])
+
+    def test_patch_encoding_without_orjson(self):
+        serialize = SerializeModel()
+        old_a = ModelFile("a", True)
+        new_a = ModelFile("a", True)
+        new_a.eta = 5
+        aa = ModelFile("ünicode", False)
+        new_a.add_child(aa)
+        patched = self.__patch(serialize, old_a, new_a)
+        with patch("web.serialize.serialize_model.orjson", None):
+            self.assertEqual(patched, self.__patch(serialize, old_a, new_a))
+        self.assertEqual("ünicode", patched[1]["ops"][1]["file"]["name"])
+
+    def test_model_chunks(self):
+        serialize = SerializeModel()
+        files = []
+        for i in range(100):
+            a = ModelFile("a{}".format(i), True)
+            a.local_size = i
+            for j in range(50):
+                a.add_child(ModelFile("ünicode {}".format(j), False))
+            files.append(a)
+        chunks = list(serialize.model_chunks(files))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(serialize.model(files).encode(), b"".join(chunks))
+        chunks = list(serialize.model_chunks(files, summary=True))
+        out = parse_stream(b"".join(chunks).decode())
+        self.assertEqual("model-init", out["event"])
+        self.assertEqual(json.loads(parse_stream(serialize.model(files, summary=True))["data"]),
+                         json.loads(out["data"]))
+
+    def test_model_chunks_of_empty_model(self):
+        serialize = SerializeModel()
+        self.assertEqual(serialize.model([]).encode(), b"".join(serialize.model_chunks([])))
+        self.assertEqual(serialize.model([], summary=True).encode(),
+                         b"".join(serialize.model_chunks([], summary=True)))
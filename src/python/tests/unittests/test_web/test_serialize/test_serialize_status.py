@@ -8,6 +8,7 @@ from pytz import timezone
 from .test_serialize import parse_stream
 from common import Status
 from web.serialize import SerializeStatus
+from web.utils import StreamQueueMetrics
 
 
 class TestSerializeStatus(unittest.TestCase):
@@ -97,3 +98,36 @@ class TestSerializeStatus(unittest.TestCase):
         out = parse_stream(serialize.status(status))
         data = json.loads(out["data"])
         self.assertEqual("remote server went boom", data["controller"]["latest_remote_scan_error"])
+
+    def test_controller_status_scan_intervals(self):
+        serialize = SerializeStatus()
+        status = Status()
+        out = parse_stream(serialize.status(status))
+        data = json.loads(out["data"])
+        self.assertIsNone(data["controller"]["local_scan_interval_ms"])
+        self.assertIsNone(data["controller"]["remote_scan_interval_ms"])
+
+        status.controller.local_scan_interval_ms = 20000
+        status.controller.remote_scan_interval_ms = 120000
+        out = parse_stream(serialize.status(status))
+        data = json.loads(out["data"])
+        self.assertEqual(20000, data["controller"]["local_scan_interval_ms"])
+        self.assertEqual(120000, data["controller"]["remote_scan_interval_ms"])
+
+    def test_web_status_stream_queues(self):
+        serialize = SerializeStatus()
+        status = Status()
+        out = parse_stream(serialize.status(status))
+        data = json.loads(out["data"])
+        self.assertEqual([], data["web"]["stream_queues"])
+
+        status.web.stream_queues = (
+            ("model", StreamQueueMetrics(depth=3, drops=10, max_latency_in_ms=1500)),
+            ("log", StreamQueueMetrics(depth=0, drops=0, max_latency_in_ms=2))
+        )
+        out = parse_stream(serialize.status(status))
+        data = json.loads(out["data"])
+        self.assertEqual([
+            {"name": "model", "depth": 3, "drops": 10, "max_latency_ms": 1500},
+            {"name": "log", "depth": 0, "drops": 0, "max_latency_ms": 2}
+        ], data["web"]["stream_queues"])
@@ -0,0 +1,143 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+import unittest
+from threading import Timer
+import time
+
+import timeout_decorator
+
+from web.utils import StreamHub, StreamQueue, StreamQueueMetrics, StreamOverflowError
+
+
+class TestStreamHub(unittest.TestCase):
+    def test_wait_times_out(self):
+        hub = StreamHub()
+        start = time.time()
+        self.assertFalse(hub.wait(0.1))
+        self.assertGreaterEqual(time.time() - start, 0.1)
+
+    @timeout_decorator.timeout(5)
+    def test_notify_wakes_up_wait(self):
+        hub = StreamHub()
+        Timer(0.1, hub.notify).start()
+        self.assertTrue(hub.wait(10))
+
+    def test_notify_before_wait_is_not_lost(self):
+        hub = StreamHub()
+        hub.notify()
+        hub.notify()
+        self.assertTrue(hub.wait(10))
+        # Notifications are consumed by the wait
+        self.assertFalse(hub.wait(0))
+
+    @timeout_decorator.timeout(5)
+    def test_notify_at_wakes_up_wait_at_deadline(self):
+        hub = StreamHub()
+        start = time.monotonic()
+        hub.notify_at(start + 0.2)
+        self.assertTrue(hub.wait(10))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        # Scheduled notifications are consumed by the wait
+        self.assertFalse(hub.wait(0))
+
+    @timeout_decorator.timeout(5)
+    def test_notify_at_shortens_ongoing_wait(self):
+        hub = StreamHub()
+        Timer(0.1, lambda: hub.notify_at(time.monotonic() + 0.1)).start()
+        self.assertTrue(hub.wait(10))
+
+    def test_notify_at_keeps_earliest_deadline(self):
+        hub = StreamHub()
+        now = time.monotonic()
+        hub.notify_at(now - 1)
+        hub.notify_at(now + 100)
+        self.assertTrue(hub.wait(0))
+
+
+class TestStreamQueue(unittest.TestCase):
+    def test_put_and_get(self):
+        queue = StreamQueue()
+        self.assertIsNone(queue.get_next_event())
+        queue.put("a")
+        queue.put("b")
+        self.assertEqual("a", queue.get_next_event())
+        self.assertEqual("b", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+
+    def test_put_notifies_hub(self):
+        queue = StreamQueue()
+        hub = StreamHub()
+        queue.set_hub(hub)
+        self.assertFalse(hub.wait(0))
+        queue.put("a")
+        self.assertTrue(hub.wait(0))
+        self.assertEqual("a", queue.get_next_event())
+
+    def test_drop_oldest(self):
+        queue = StreamQueue(max_size=2)
+        for event in ("a", "b", "c"):
+            queue.put(event)
+        self.assertEqual("b", queue.get_next_event())
+        self.assertEqual("c", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+        self.assertEqual(1, queue.get_metrics().drops)
+
+    def test_unbounded(self):
+        queue = StreamQueue()
+        for i in range(10000):
+            queue.put(i)
+        self.assertEqual(StreamQueueMetrics(depth=10000, drops=0, max_latency_in_ms=0), queue.get_metrics())
+
+    def test_coalesce_by_key(self):
+        queue = StreamQueue(max_size=2, overflow_policy=StreamQueue.OverflowPolicy.COALESCE, key=lambda e: e[0])
+        for event in ("a1", "b1", "a2", "b2"):
+            queue.put(event)
+        # Events keep the position of the first event with their key
+        self.assertEqual("a2", queue.get_next_event())
+        queue.put("a3")
+        queue.put("c1")
+        # Oldest event is dropped when the queue is still full
+        self.assertEqual("a3", queue.get_next_event())
+        self.assertEqual("c1", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+        self.assertEqual(3, queue.get_metrics().drops)
+
+    def test_coalesce_without_key_keeps_latest(self):
+        queue = StreamQueue(overflow_policy=StreamQueue.OverflowPolicy.COALESCE)
+        for event in ("a", "b", "c"):
+            queue.put(event)
+        self.assertEqual(1, queue.get_metrics().depth)
+        self.assertEqual("c", queue.get_next_event())
+        self.assertIsNone(queue.get_next_event())
+
+    def test_disconnect(self):
+        queue = StreamQueue(max_size=2, overflow_policy=StreamQueue.OverflowPolicy.DISCONNECT)
+        hub = StreamHub()
+        queue.set_hub(hub)
+        queue.put("a")
+        queue.put("b")
+        self.assertEqual("a", queue.get_next_event())
+        queue.put("c")
+        queue.put("d")
+        self.assertTrue(hub.wait(0))
+        with self.assertRaises(StreamOverflowError):
+            queue.get_next_event()
+        # Queue stays disconnected
+        queue.put("e")
+        with self.assertRaises(StreamOverflowError):
+            queue.get_next_event()
+        self.assertEqual(StreamQueueMetrics(depth=0, drops=3, max_latency_in_ms=0), queue.get_metrics())
+
+    def test_metrics(self):
+        queue = StreamQueue()
+        self.assertEqual(StreamQueueMetrics(depth=0, drops=0, max_latency_in_ms=0), queue.get_metrics())
+        queue.put("a")
+        queue.put("b")
+        self.assertEqual(2, queue.get_metrics().depth)
+        time.sleep(0.1)
+        queue.get_next_event()
+        queue.get_next_event()
+        metrics = queue.get_metrics()
+        self.assertEqual(0, metrics.depth)
+        self.assertGreaterEqual(metrics.max_latency_in_ms, 100)
+        self.assertLess(metrics.max_latency_in_ms, 5000)
@@ -0,0 +1,56 @@
+# Copyright 2017, Inderpreet Singh, All rights reserved.
+
+from urllib.parse import unquote
+
+from bottle import HTTPResponse, request
+
+from common import overrides
+from controller import Controller
+from ..web_app import IHandler, WebApp
+from ..serialize import SerializeModel
+
+
+class ModelHandler(IHandler):
+    """
+    Serves the subtrees of model files
+    Used by clients that stream summaries of the model to expand files on demand
+    """
+    _DEFAULT_LIMIT = 1000
+
+    def __init__(self, controller: Controller):
+        self.__controller = controller
+        self.__serialize = SerializeModel()
+
+    @overrides(IHandler)
+    def add_routes(self, web_app: WebApp):
+        web_app.add_handler("/server/model/file/<full_path:path>", self.__handle_get_file)
+
+    def __handle_get_file(self, full_path: str):
+        """
+        Get a file and a page of its children
+        Query params 'offset' and 'limit' select the page of children
+        :param full_path:
+        :return:
+        """
+        # value is double encoded
+        full_path = unquote(full_path)
+
+        try:
+            offset = int(request.query.get("offset", 0))
+            limit = int(request.query.get("limit", ModelHandler._DEFAULT_LIMIT))
+        except ValueError:
+            return HTTPResponse(body="Invalid offset or limit", status=400)
+        if offset < 0 or limit < 0:
+            return HTTPResponse(body="Invalid offset or limit", status=400)
+
+        names = full_path.split("/")
+        model_file = self.__controller.get_model_file(names[0])
+        for name in names[1:]:
+            if model_file is None:
+                break
+            model_file = model_file.get_child(name)
+        if model_file is None:
+            return HTTPResponse(body="File '{}' not found".format(full_path), status=404)
+
+        out_json = self.__serialize.subtree(model_file, offset, limit)
+        return HTTPResponse(body=out_json)
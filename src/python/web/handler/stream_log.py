@@ -1,13 +1,13 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 import logging
-from typing import Optional, List
+from typing import Optional, List, Dict
 import time
 import copy
 from threading import Lock
 
 from ..web_app import IStreamHandler
-from ..utils import StreamQueue
+from ..utils import StreamQueue, StreamHub, StreamQueueMetrics
 from ..serialize import SerializeLogRecord
 from common import overrides
 
@@ -60,10 +60,13 @@ class CachedQueueLogHandler(logging.Handler):
 class QueueLogHandler(logging.Handler, StreamQueue[logging.LogRecord]):
     """
     A log handler that stored records in a thread-safe queue
+    The oldest records are dropped if the queue is full
     """
-    def __init__(self):
+    def __init__(self, max_size: Optional[int] = None):
         logging.Handler.__init__(self)
-        StreamQueue.__init__(self)
+        StreamQueue.__init__(self,
+                             max_size=max_size,
+                             overflow_policy=StreamQueue.OverflowPolicy.DROP_OLDEST)
 
     @overrides(logging.Handler)
     def emit(self, record):
@@ -81,9 +84,9 @@ class LogStreamHandler(IStreamHandler):
     # Cache of logs
     _cache = None
 
-    def __init__(self, logger: logging.Logger):
+    def __init__(self, logger: logging.Logger, max_queue_size: Optional[int] = None):
         self.logger = logger
-        self.handler = QueueLogHandler()
+        self.handler = QueueLogHandler(max_size=max_queue_size)
         self.serialize = SerializeLogRecord()
 
     # noinspection PyUnresolvedReferences
@@ -98,6 +101,10 @@ class LogStreamHandler(IStreamHandler):
 
         super().register(web_app=web_app, **kwargs)
 
+    @overrides(IStreamHandler)
+    def set_hub(self, hub: StreamHub):
+        self.handler.set_hub(hub)
+
     @overrides(IStreamHandler)
     def setup(self):
         # Send out all the cached records first
@@ -117,3 +124,7 @@ class LogStreamHandler(IStreamHandler):
     @overrides(IStreamHandler)
     def cleanup(self):
         self.logger.removeHandler(self.handler)
+
+    @overrides(IStreamHandler)
+    def get_queue_metrics(self) -> Dict[str, StreamQueueMetrics]:
+        return {"log": self.handler.get_metrics()}
@@ -1,67 +1,394 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple, Union
+from threading import Lock
+import time
+
+import bottle
 
 from ..web_app import IStreamHandler
-from ..utils import StreamQueue
+from ..utils import StreamHub, StreamQueueMetrics
 from ..serialize import SerializeModel
 from model import IModelListener, ModelFile
 from common import overrides
 from controller import Controller
 
 
-class WebResponseModelListener(IModelListener, StreamQueue[SerializeModel.UpdateEvent]):
+class ModelUpdate:
+    """
+    A model update shared by the streams it is queued for
+    The update is serialized on first use for each stream format, in the
+    context of the stream that sends it, and the frame is shared by all the
+    streams that use the same format.
+    """
+    def __init__(self, event: SerializeModel.UpdateEvent, serialize: SerializeModel):
+        self.event = event
+        self.__serialize = serialize
+        self.__lock = Lock()
+        self.__frames = dict()  # type: Dict[Tuple[bool, bool], Optional[str]]
+
+    def get_frame(self, patch: bool, summary: bool) -> Optional[str]:
+        """
+        Returns the update serialized for the given format
+        :param patch: serialize as a patch
+        :param summary: serialize summaries of the files
+        :return: None if nothing visible to clients changed
+        """
+        stream_format = (patch, summary)
+        with self.__lock:
+            if stream_format not in self.__frames:
+                if patch:
+                    frame = self.__serialize.patch_event(self.event, summary)
+                else:
+                    frame = self.__serialize.update_event(self.event, summary)
+                self.__frames[stream_format] = frame
+            return self.__frames[stream_format]
+
+
+class ModelStreamQueue:
+    """
+    Queue of the model updates for one stream
+    Updates are coalesced by file name, so a stream that falls behind only
+    sends the latest state of each file instead of every intermediate one.
+    Updates of a file are sent at most once per min update interval.
+    If more files than max pending updates are waiting to be sent, the
+    pending updates are dropped and the stream is resynced with the whole
+    model instead.
+    """
+    def __init__(self,
+                 patch: bool = False,
+                 summary: bool = False,
+                 min_update_interval_in_ms: int = 0,
+                 max_pending_updates: Optional[int] = None):
+        """
+        :param patch: send updates as patches
+        :param summary: send summaries of the files instead of their children
+        :param min_update_interval_in_ms: min time between updates of the same file
+        :param max_pending_updates: max number of files with pending updates, None for no limit
+        """
+        self.patch = patch
+        self.summary = summary
+        self.__serialize = SerializeModel()
+        self.__min_update_interval_in_secs = min_update_interval_in_ms / 1000
+        self.__max_pending_updates = max_pending_updates
+        self.__lock = Lock()
+        self.__hub = None
+        # name -> (time.monotonic() time first queued, update)
+        self.__pending = OrderedDict()  # type: Dict[str, Tuple[float, ModelUpdate]]
+        self.__update_times = dict()  # name -> time.monotonic() time the last update was sent
+        self.__resync_files = None
+        self.__drops = 0
+        self.__max_latency_in_secs = 0
+
+    def set_hub(self, hub: Optional[StreamHub]):
+        self.__hub = hub
+
+    def put(self, update: ModelUpdate) -> bool:
+        """
+        Queue a model update
+        The update is serialized when it's sent, not when it's queued
+        :param update:
+        :return: False if the queue overflowed and needs a resync
+        """
+        event = update.event
+        name = (event.new_file or event.old_file).name
+        now = time.monotonic()
+        with self.__lock:
+            pending = self.__pending.get(name)
+            if pending is not None:
+                self.__drops += 1
+                merged = ModelStreamQueue.__merge(pending[1].event, event)
+                if merged is None:
+                    del self.__pending[name]
+                else:
+                    # Coalesced updates are serialized only for this stream
+                    self.__pending[name] = (pending[0], ModelUpdate(merged, self.__serialize))
+            elif self.__max_pending_updates is not None and len(self.__pending) >= self.__max_pending_updates:
+                self.__drops += len(self.__pending) + 1
+                self.__pending.clear()
+                return False
+            else:
+                self.__pending[name] = (now, update)
+        self.__notify()
+        return True
+
+    def resync(self, model_files: List[ModelFile]):
+        """
+        Drop the pending updates and send the given model instead
+        :param model_files:
+        :return:
+        """
+        with self.__lock:
+            self.__drops += len(self.__pending)
+            self.__pending.clear()
+            self.__resync_files = model_files
+        self.__notify()
+
+    def get_resync(self) -> Optional[List[ModelFile]]:
+        """
+        Returns the model to resync with if there is one, otherwise returns None
+        Updates returned by get_next_event() after this apply to this model
+        :return:
+        """
+        with self.__lock:
+            model_files = self.__resync_files
+            self.__resync_files = None
+            return model_files
+
+    def get_next_event(self) -> Optional[str]:
+        """
+        Returns the next serialized update that is due, otherwise returns None
+        :return:
+        """
+        while True:
+            with self.__lock:
+                if self.__resync_files is not None:
+                    # Pending updates apply to the resynced model
+                    return None
+                now = time.monotonic()
+                next_time = None
+                for name, (put_time, update) in self.__pending.items():
+                    if update.event.change == SerializeModel.UpdateEvent.Change.UPDATED and name in self.__update_times:
+                        update_time = self.__update_times[name] + self.__min_update_interval_in_secs
+                        if update_time > now:
+                            next_time = update_time if next_time is None else min(next_time, update_time)
+                            continue
+                    break
+                else:
+                    if next_time is not None and self.__hub is not None:
+                        self.__hub.notify_at(next_time)
+                    return None
+                del self.__pending[name]
+                self.__max_latency_in_secs = max(self.__max_latency_in_secs, now - put_time)
+                if update.event.change == SerializeModel.UpdateEvent.Change.REMOVED:
+                    self.__update_times.pop(name, None)
+            # Serialize outside the lock so that puts from the controller are not blocked
+            frame = update.get_frame(self.patch, self.summary)
+            if frame is not None:
+                if self.__min_update_interval_in_secs > 0 and \
+                        update.event.change != SerializeModel.UpdateEvent.Change.REMOVED:
+                    with self.__lock:
+                        self.__update_times[name] = now
+                return frame
+
+    def get_metrics(self) -> StreamQueueMetrics:
+        with self.__lock:
+            return StreamQueueMetrics(depth=len(self.__pending),
+                                      drops=self.__drops,
+                                      max_latency_in_ms=int(self.__max_latency_in_secs * 1000))
+
+    def __notify(self):
+        hub = self.__hub
+        if hub is not None:
+            hub.notify()
+
+    @staticmethod
+    def __merge(pending: SerializeModel.UpdateEvent,
+                event: SerializeModel.UpdateEvent) -> Optional[SerializeModel.UpdateEvent]:
+        """
+        Merge two consecutive events of the same file into one
+        :return: None if the events cancel out
+        """
+        change = SerializeModel.UpdateEvent.Change
+        if pending.change == change.ADDED:
+            if event.change == change.REMOVED:
+                # Stream never sent the file
+                return None
+            return SerializeModel.UpdateEvent(change.ADDED, None, event.new_file)
+        if event.change == change.REMOVED:
+            return SerializeModel.UpdateEvent(change.REMOVED, pending.old_file, None)
+        # Stream still has the old file if it was removed and added again
+        return SerializeModel.UpdateEvent(change.UPDATED, pending.old_file, event.new_file)
+
+
+class ModelBroadcastListener(IModelListener):
     """
-    Model listener used by streams to listen to model updates
-    One listener should be created for each new request
+    Model listener shared by all the model streams
+    The listener is called by the controller while it holds the model, so it
+    only queues the changes. Each change is serialized by the first stream that
+    sends it, once per format, and the frame is shared with the other streams.
+    The listener keeps its own copy of the model files so that new streams
+    start from a model that is consistent with the frames they receive.
     """
     def __init__(self):
-        super().__init__()
+        self.__serialize = SerializeModel()
+        self.__lock = Lock()
+        self.__files = None  # name -> file, None until initialized
+        self.__pending_events = []  # events received before initialization
+        self.__queues = []  # type: List[ModelStreamQueue]
+
+    def initialize(self, model_files: List[ModelFile]):
+        """
+        Set the model files that the listener was added with
+        Any events received in the meantime are applied on top
+        :param model_files:
+        :return:
+        """
+        with self.__lock:
+            self.__files = {f.name: f for f in model_files}
+            for event in self.__pending_events:
+                self.__apply(event)
+            self.__pending_events = []
+
+    def subscribe(self, queue: ModelStreamQueue) -> List[ModelFile]:
+        """
+        Start queueing model updates for the given queue
+        :param queue:
+        :return: the model files that the updates apply to
+        """
+        with self.__lock:
+            self.__queues.append(queue)
+            return list(self.__files.values())
+
+    def unsubscribe(self, queue: ModelStreamQueue) -> bool:
+        """
+        Stop queueing model updates for the given queue
+        :param queue:
+        :return: True if there are no subscribers left
+        """
+        with self.__lock:
+            if queue in self.__queues:
+                self.__queues.remove(queue)
+            return not self.__queues
 
     @overrides(IModelListener)
     def file_added(self, file: ModelFile):
-        self.put(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.ADDED,
-                                            old_file=None,
-                                            new_file=file))
+        self.__broadcast(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.ADDED,
+                                                    old_file=None,
+                                                    new_file=file))
 
     @overrides(IModelListener)
     def file_removed(self, file: ModelFile):
-        self.put(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.REMOVED,
-                                            old_file=file,
-                                            new_file=None))
+        self.__broadcast(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.REMOVED,
+                                                    old_file=file,
+                                                    new_file=None))
 
     @overrides(IModelListener)
     def file_updated(self, old_file: ModelFile, new_file: ModelFile):
-        self.put(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.UPDATED,
-                                            old_file=old_file,
-                                            new_file=new_file))
+        self.__broadcast(SerializeModel.UpdateEvent(change=SerializeModel.UpdateEvent.Change.UPDATED,
+                                                    old_file=old_file,
+                                                    new_file=new_file))
 
+    def __broadcast(self, event: SerializeModel.UpdateEvent):
+        with self.__lock:
+            if self.__files is None:
+                self.__pending_events.append(event)
+                return
+            self.__apply(event)
+            update = ModelUpdate(event, self.__serialize)
+            for queue in self.__queues:
+                if not queue.put(update):
+                    queue.resync(list(self.__files.values()))
 
-class ModelStreamHandler(IStreamHandler):
+    def __apply(self, event: SerializeModel.UpdateEvent):
+        if event.change == SerializeModel.UpdateEvent.Change.REMOVED:
+            self.__files.pop(event.old_file.name, None)
+        else:
+            self.__files[event.new_file.name] = event.new_file
+
+
+class ModelBroadcast:
+    """
+    Shares a single model listener between all the model streams
+    The listener is added to the controller when the first stream subscribes,
+    and removed when the last stream unsubscribes.
+    """
     def __init__(self, controller: Controller):
-        self.controller = controller
+        self.__controller = controller
+        self.__lock = Lock()
+        self.__listener = None
+
+    def subscribe(self, queue: ModelStreamQueue) -> List[ModelFile]:
+        """
+        Start sending model updates to the given queue
+        :param queue:
+        :return: the model files that the updates apply to
+        """
+        with self.__lock:
+            if self.__listener is None:
+                listener = ModelBroadcastListener()
+                listener.initialize(self.__controller.get_model_files_and_add_listener(listener))
+                self.__listener = listener
+            return self.__listener.subscribe(queue)
+
+    def unsubscribe(self, queue: ModelStreamQueue):
+        with self.__lock:
+            if self.__listener is not None and self.__listener.unsubscribe(queue):
+                self.__controller.remove_model_listener(self.__listener)
+                self.__listener = None
+
+
+class ModelStreamHandler(IStreamHandler):
+    """
+    Streams the model
+    Clients that connect with the "model_patch" query parameter set receive
+    updates as patches of the changed fields instead of the full files.
+    Clients that connect with the "model_summary" query parameter set receive
+    summaries of the root files without their children. Subtrees can be
+    fetched from the model handler on demand.
+    """
+    __PARAM_PATCH = "model_patch"
+    __PARAM_SUMMARY = "model_summary"
+
+    def __init__(self,
+                 broadcast: ModelBroadcast,
+                 min_update_interval_in_ms: int = 0,
+                 max_pending_updates: Optional[int] = None):
+        """
+        :param broadcast:
+        :param min_update_interval_in_ms: min time between updates of the same file
+        :param max_pending_updates: max number of files with pending updates before
+                                    the stream is resynced, None for no limit
+        """
+        self.broadcast = broadcast
+        self.min_update_interval_in_ms = min_update_interval_in_ms
+        self.max_pending_updates = max_pending_updates
         self.serialize = SerializeModel()
-        self.model_listener = WebResponseModelListener()
-        self.initial_model_files = None
-        self.first_run = True
+        self.hub = None
+        self.update_queue = None
+        self.model_chunks = None
+        self.summary = False
+
+    @overrides(IStreamHandler)
+    def set_hub(self, hub: StreamHub):
+        self.hub = hub
 
     @overrides(IStreamHandler)
     def setup(self):
-        self.initial_model_files = self.controller.get_model_files_and_add_listener(self.model_listener)
+        # Setup is called in the context of the stream request
+        patch = bottle.request.query.get(ModelStreamHandler.__PARAM_PATCH) == "1"
+        self.summary = bottle.request.query.get(ModelStreamHandler.__PARAM_SUMMARY) == "1"
+        update_queue = ModelStreamQueue(patch=patch,
+                                        summary=self.summary,
+                                        min_update_interval_in_ms=self.min_update_interval_in_ms,
+                                        max_pending_updates=self.max_pending_updates)
+        update_queue.set_hub(self.hub)
+        initial_model_files = self.broadcast.subscribe(update_queue)
+        self.update_queue = update_queue
+        # The model can be large, so it's serialized as the chunks are sent
+        self.model_chunks = self.serialize.model_chunks(initial_model_files, self.summary)
 
     @overrides(IStreamHandler)
-    def get_value(self) -> Optional[str]:
-        if self.first_run:
-            self.first_run = False
-            return self.serialize.model(self.initial_model_files)
-        else:
-            event = self.model_listener.get_next_event()
-            if event is not None:
-                return self.serialize.update_event(event)
-            else:
-                return None
+    def get_value(self) -> Optional[Union[str, bytes]]:
+        if self.model_chunks is None:
+            # Streams that fell too far behind are sent the whole model again
+            resync_model_files = self.update_queue.get_resync()
+            if resync_model_files is not None:
+                self.model_chunks = self.serialize.model_chunks(resync_model_files, self.summary)
+        if self.model_chunks is not None:
+            chunk = next(self.model_chunks, None)
+            if chunk is not None:
+                return chunk
+            self.model_chunks = None
+        return self.update_queue.get_next_event()
 
     @overrides(IStreamHandler)
     def cleanup(self):
-        if self.model_listener:
-            self.controller.remove_model_listener(self.model_listener)
+        if self.update_queue is not None:
+            self.broadcast.unsubscribe(self.update_queue)
+
+    @overrides(IStreamHandler)
+    def get_queue_metrics(self) -> Dict[str, StreamQueueMetrics]:
+        update_queue = self.update_queue
+        return {"model": update_queue.get_metrics()} if update_queue is not None else dict()
@@ -1,19 +1,20 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from typing import Optional
+from typing import Optional, Dict
 
 from ..web_app import IStreamHandler
 from ..serialize import SerializeStatus
-from ..utils import StreamQueue
+from ..utils import StreamQueue, StreamHub, StreamQueueMetrics
 from common import overrides, Status, IStatusListener
 
 
 class StatusListener(IStatusListener, StreamQueue[Status]):
     """
     Status listener used by status streams to listen to status updates
+    Each status is a full copy, so only the latest one is kept
     """
     def __init__(self, status: Status):
-        super().__init__()
+        super().__init__(overflow_policy=StreamQueue.OverflowPolicy.COALESCE)
         self.__status = status
 
     @overrides(IStatusListener)
@@ -28,6 +29,10 @@ class StatusStreamHandler(IStreamHandler):
         self.status_listener = StatusListener(status)
         self.first_run = True
 
+    @overrides(IStreamHandler)
+    def set_hub(self, hub: StreamHub):
+        self.status_listener.set_hub(hub)
+
     @overrides(IStreamHandler)
     def setup(self):
         self.status.add_listener(self.status_listener)
@@ -49,3 +54,7 @@ class StatusStreamHandler(IStreamHandler):
     def cleanup(self):
         if self.status_listener:
             self.status.remove_listener(self.status_listener)
+
+    @overrides(IStreamHandler)
+    def get_queue_metrics(self) -> Dict[str, StreamQueueMetrics]:
+        return {"status": self.status_listener.get_metrics()}
@@ -1,12 +1,16 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
 from abc import ABC
+from typing import Iterable, Iterator
 
 
 class Serialize(ABC):
     """
     Base class for SSE serialization
     """
+    # Approximate size of the chunks that large frames are sent in
+    _SSE_CHUNK_SIZE = 64 * 1024
+
     # noinspection PyMethodMayBeStatic
     def _sse_pack(self, event: str, data: str) -> str:
         """Pack data in SSE format"""
@@ -15,3 +19,25 @@ class Serialize(ABC):
         buffer += "data: %s\n" % data
         buffer += "\n"
         return buffer
+
+    # noinspection PyMethodMayBeStatic
+    def _sse_pack_chunks(self, event: str, data: Iterable[str]) -> Iterator[bytes]:
+        """
+        Pack data in SSE format as encoded chunks
+        The data is consumed as the chunks are read, so the frame is never
+        held in memory as a whole
+        :param event:
+        :param data: pieces of the data, must not contain newlines
+        :return:
+        """
+        buffer = ["event: %s\ndata: " % event]
+        size = len(buffer[0])
+        for piece in data:
+            buffer.append(piece)
+            size += len(piece)
+            if size >= Serialize._SSE_CHUNK_SIZE:
+                yield "".join(buffer).encode()
+                buffer = []
+                size = 0
+        buffer.append("\n\n")
+        yield "".join(buffer).encode()
@@ -2,7 +2,13 @@
 
 from enum import Enum
 import json
-from typing import List, Optional
+from json.encoder import encode_basestring_ascii
+from typing import Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from .serialize import Serialize
 from model import ModelFile
@@ -27,6 +33,7 @@ class SerializeModel(Serialize):
 
     # Event keys
     __EVENT_INIT = "model-init"
+    __EVENT_PATCH = "model-patch"
     __EVENT_UPDATE = {
         UpdateEvent.Change.ADDED: "model-added",
         UpdateEvent.Change.REMOVED: "model-removed",
@@ -35,6 +42,19 @@ class SerializeModel(Serialize):
     __KEY_UPDATE_OLD_FILE = "old_file"
     __KEY_UPDATE_NEW_FILE = "new_file"
 
+    # Patch keys
+    # A patch is a list of operations on the files in a root's tree
+    # Each operation has a path of file names starting below the root
+    __KEY_PATCH_NAME = "name"
+    __KEY_PATCH_OPS = "ops"
+    __KEY_PATCH_OP = "op"
+    __KEY_PATCH_PATH = "path"
+    __KEY_PATCH_FIELDS = "fields"
+    __KEY_PATCH_FILE = "file"
+    __VALUE_PATCH_OP_REPLACE = "replace"  # replace fields of the file at path
+    __VALUE_PATCH_OP_ADD = "add"  # add file as a child at path
+    __VALUE_PATCH_OP_REMOVE = "remove"  # remove the file at path
+
     # Model file keys
     __KEY_FILE_NAME = "name"
     __KEY_FILE_IS_DIR = "is_dir"
@@ -59,9 +79,34 @@ class SerializeModel(Serialize):
     __KEY_FILE_REMOTE_MODIFIED_TIMESTAMP = "remote_modified_timestamp"
     __KEY_FILE_FULL_PATH = "full_path"
     __KEY_FILE_CHILDREN = "children"
+    # Summaries of files are sent instead of their children
+    __KEY_FILE_CHILDREN_COUNT = "children_count"
+    # Subtree keys
+    __KEY_SUBTREE_CHILDREN_OFFSET = "children_offset"
+
+    # Templates for encoding files without building dicts, see __iter_model_files_json
+    # They use the same key order and separators as json.dumps of the dicts
+    __JSON_FILE_FORMAT = "{" + ", ".join('"{}": %s'.format(key) for key in (
+        __KEY_FILE_NAME,
+        __KEY_FILE_IS_DIR,
+        __KEY_FILE_STATE,
+        __KEY_FILE_REMOTE_SIZE,
+        __KEY_FILE_LOCAL_SIZE,
+        __KEY_FILE_DOWNLOADING_SPEED,
+        __KEY_FILE_ETA,
+        __KEY_FILE_IS_EXTRACTABLE,
+        __KEY_FILE_LOCAL_CREATED_TIMESTAMP,
+        __KEY_FILE_LOCAL_MODIFIED_TIMESTAMP,
+        __KEY_FILE_REMOTE_CREATED_TIMESTAMP,
+        __KEY_FILE_REMOTE_MODIFIED_TIMESTAMP,
+        __KEY_FILE_FULL_PATH
+    )) + ', "{}": ['.format(__KEY_FILE_CHILDREN)
+    __JSON_FILE_END = "]}"
+    __JSON_SEPARATOR = ", "
+    __JSON_VALUES_FILE_STATE = {state: '"{}"'.format(value) for state, value in __VALUES_FILE_STATE.items()}
 
     @staticmethod
-    def __model_file_to_json_dict(model_file: ModelFile) -> dict:
+    def __model_file_to_json_fields(model_file: ModelFile) -> dict:
         json_dict = dict()
         json_dict[SerializeModel.__KEY_FILE_NAME] = model_file.name
         json_dict[SerializeModel.__KEY_FILE_IS_DIR] = model_file.is_dir
@@ -80,28 +125,241 @@ class SerializeModel(Serialize):
         json_dict[SerializeModel.__KEY_FILE_REMOTE_MODIFIED_TIMESTAMP] = \
             str(model_file.remote_modified_timestamp.timestamp()) if model_file.remote_modified_timestamp else None
         json_dict[SerializeModel.__KEY_FILE_FULL_PATH] = model_file.full_path
+        return json_dict
+
+    @staticmethod
+    def __model_file_to_json_dict(model_file: ModelFile) -> dict:
+        json_dict = SerializeModel.__model_file_to_json_fields(model_file)
         json_dict[SerializeModel.__KEY_FILE_CHILDREN] = list()
         for child in model_file.get_children():
             json_dict[SerializeModel.__KEY_FILE_CHILDREN].append(SerializeModel.__model_file_to_json_dict(child))
         return json_dict
 
-    def model(self, model_files: List[ModelFile]) -> str:
+    @staticmethod
+    def __iter_model_files_json(model_files: Iterable[ModelFile]) -> Iterator[str]:
+        """
+        Generate the json list of files and their children piece by piece
+        Files are formatted straight into strings while walking the trees with
+        an explicit stack, so large and deep trees need neither intermediate dicts
+        nor recursion, and the json is never held in memory as a whole.
+        The result is identical to json.dumps of the dicts.
+        """
+        file_format = SerializeModel.__JSON_FILE_FORMAT
+        file_end = SerializeModel.__JSON_FILE_END
+        separator = SerializeModel.__JSON_SEPARATOR
+        states = SerializeModel.__JSON_VALUES_FILE_STATE
+        encode_str = encode_basestring_ascii
+
+        def encode_int(value: Optional[int]) -> str:
+            return "null" if value is None else int.__repr__(value)
+
+        def encode_timestamp(value) -> str:
+            return '"%r"' % value.timestamp() if value else "null"
+
+        yield "["
+        # Each level of the stack holds the remaining siblings, the path prefix
+        # of the siblings (None for the given files), and whether a separator is due
+        stack = [[iter(model_files), None, False]]
+        while stack:
+            level = stack[-1]
+            model_file = next(level[0], None)
+            if model_file is None:
+                stack.pop()
+                yield file_end if stack else "]"
+                continue
+            if level[2]:
+                yield separator
+            level[2] = True
+            full_path = model_file.full_path if level[1] is None else level[1] + model_file.name
+            yield file_format % (
+                encode_str(model_file.name),
+                "true" if model_file.is_dir else "false",
+                states[model_file.state],
+                encode_int(model_file.remote_size),
+                encode_int(model_file.local_size),
+                encode_int(model_file.downloading_speed),
+                encode_int(model_file.eta),
+                "true" if model_file.is_extractable else "false",
+                encode_timestamp(model_file.local_created_timestamp),
+                encode_timestamp(model_file.local_modified_timestamp),
+                encode_timestamp(model_file.remote_created_timestamp),
+                encode_timestamp(model_file.remote_modified_timestamp),
+                encode_str(full_path)
+            )
+            # Same as os.path.join, which ModelFile.full_path uses, for names without slashes
+            prefix = full_path if not full_path or full_path.endswith("/") else full_path + "/"
+            stack.append([iter(model_file.get_children()), prefix, False])
+
+    @staticmethod
+    def __iter_model_files_summary_json(model_files: Iterable[ModelFile]) -> Iterator[str]:
+        yield "["
+        for i, model_file in enumerate(model_files):
+            if i:
+                yield SerializeModel.__JSON_SEPARATOR
+            yield SerializeModel.__dumps(SerializeModel.__model_file_to_json_summary(model_file))
+        yield "]"
+
+    @staticmethod
+    def __dumps(obj) -> str:
+        """
+        Encode json dicts, with orjson if it's installed
+        orjson output only differs in whitespace and escaping of non-ascii characters
+        """
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj).decode()
+            except orjson.JSONEncodeError:
+                # e.g. trees deeper than orjson's recursion limit
+                pass
+        return json.dumps(obj)
+
+    @staticmethod
+    def __encode_model_file(model_file: Optional[ModelFile]) -> str:
+        if model_file is None:
+            return "null"
+        # Strip the list brackets
+        return "".join(SerializeModel.__iter_model_files_json([model_file]))[1:-1]
+
+    @staticmethod
+    def __model_file_to_json_summary(model_file: ModelFile) -> dict:
+        # Sizes and states of directories already aggregate their children
+        json_dict = SerializeModel.__model_file_to_json_fields(model_file)
+        json_dict[SerializeModel.__KEY_FILE_CHILDREN_COUNT] = len(model_file.get_children())
+        return json_dict
+
+    @staticmethod
+    def __model_file_to_json(model_file: ModelFile, summary: bool) -> dict:
+        if summary:
+            return SerializeModel.__model_file_to_json_summary(model_file)
+        else:
+            return SerializeModel.__model_file_to_json_dict(model_file)
+
+    @staticmethod
+    def __model_file_diff(old_file: ModelFile, new_file: ModelFile, path: List[str], ops: List[dict],
+                          summary: bool):
+        """
+        Append the operations that turn old_file into new_file
+        Unchanged subtrees are skipped by comparing their content hashes
+        Summaries are only diffed at the top level
+        """
+        if summary:
+            old_fields = SerializeModel.__model_file_to_json_summary(old_file)
+            new_fields = SerializeModel.__model_file_to_json_summary(new_file)
+        else:
+            old_fields = SerializeModel.__model_file_to_json_fields(old_file)
+            new_fields = SerializeModel.__model_file_to_json_fields(new_file)
+        changed_fields = {k: v for k, v in new_fields.items() if old_fields[k] != v}
+        if changed_fields:
+            ops.append({
+                SerializeModel.__KEY_PATCH_OP: SerializeModel.__VALUE_PATCH_OP_REPLACE,
+                SerializeModel.__KEY_PATCH_PATH: path,
+                SerializeModel.__KEY_PATCH_FIELDS: changed_fields
+            })
+        if summary:
+            return
+        old_children = {child.name: child for child in old_file.get_children()}
+        for new_child in new_file.get_children():
+            child_path = path + [new_child.name]
+            old_child = old_children.pop(new_child.name, None)
+            if old_child is None:
+                ops.append({
+                    SerializeModel.__KEY_PATCH_OP: SerializeModel.__VALUE_PATCH_OP_ADD,
+                    SerializeModel.__KEY_PATCH_PATH: child_path,
+                    SerializeModel.__KEY_PATCH_FILE: SerializeModel.__model_file_to_json_dict(new_child)
+                })
+            elif old_child.content_hash != new_child.content_hash:
+                SerializeModel.__model_file_diff(old_child, new_child, child_path, ops, summary=False)
+        for name in old_children:
+            ops.append({
+                SerializeModel.__KEY_PATCH_OP: SerializeModel.__VALUE_PATCH_OP_REMOVE,
+                SerializeModel.__KEY_PATCH_PATH: path + [name]
+            })
+
+    def model(self, model_files: List[ModelFile], summary: bool = False) -> str:
         """
         Serialize the model
+        :param model_files:
+        :param summary: send summaries of the files instead of their children
         :return:
         """
-        model_json_list = [SerializeModel.__model_file_to_json_dict(f) for f in model_files]
-        model_json = json.dumps(model_json_list)
+        if summary:
+            model_json = SerializeModel.__dumps(
+                [SerializeModel.__model_file_to_json_summary(f) for f in model_files]
+            )
+        else:
+            model_json = "".join(SerializeModel.__iter_model_files_json(model_files))
         return self._sse_pack(event=SerializeModel.__EVENT_INIT,
                               data=model_json)
 
-    def update_event(self, event: UpdateEvent):
+    def model_chunks(self, model_files: List[ModelFile], summary: bool = False) -> Iterator[bytes]:
+        """
+        Serialize the model as encoded chunks of the SSE frame
+        The model is serialized as the chunks are read, so memory use doesn't
+        depend on the size of the model
+        :param model_files:
+        :param summary: send summaries of the files instead of their children
+        :return:
+        """
+        if summary:
+            model_json = SerializeModel.__iter_model_files_summary_json(model_files)
+        else:
+            model_json = SerializeModel.__iter_model_files_json(model_files)
+        return self._sse_pack_chunks(event=SerializeModel.__EVENT_INIT,
+                                     data=model_json)
+
+    def update_event(self, event: UpdateEvent, summary: bool = False):
+        if not summary:
+            model_file_json = '{"%s": %s, "%s": %s}' % (
+                SerializeModel.__KEY_UPDATE_OLD_FILE, SerializeModel.__encode_model_file(event.old_file),
+                SerializeModel.__KEY_UPDATE_NEW_FILE, SerializeModel.__encode_model_file(event.new_file)
+            )
+            return self._sse_pack(event=SerializeModel.__EVENT_UPDATE[event.change],
+                                  data=model_file_json)
         model_file_json_dict = {
             SerializeModel.__KEY_UPDATE_OLD_FILE:
-                SerializeModel.__model_file_to_json_dict(event.old_file) if event.old_file else None,
+                SerializeModel.__model_file_to_json(event.old_file, summary) if event.old_file else None,
             SerializeModel.__KEY_UPDATE_NEW_FILE:
-                SerializeModel.__model_file_to_json_dict(event.new_file) if event.new_file else None
+                SerializeModel.__model_file_to_json(event.new_file, summary) if event.new_file else None
         }
-        model_file_json = json.dumps(model_file_json_dict)
+        model_file_json = SerializeModel.__dumps(model_file_json_dict)
         return self._sse_pack(event=SerializeModel.__EVENT_UPDATE[event.change],
                               data=model_file_json)
+
+    def patch_event(self, event: UpdateEvent, summary: bool = False) -> Optional[str]:
+        """
+        Serialize an update event as a patch of only the changed fields and files
+        Added and removed events are serialized as regular update events
+        :param event:
+        :param summary: patch the summaries of the files
+        :return: None if nothing visible to clients changed
+        """
+        if event.change != SerializeModel.UpdateEvent.Change.UPDATED:
+            return self.update_event(event, summary)
+        ops = []
+        SerializeModel.__model_file_diff(event.old_file, event.new_file, [], ops, summary)
+        if not ops:
+            return None
+        patch_json = SerializeModel.__dumps({
+            SerializeModel.__KEY_PATCH_NAME: event.new_file.name,
+            SerializeModel.__KEY_PATCH_OPS: ops
+        })
+        return self._sse_pack(event=SerializeModel.__EVENT_PATCH,
+                              data=patch_json)
+
+    # noinspection PyMethodMayBeStatic
+    def subtree(self, model_file: ModelFile, offset: int, limit: int) -> str:
+        """
+        Serialize a file and a page of summaries of its children
+        This is plain json, for fetching the subtrees of summarized files
+        :param model_file:
+        :param offset: index of the first child
+        :param limit: max number of children
+        :return:
+        """
+        json_dict = SerializeModel.__model_file_to_json_summary(model_file)
+        json_dict[SerializeModel.__KEY_SUBTREE_CHILDREN_OFFSET] = offset
+        json_dict[SerializeModel.__KEY_FILE_CHILDREN] = [
+            SerializeModel.__model_file_to_json_summary(child)
+            for child in model_file.get_children()[offset:offset+limit]
+        ]
+        return SerializeModel.__dumps(json_dict)
@@ -16,6 +16,14 @@ class SerializeStatusJson:
     __KEY_CONTROLLER_LATEST_REMOTE_SCAN_TIME = "latest_remote_scan_time"
     __KEY_CONTROLLER_LATEST_REMOTE_SCAN_FAILED = "latest_remote_scan_failed"
     __KEY_CONTROLLER_LATEST_REMOTE_SCAN_ERROR = "latest_remote_scan_error"
+    __KEY_CONTROLLER_LOCAL_SCAN_INTERVAL_MS = "local_scan_interval_ms"
+    __KEY_CONTROLLER_REMOTE_SCAN_INTERVAL_MS = "remote_scan_interval_ms"
+    __KEY_WEB = "web"
+    __KEY_WEB_STREAM_QUEUES = "stream_queues"
+    __KEY_WEB_STREAM_QUEUE_NAME = "name"
+    __KEY_WEB_STREAM_QUEUE_DEPTH = "depth"
+    __KEY_WEB_STREAM_QUEUE_DROPS = "drops"
+    __KEY_WEB_STREAM_QUEUE_MAX_LATENCY_MS = "max_latency_ms"
 
     @staticmethod
     def status(status: Status) -> str:
@@ -38,6 +46,21 @@ class SerializeStatusJson:
             status.controller.latest_remote_scan_failed
         json_dict[SerializeStatusJson.__KEY_CONTROLLER][SerializeStatusJson.__KEY_CONTROLLER_LATEST_REMOTE_SCAN_ERROR] = \
             status.controller.latest_remote_scan_error
+        json_dict[SerializeStatusJson.__KEY_CONTROLLER][SerializeStatusJson.__KEY_CONTROLLER_LOCAL_SCAN_INTERVAL_MS] = \
+            status.controller.local_scan_interval_ms
+        json_dict[SerializeStatusJson.__KEY_CONTROLLER][SerializeStatusJson.__KEY_CONTROLLER_REMOTE_SCAN_INTERVAL_MS] = \
+            status.controller.remote_scan_interval_ms
+
+        json_dict[SerializeStatusJson.__KEY_WEB] = dict()
+        json_dict[SerializeStatusJson.__KEY_WEB][SerializeStatusJson.__KEY_WEB_STREAM_QUEUES] = [
+            {
+                SerializeStatusJson.__KEY_WEB_STREAM_QUEUE_NAME: name,
+                SerializeStatusJson.__KEY_WEB_STREAM_QUEUE_DEPTH: metrics.depth,
+                SerializeStatusJson.__KEY_WEB_STREAM_QUEUE_DROPS: metrics.drops,
+                SerializeStatusJson.__KEY_WEB_STREAM_QUEUE_MAX_LATENCY_MS: metrics.max_latency_in_ms
+            }
+            for name, metrics in status.web.stream_queues
+        ]
 
         status_json = json.dumps(json_dict)
         return status_json
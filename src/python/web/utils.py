@@ -1,31 +1,185 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from queue import Queue, Empty
-from typing import TypeVar, Generic, Optional
+from collections import OrderedDict
+from enum import Enum
+from threading import Condition, Lock
+import time
+from typing import TypeVar, Generic, Optional, Callable, Hashable, NamedTuple
+
+from common import AppError
 
 
 T = TypeVar('T')
 
 
+class StreamOverflowError(AppError):
+    """
+    Indicates that a stream fell too far behind and must be disconnected
+    """
+    pass
+
+
+class StreamQueueMetrics(NamedTuple):
+    """
+    Metrics of a single stream queue
+    """
+    depth: int  # number of queued events
+    drops: int  # number of events dropped or replaced before they were sent
+    max_latency_in_ms: int  # longest time an event waited in the queue
+
+
+class StreamHub:
+    """
+    Wakes up a web stream when any of its queues receive an event.
+    One hub is created for each stream connection. The stream's queues
+    publish to the hub, and the stream thread blocks in wait() until there
+    is something to send instead of polling its queues.
+    """
+    def __init__(self):
+        self.__condition = Condition()
+        self.__pending = False
+        self.__deadline = None  # time.monotonic() time of a scheduled notification
+
+    def notify(self):
+        """
+        Wake up the stream thread
+        Notifications are not lost if the stream thread is not waiting yet
+        :return:
+        """
+        with self.__condition:
+            self.__pending = True
+            self.__condition.notify_all()
+
+    def notify_at(self, deadline: float):
+        """
+        Wake up the stream thread at the given time
+        Only the earliest scheduled notification is kept
+        :param deadline: time in time.monotonic() seconds
+        :return:
+        """
+        with self.__condition:
+            if self.__deadline is None or deadline < self.__deadline:
+                self.__deadline = deadline
+                # Let a waiting stream thread shorten its wait
+                self.__condition.notify_all()
+
+    def wait(self, timeout_in_secs: float) -> bool:
+        """
+        Block until notified or until the timeout expires
+        :param timeout_in_secs:
+        :return: True if notified, False if timed out
+        """
+        with self.__condition:
+            end = time.monotonic() + timeout_in_secs
+            while not self.__pending:
+                now = time.monotonic()
+                if self.__deadline is not None and now >= self.__deadline:
+                    self.__deadline = None
+                    self.__pending = True
+                    break
+                if now >= end:
+                    break
+                timeout = end - now
+                if self.__deadline is not None:
+                    timeout = min(timeout, self.__deadline - now)
+                self.__condition.wait(timeout)
+            notified = self.__pending
+            self.__pending = False
+            return notified
+
+
 class StreamQueue(Generic[T]):
     """
     A queue that transfers events from one thread to another.
     Useful for web streams that wait for listener events from other threads.
     The producer thread calls put() to insert events. The consumer stream
     calls get_next_event() to receive event in its own thread.
+    If a hub is set, it is notified of every new event.
+
+    A queue can be bounded so that a stalled stream doesn't accumulate
+    events indefinitely. The overflow policy decides what happens when a
+    bounded queue is full.
     """
-    def __init__(self):
-        self.__queue = Queue()
+    class OverflowPolicy(Enum):
+        # Drop the oldest queued event
+        DROP_OLDEST = 0
+        # Queued events with the same key are replaced by the latest one,
+        # the oldest queued event is dropped if the queue is still full
+        COALESCE = 1
+        # Drop all queued events and disconnect the stream
+        DISCONNECT = 2
+
+    def __init__(self,
+                 max_size: Optional[int] = None,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 key: Optional[Callable[[T], Hashable]] = None):
+        """
+        :param max_size: max number of queued events, None for no limit
+        :param overflow_policy:
+        :param key: key of the events for the coalesce policy,
+                    None to only keep the latest event
+        """
+        self.__max_size = max_size
+        self.__overflow_policy = overflow_policy
+        self.__key = key
+        self.__lock = Lock()
+        # key -> (time.monotonic() time the event was first queued, event)
+        self.__events = OrderedDict()
+        self.__next_key = 0  # keys of events that aren't coalesced
+        self.__disconnected = False
+        self.__drops = 0
+        self.__max_latency_in_secs = 0
+        self.__hub = None
+
+    def set_hub(self, hub: Optional[StreamHub]):
+        self.__hub = hub
 
     def put(self, event: T):
-        self.__queue.put(event)
+        now = time.monotonic()
+        with self.__lock:
+            if self.__disconnected:
+                return
+            if self.__overflow_policy == StreamQueue.OverflowPolicy.COALESCE:
+                key = self.__key(event) if self.__key is not None else None
+            else:
+                key = self.__next_key
+                self.__next_key += 1
+            if key in self.__events:
+                # Latency is counted from the first of the coalesced events
+                self.__events[key] = (self.__events[key][0], event)
+                self.__drops += 1
+            else:
+                if self.__max_size is not None and len(self.__events) >= self.__max_size:
+                    self.__drops += 1
+                    if self.__overflow_policy == StreamQueue.OverflowPolicy.DISCONNECT:
+                        self.__drops += len(self.__events)
+                        self.__events.clear()
+                        self.__disconnected = True
+                    else:
+                        self.__events.popitem(last=False)
+                if not self.__disconnected:
+                    self.__events[key] = (now, event)
+        hub = self.__hub
+        if hub is not None:
+            hub.notify()
 
     def get_next_event(self) -> Optional[T]:
         """
         Returns the next event if there is one, otherwise returns None
+        Raises StreamOverflowError if the stream must be disconnected
         :return:
         """
-        try:
-            return self.__queue.get(block=False)
-        except Empty:
-            return None
+        with self.__lock:
+            if self.__disconnected:
+                raise StreamOverflowError("Stream queue overflowed")
+            if not self.__events:
+                return None
+            _, (put_time, event) = self.__events.popitem(last=False)
+            self.__max_latency_in_secs = max(self.__max_latency_in_secs, time.monotonic() - put_time)
+            return event
+
+    def get_metrics(self) -> StreamQueueMetrics:
+        with self.__lock:
+            return StreamQueueMetrics(depth=len(self.__events),
+                                      drops=self.__drops,
+                                      max_latency_in_ms=int(self.__max_latency_in_secs * 1000))
@@ -1,7 +1,8 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from typing import Type, Callable, Optional
+from typing import Type, Callable, Optional, Union, Dict
 from abc import ABC, abstractmethod
+from threading import Lock, Event
 import time
 
 import bottle
@@ -9,6 +10,7 @@ from bottle import static_file
 
 from common import Context
 from controller import Controller
+from .utils import StreamHub, StreamQueueMetrics, StreamOverflowError
 
 
 class IHandler(ABC):
@@ -29,18 +31,40 @@ class IStreamHandler(ABC):
     """
     Abstract class that defines a streaming data provider
     """
+    @abstractmethod
+    def set_hub(self, hub: StreamHub):
+        """
+        Set the hub to notify whenever this handler has new values
+        Called once before setup()
+        :param hub:
+        :return:
+        """
+        pass
+
     @abstractmethod
     def setup(self):
         pass
 
     @abstractmethod
-    def get_value(self) -> Optional[str]:
+    def get_value(self) -> Optional[Union[str, bytes]]:
+        """
+        Get the next value to send, if any
+        Large values can be returned as encoded chunks over successive calls
+        :return:
+        """
         pass
 
     @abstractmethod
     def cleanup(self):
         pass
 
+    def get_queue_metrics(self) -> Dict[str, StreamQueueMetrics]:
+        """
+        Get the metrics of this handler's queues
+        :return: metrics by queue name
+        """
+        return dict()
+
     @classmethod
     def register(cls, web_app: "WebApp", **kwargs):
         """
@@ -56,7 +80,12 @@ class WebApp(bottle.Bottle):
     """
     Web app implementation
     """
-    _STREAM_POLL_INTERVAL_IN_MS = 100
+    # Idle streams send a comment at this interval to keep the connection alive
+    # This is also how long it takes to notice that an idle client went away
+    _STREAM_HEARTBEAT_INTERVAL_IN_MS = 15000
+    # Interval at which the metrics of the stream queues are published to the status
+    _STREAM_METRICS_INTERVAL_IN_MS = 5000
+    __STREAM_HEARTBEAT = b": heartbeat\n\n"
 
     def __init__(self, context: Context, controller: Controller):
         super().__init__()
@@ -65,8 +94,13 @@ class WebApp(bottle.Bottle):
         self.__html_path = context.args.html_path
         self.__status = context.status
         self.logger.info("Html path set to: {}".format(self.__html_path))
-        self.__stop = False
+        # Note: bottle does not allow app attributes to be reassigned
+        self.__stop = Event()
         self.__streaming_handlers = []  # list of (handler, kwargs) pairs
+        self.__streams = dict()  # hub -> handlers of the open streams
+        self.__streams_lock = Lock()
+        # Time the stream metrics were last published, in a list since it's reassigned
+        self.__last_stream_metrics_time = [None]
 
     def add_default_routes(self):
         """
@@ -98,14 +132,23 @@ class WebApp(bottle.Bottle):
         Advance the web app state
         :return:
         """
-        pass
+        now = time.monotonic()
+        last_time = self.__last_stream_metrics_time[0]
+        if last_time is None or now - last_time >= WebApp._STREAM_METRICS_INTERVAL_IN_MS / 1000:
+            self.__last_stream_metrics_time[0] = now
+            self.__publish_stream_metrics()
 
     def stop(self):
         """
         Exit gracefully, kill any connections and clean up any state
         :return: 
         """
-        self.__stop = True
+        self.__stop.set()
+        # Wake up all the streams so they can exit
+        with self.__streams_lock:
+            hubs = list(self.__streams.keys())
+        for hub in hubs:
+            hub.notify()
 
     def __index(self):
         """
@@ -125,7 +168,10 @@ class WebApp(bottle.Bottle):
 
     def __web_stream(self):
         # Initialize all the handlers
+        hub = StreamHub()
         handlers = [cls(**kwargs) for (cls, kwargs) in self.__streaming_handlers]
+        with self.__streams_lock:
+            self.__streams[hub] = handlers
 
         try:
             # Setup the response header
@@ -134,26 +180,52 @@ class WebApp(bottle.Bottle):
 
             # Call setup on all handlers
             for handler in handlers:
+                handler.set_hub(hub)
                 handler.setup()
 
             # Get streaming values until the connection closes
-            while not self.__stop:
+            while not self.__stop.is_set():
                 for handler in handlers:
                     # Process all values from this handler
                     while True:
-                        value = handler.get_value()
+                        try:
+                            value = handler.get_value()
+                        except StreamOverflowError:
+                            # Client fell too far behind, it will reconnect and start over
+                            self.logger.warning("Disconnecting stream that fell behind")
+                            return
                         if value:
-                            yield value
+                            # The stream is sent as bytes so that chunks pass through as-is
+                            yield value if type(value) is bytes else value.encode()
                         else:
                             break
 
-                time.sleep(WebApp._STREAM_POLL_INTERVAL_IN_MS / 1000)
+                # Block until a handler has a new value
+                notified = hub.wait(WebApp._STREAM_HEARTBEAT_INTERVAL_IN_MS / 1000)
+                if not notified:
+                    yield WebApp.__STREAM_HEARTBEAT
 
         finally:
             self.logger.debug("Stream connection stopped by {}".format(
-                "server" if self.__stop else "client"
+                "server" if self.__stop.is_set() else "client"
             ))
 
+            with self.__streams_lock:
+                self.__streams.pop(hub, None)
+
             # Cleanup all handlers
             for handler in handlers:
                 handler.cleanup()
+
+    def __publish_stream_metrics(self):
+        with self.__streams_lock:
+            streams = list(self.__streams.values())
+        stream_queues = tuple(
+            (name, metrics)
+            for handlers in streams
+            for handler in handlers
+            for name, metrics in handler.get_queue_metrics().items()
+        )
+        # Every status change is sent to the status streams, so only send changes
+        if stream_queues != self.__status.web.stream_queues:
+            self.__status.web.stream_queues = stream_queues
@@ -1,9 +1,9 @@
 # Copyright 2017, Inderpreet Singh, All rights reserved.
 
-from common import Context
+from common import Context, Constants
 from controller import Controller, AutoQueuePersist
 from .web_app import WebApp
-from .handler.stream_model import ModelStreamHandler
+from .handler.stream_model import ModelStreamHandler, ModelBroadcast
 from .handler.stream_status import StatusStreamHandler
 from .handler.controller import ControllerHandler
 from .handler.server import ServerHandler
@@ -11,6 +11,7 @@ from .handler.config import ConfigHandler
 from .handler.auto_queue import AutoQueueHandler
 from .handler.stream_log import LogStreamHandler
 from .handler.status import StatusHandler
+from .handler.model import ModelHandler
 
 
 class WebAppBuilder:
@@ -29,6 +30,7 @@ class WebAppBuilder:
         self.config_handler = ConfigHandler(context.config)
         self.auto_queue_handler = AutoQueueHandler(auto_queue_persist)
         self.status_handler = StatusHandler(context.status)
+        self.model_handler = ModelHandler(controller)
 
     def build(self) -> WebApp:
         web_app = WebApp(context=self.__context,
@@ -38,16 +40,21 @@ class WebAppBuilder:
                                      status=self.__context.status)
 
         LogStreamHandler.register(web_app=web_app,
-                                  logger=self.__context.logger)
+                                  logger=self.__context.logger,
+                                  max_queue_size=Constants.WEB_LOG_STREAM_MAX_QUEUE_SIZE)
 
+        # All the model streams share one broadcast
         ModelStreamHandler.register(web_app=web_app,
-                                    controller=self.__controller)
+                                    broadcast=ModelBroadcast(self.__controller),
+                                    min_update_interval_in_ms=Constants.WEB_MODEL_MIN_UPDATE_INTERVAL_IN_MS,
+                                    max_pending_updates=Constants.WEB_MODEL_MAX_PENDING_UPDATES)
 
         self.controller_handler.add_routes(web_app)
         self.server_handler.add_routes(web_app)
         self.config_handler.add_routes(web_app)
         self.auto_queue_handler.add_routes(web_app)
         self.status_handler.add_routes(web_app)
+        self.model_handler.add_routes(web_app)
 
         web_app.add_default_routes()
 